@@ -3,10 +3,16 @@ import logging
 import json
 import threading
 import time
+import uuid
 
-from flask import Flask, render_template, request, jsonify, Response
-from solver import solve_shift_scheduling
-from callback import ObjectiveEarlyStopping
+from flask import Flask, render_template, request, jsonify, Response, session
+from evaluator import evaluate
+from executor import QueueFull, SolveExecutor
+from heuristic import warm_start
+from job_store import open_store
+from roster_codec import ENCODINGS, decode_roster, encode_roster
+from solver import infeasible_result, precheck
+from timers import watchdog
 
 # Configure logging for debugging
 logging.basicConfig(level=logging.DEBUG)
@@ -14,9 +20,266 @@ logging.basicConfig(level=logging.DEBUG)
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
 
-# Global dictionary to store solver instances and their progress
-active_solvers = {}
-solver_lock = threading.Lock()
+
+# Fields of a solver pushed to /progress watchers when they change
+STREAMED_FIELDS = (
+    "status",
+    "progress",
+    "count",
+    "queue_position",
+    "incumbent",
+    "result",
+    "error",
+    # status of each problem of a batch, see solve_batch
+    "items",
+)
+# Statuses after which a solver sends no more updates
+FINISHED_STATUSES = ("completed", "error", "interrupted")
+# Also how long a closed /progress stream can go unnoticed
+HEARTBEAT_INTERVAL = 5.0
+# Seconds a finished solver is kept once streamed, for /result and /stats
+RESULT_RETENTION = 30.0
+# Seconds of the heuristic roster computed before queuing a solve
+HEURISTIC_TIME = float(os.environ.get("HEURISTIC_TIME", 0.1))
+# Problems accepted in one /solve/batch request
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 64))
+# Seconds between two checks for solves cancelled from another process
+CANCEL_REQUEST_INTERVAL = 1.0
+# Web processes serving the app on this host, e.g. gunicorn workers, which
+# share its cores and solves, see executor
+WEB_PROCESSES = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+# Solves run at once on the host, and admitted to wait for one to finish
+SOLVE_CONCURRENCY = int(
+    os.environ.get("SOLVE_CONCURRENCY", max(1, os.cpu_count() // 4))
+)
+SOLVE_QUEUE_SIZE = int(os.environ.get("SOLVE_QUEUE_SIZE", 16))
+
+
+def solver_changes(solver_data, sent):
+    """Streamed fields of a solver that differ from what a watcher has sent"""
+    return {
+        key: solver_data.get(key)
+        for key in STREAMED_FIELDS
+        if solver_data.get(key) != sent.get(key)
+    }
+
+
+def encoded(value, encoding):
+    """Result or incumbent with its roster in a wire encoding, see roster_codec"""
+    if value and "results" in value:
+        # batch result, see solve_batch
+        return {
+            **value,
+            "results": [encoded(result, encoding) for result in value["results"]],
+        }
+    if not value or not value.get("solution") or encoding == "list":
+        return value
+    return {**value, "solution": encode_roster(value["solution"], encoding)}
+
+
+def requested_encoding(solver_data):
+    """Roster encoding of a request, the ?encoding= argument or the solve's"""
+    encoding = request.args.get("encoding", solver_data["encoding"])
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown roster encoding {encoding!r}")
+    return encoding
+
+
+def update_solver(solver_id, fields):
+    """Apply a progress update sent by a solver process and wake its watchers"""
+    previous = get_jobs().update(solver_id, fields)
+
+    # a queued solve started or was cancelled, the ones behind it moved up
+    if (
+        previous
+        and previous["status"] == "queued"
+        and fields.get("status") in ("solving", "interrupted")
+    ):
+        for queued_id in get_jobs().find(owner=os.getpid(), status="queued"):
+            get_jobs().update(
+                queued_id, {"queue_position": get_executor().queue_position(queued_id)}
+            )
+
+
+# The job store and executor of this process, created on first use rather
+# than on import, which the solver processes spawned by a server run as a
+# script repeat, see get_jobs and get_executor
+_jobs = None
+_executor = None
+_create_lock = threading.Lock()
+cancel_requests = None
+
+
+def get_jobs():
+    """Solves and their progress, see job_store
+
+    Shared by the web processes of the host with
+    JOB_STORE=sqlite:///path/to/jobs.db.
+    """
+    global _jobs
+    if _jobs is None:
+        with _create_lock:
+            if _jobs is None:
+                _jobs = open_store(os.environ.get("JOB_STORE", "memory"))
+    return _jobs
+
+
+def get_executor():
+    """Bounded process pool running the solves of this process
+
+    Each web process runs its part of the host's solves on its part of the
+    cores, the host-wide queue is bounded through the job store, see
+    host_full. Solves cancelled from other processes are polled for from then
+    on, see cancel_requested.
+    """
+    global _executor, cancel_requests
+    if _executor is None:
+        with _create_lock:
+            if _executor is None:
+                _executor = SolveExecutor(
+                    update_solver,
+                    max_concurrent=max(1, SOLVE_CONCURRENCY // WEB_PROCESSES),
+                    max_queue=SOLVE_QUEUE_SIZE,
+                    cpu_count=max(1, os.cpu_count() // WEB_PROCESSES),
+                )
+                cancel_requests = watchdog.schedule(
+                    CANCEL_REQUEST_INTERVAL, cancel_requested
+                )
+    return _executor
+
+
+def owner_alive(solver_data):
+    """Whether the process running a solve is still up, e.g. not restarted"""
+    try:
+        os.kill(solver_data["owner"], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def get_solver(solver_id):
+    """Solver by id, failed if the process running it is gone"""
+    solver_data = get_jobs().get(solver_id)
+    if (
+        solver_data
+        and solver_data["status"] not in FINISHED_STATUSES
+        and not owner_alive(solver_data)
+    ):
+        update_solver(
+            solver_id, {"status": "error", "error": "Solver process was restarted"}
+        )
+        solver_data = get_jobs().get(solver_id)
+    return solver_data
+
+
+def host_full():
+    """Whether the host already runs and queues as many solves as it admits
+
+    Counted over the jobs of all the web processes sharing the job store, so
+    with the default in-memory store over the jobs of this process only. Two
+    processes may admit a solve each past the limit at the same time, the
+    executor of each still bounds its own.
+    """
+    active = sum(
+        1
+        for status in ("queued", "solving")
+        for job in get_jobs().find(status=status).values()
+        if owner_alive(job)
+    )
+    return active >= SOLVE_CONCURRENCY + SOLVE_QUEUE_SIZE
+
+
+def cancel_solver(solver_id):
+    """Interrupt a solve, False if it is already finished or unknown
+
+    Solves run by another web process are flagged, and cancelled by it within
+    CANCEL_REQUEST_INTERVAL, see cancel_requested.
+    """
+    solver_data = get_jobs().get(solver_id)
+    if solver_data is None or solver_data["status"] in FINISHED_STATUSES:
+        return False
+    if solver_data["owner"] == os.getpid():
+        return get_executor().cancel(solver_id)
+    get_jobs().update(solver_id, {"cancel_requested": True})
+    return True
+
+
+def cancel_requested():
+    """Cancel the solves of this process flagged by other ones"""
+    try:
+        for solver_id in get_jobs().find(owner=os.getpid(), cancel_requested=True):
+            get_jobs().update(solver_id, {"cancel_requested": False})
+            get_executor().cancel(solver_id)
+    finally:
+        watchdog.reset(cancel_requests, CANCEL_REQUEST_INTERVAL)
+
+
+def new_solver_id(kind):
+    """Id of a new solve, unique across the web processes"""
+    return f"{kind}_{int(time.time() * 1000)}_{uuid.uuid4().hex[:6]}"
+
+
+def prepare_request(data):
+    """Validate a solve request and resolve its warm start roster, in place
+
+    Returns an (error message, HTTP status) pair, None if it can be solved.
+    """
+    # Validate input data
+    if not data:
+        return "No data provided", 400
+
+    if data.get("num_employees", 0) < 1:
+        return "No staff", 400
+    if len(data.get("positions", [])) < 1:
+        return "No position", 400
+    encoding = data.get("solution_encoding", "list")
+    if encoding not in ENCODINGS:
+        return f"Unknown roster encoding {encoding!r}", 400
+
+    # Warm start from the roster of a previous solve
+    previous_solver_id = data.get("previous_solver_id")
+    if previous_solver_id:
+        previous = get_jobs().get(previous_solver_id)
+        result = previous and previous["result"]
+        if not result or not result.get("solution"):
+            return "Previous solver not found", 404
+        data["hint_solution"] = result["solution"]
+        data["hint_source"] = "incumbent"
+    elif isinstance(data.get("hint_solution"), dict):
+        data["hint_solution"] = decode_roster(data["hint_solution"])
+    return None
+
+
+def new_solver(positions, encoding, user=None):
+    """Job of a queued solve, run by this process, see get_jobs"""
+    return {
+        "status": "queued",
+        "progress": 0,
+        "result": None,
+        "error": None,
+        "positions": positions,
+        "count": 0,
+        "queue_position": None,
+        "incumbent": None,
+        "encoding": encoding,
+        # open /progress streams, the solve is cancelled when the
+        # last one closes before it finishes
+        "watchers": 0,
+        "owner": os.getpid(),
+        # browser session, its next solve supersedes this one
+        "user": user,
+        # set by another process, see cancel_solver
+        "cancel_requested": False,
+    }
+
+
+def user_id():
+    """Id of the browser session making the request, set on first use"""
+    if "user_id" not in session:
+        session["user_id"] = uuid.uuid4().hex
+    return session["user_id"]
 
 
 @app.route("/")
@@ -39,109 +302,233 @@ def solve_optimization():
     try:
         data = request.get_json()
 
-        # Validate input data
-        if not data:
-            return jsonify({"error": "No data provided"}), 400
-
-        num_employees = data.get("num_employees", 0)
-        positions = data.get("positions", [])
-
-        if num_employees < 1:
-            return jsonify({"error": "No staff"}), 400
-        if len(positions) < 1:
-            return jsonify({"error": "No position"}), 400
+        error = prepare_request(data)
+        if error:
+            message, code = error
+            return jsonify({"error": message}), code
+        positions = data["positions"]
+        encoding = data.get("solution_encoding", "list")
 
         # Create solver instance
         # solver = OptimizationSolver(problem_type)
-        solver_id = f"solver_{int(time.time() * 1000)}"
-
-        with solver_lock:
-            active_solvers[solver_id] = {
-                "solver": None,
-                "status": "initializing",
-                "progress": 0,
-                "result": None,
-                "error": None,
-                "thread": None,
-                "positions": positions,
-                "count": 0,
-            }
+        solver_id = new_solver_id("solver")
+
+        # Requests that cannot be staffed complete at once, without a worker
+        conflicts = precheck(data)
+        if not conflicts and host_full():
+            return jsonify({"error": "Too many solves queued, try again later"}), 429
+        user = user_id()
+
+        # a new submit supersedes the session's previous solve
+        for superseded in get_jobs().find(user=user):
+            cancel_solver(superseded)
+        get_jobs().create(solver_id, new_solver(positions, encoding, user))
+
+        if conflicts:
+            update_solver(
+                solver_id,
+                {
+                    "status": "completed",
+                    "progress": 100,
+                    "result": infeasible_result(conflicts),
+                },
+            )
+            return jsonify({"solver_id": solver_id, "conflicts": conflicts})
+
+        # An instant roster, shown until CP-SAT finds a better one, hinted to
+        # the solver and returned if it finds none in time
+        heuristic = warm_start(data, HEURISTIC_TIME)
+        if heuristic:
+            update_solver(
+                solver_id,
+                {
+                    "incumbent": {
+                        "solution": heuristic["solution"],
+                        "objective": heuristic["objective"],
+                        "bound": None,
+                        "gap": None,
+                        "time": heuristic["time"],
+                        "status": "heuristic",
+                        "feasible": heuristic["feasible"],
+                    }
+                },
+            )
 
-        # Start solving in separate thread
-        def solve_thread():
-            try:
-                with solver_lock:
-                    active_solvers[solver_id]["status"] = "solving"
+        try:
+            get_executor().submit(solver_id, data)
+        except QueueFull:
+            get_jobs().delete(solver_id)
+            return jsonify({"error": "Too many solves queued, try again later"}), 429
 
-                callback = ObjectiveEarlyStopping(
-                    15, data["gap_ratio"], active_solvers, solver_id, solver_lock
-                )
-                result = solve_shift_scheduling(
-                    data, callback, active_solvers, solver_id, solver_lock
-                )
+        update_solver(
+            solver_id, {"queue_position": get_executor().queue_position(solver_id)}
+        )
 
-                with solver_lock:
-                    active_solvers[solver_id]["status"] = "completed"
-                    active_solvers[solver_id]["result"] = result
-                    active_solvers[solver_id]["progress"] = 100
+        return jsonify(
+            {"solver_id": solver_id, "heuristic": encoded(heuristic, encoding)}
+        )
 
-            except Exception as e:
-                logging.error(f"Solver error: {str(e)}")
-                with solver_lock:
-                    active_solvers[solver_id]["status"] = "error"
-                    active_solvers[solver_id]["error"] = str(e)
+    except Exception as e:
+        logging.error(f"Error starting optimization: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/solve/batch", methods=["POST"])
+def solve_batch():
+    """Start solving a list of problems as one solve and return its ID
 
-        thread = threading.Thread(target=solve_thread)
-        thread.daemon = True
-        thread.start()
+    The problems share the cores of one solve, see SolveExecutor.submit_batch,
+    and identical ones are solved once. /progress streams the progress of the
+    whole batch, with the status of each problem in "items", and its result
+    lists the result of each problem in order.
+    """
+    try:
+        data = request.get_json()
+        problems = data and data.get("problems")
+        if not problems or not isinstance(problems, list):
+            return jsonify({"error": "No problems provided"}), 400
+        if len(problems) > MAX_BATCH_SIZE:
+            return (
+                jsonify({"error": f"At most {MAX_BATCH_SIZE} problems per batch"}),
+                400,
+            )
+        encoding = data.get("solution_encoding", "list")
+        if encoding not in ENCODINGS:
+            return jsonify({"error": f"Unknown roster encoding {encoding!r}"}), 400
+
+        unique = {}
+        items = []
+        for i, problem in enumerate(problems):
+            error = prepare_request(problem)
+            if error:
+                message, code = error
+                return jsonify({"error": f"Problem {i}: {message}"}), code
+            # identical problems are solved once
+            key = json.dumps(problem, sort_keys=True)
+            items.append(unique.setdefault(key, len(unique)))
+
+        if host_full():
+            return jsonify({"error": "Too many solves queued, try again later"}), 429
+        solver_id = new_solver_id("batch")
+        get_jobs().create(
+            solver_id,
+            new_solver([problem["positions"] for problem in problems], encoding),
+        )
+
+        try:
+            get_executor().submit_batch(
+                solver_id,
+                [json.loads(key) for key in unique],
+                items,
+                HEURISTIC_TIME,
+            )
+        except QueueFull:
+            get_jobs().delete(solver_id)
+            return jsonify({"error": "Too many solves queued, try again later"}), 429
 
-        return jsonify({"solver_id": solver_id})
+        update_solver(
+            solver_id, {"queue_position": get_executor().queue_position(solver_id)}
+        )
+
+        return jsonify(
+            {"solver_id": solver_id, "problems": len(items), "unique": len(unique)}
+        )
 
     except Exception as e:
-        logging.error(f"Error starting optimization: {str(e)}")
+        logging.error(f"Error starting batch optimization: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/solve/<solver_id>", methods=["DELETE"])
+def cancel_optimization(solver_id):
+    """Interrupt a queued or running solve, freeing its workers"""
+    solver_data = get_solver(solver_id)
+    if solver_data is None:
+        return jsonify({"error": "Solver not found"}), 404
+
+    if not cancel_solver(solver_id):
+        return (
+            jsonify(
+                {"error": "Solver already finished", "status": solver_data["status"]}
+            ),
+            409,
+        )
+
+    # "interrupted" follows on /progress once the search has stopped
+    return jsonify({"solver_id": solver_id, "status": "cancelling"})
+
+
+@app.route("/evaluate", methods=["POST"])
+def evaluate_roster():
+    """Objective and violated constraints of a roster, e.g. edited by hand"""
+    data = request.get_json()
+    if not data or not data.get("solution"):
+        return jsonify({"error": "No roster provided"}), 400
+
+    try:
+        return jsonify(evaluate(decode_roster(data["solution"]), data))
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        return jsonify({"error": f"Invalid roster or request: {e}"}), 400
+
+
 @app.route("/progress/<solver_id>")
 def stream_progress(solver_id):
     """Stream solver progress using Server-Sent Events"""
 
     def generate():
+        solver_data = get_solver(solver_id)
+        if solver_data is None:
+            yield f"data: {json.dumps({'error': 'Solver not found'})}\n\n"
+            return
+        # static metadata, sent once
+        response_data = {"solver_id": solver_id, "positions": solver_data["positions"]}
+        get_jobs().increment(solver_id, "watchers")
+
+        try:
+            yield from stream(solver_data, response_data, solver_data["encoding"])
+        finally:
+            # runs as well when the client disconnects, on the next write
+            watchers = get_jobs().increment(solver_id, "watchers", -1)
+            if watchers == 0 and cancel_solver(solver_id):
+                logging.info(f"Last watcher of {solver_id} left, cancelling")
+
+    def stream(solver_data, response_data, encoding):
+        # last value sent for each streamed field
+        sent = {}
         while True:
             try:
-                with solver_lock:
-                    if solver_id not in active_solvers:
-                        yield f"data: {json.dumps({'error': 'Solver not found'})}\n\n"
-                        break
-
-                    solver_data = active_solvers[solver_id]
-                    status = solver_data["status"]
-                    progress = solver_data["progress"]
-
-                    response_data = {
-                        "status": status,
-                        "progress": progress,
-                        "solver_id": solver_id,
-                        "positions": solver_data["positions"],
-                        "count": solver_data["count"] or 0,
-                    }
-
-                    if status == "completed" and solver_data["result"]:
-                        response_data["result"] = solver_data["result"]
-                    elif status == "error" and solver_data["error"]:
-                        response_data["error"] = solver_data["error"]
-
-                    yield f"data: {json.dumps(response_data)}\n\n"
-
-                    # Clean up completed or errored solvers
-                    if status in ["completed", "error", "interrupted"]:
-                        # Keep solver data for a bit longer for client to retrieve final result
-                        threading.Timer(
-                            30.0, lambda: active_solvers.pop(solver_id, None)
-                        ).start()
-                        break
-
-                time.sleep(0.5)  # Update every 500ms
+                # Wait for update_solver to signal a change
+                if solver_data is not None and not solver_changes(solver_data, sent):
+                    solver_data = get_jobs().wait(
+                        solver_id, solver_data["version"], HEARTBEAT_INTERVAL
+                    )
+
+                if solver_data is None:
+                    yield f"data: {json.dumps({'error': 'Solver not found'})}\n\n"
+                    break
+
+                changes = solver_changes(solver_data, sent)
+                status = solver_data["status"]
+                if not changes and not response_data:
+                    # keep the connection alive, ignored by EventSource
+                    yield ": heartbeat\n\n"
+                    # fails the solve if the process running it is gone
+                    solver_data = get_solver(solver_id)
+                    continue
+
+                sent.update(changes)
+                for key in ("result", "incumbent"):
+                    if key in changes:
+                        changes[key] = encoded(changes[key], encoding)
+                response_data.update(changes)
+                yield f"data: {json.dumps(response_data)}\n\n"
+                response_data = {}
+
+                # Clean up completed or errored solvers
+                if status in FINISHED_STATUSES:
+                    # Keep solver data for a bit longer for client to retrieve final result
+                    get_jobs().expire(solver_id, RESULT_RETENTION)
+                    break
 
             except Exception as e:
                 logging.error(f"Error in progress stream: {str(e)}")
@@ -158,20 +545,71 @@ def stream_progress(solver_id):
 @app.route("/result/<solver_id>")
 def get_result(solver_id):
     """Get final result for a solver"""
-    with solver_lock:
-        if solver_id not in active_solvers:
-            return jsonify({"error": "Solver not found"}), 404
-
-        solver_data = active_solvers[solver_id]
-
-        if solver_data["status"] == "completed":
-            return jsonify({"status": "completed", "result": solver_data["result"]})
-        elif solver_data["status"] == "error":
-            return jsonify({"status": "error", "error": solver_data["error"]})
-        else:
-            return jsonify(
-                {"status": solver_data["status"], "progress": solver_data["progress"]}
-            )
+    solver_data = get_solver(solver_id)
+    if solver_data is None:
+        return jsonify({"error": "Solver not found"}), 404
+
+    try:
+        encoding = requested_encoding(solver_data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if solver_data["status"] == "completed":
+        return jsonify(
+            {
+                "status": "completed",
+                "result": encoded(solver_data["result"], encoding),
+            }
+        )
+    elif solver_data["status"] == "error":
+        return jsonify({"status": "error", "error": solver_data["error"]})
+    else:
+        return jsonify(
+            {"status": solver_data["status"], "progress": solver_data["progress"]}
+        )
+
+
+@app.route("/incumbent/<solver_id>")
+def get_incumbent(solver_id):
+    """Best roster found so far, with its objective and gap"""
+    solver_data = get_solver(solver_id)
+    if solver_data is None:
+        return jsonify({"error": "Solver not found"}), 404
+
+    try:
+        encoding = requested_encoding(solver_data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(
+        {
+            "status": solver_data["status"],
+            "incumbent": encoded(solver_data["incumbent"], encoding),
+        }
+    )
+
+
+@app.route("/stats/<solver_id>")
+def get_stats(solver_id):
+    """Model build profile and CP-SAT search statistics of a finished solve"""
+    solver_data = get_solver(solver_id)
+    if solver_data is None:
+        return jsonify({"error": "Solver not found"}), 404
+
+    result = solver_data["result"] or {}
+    return jsonify(
+        {
+            "status": solver_data["status"],
+            "profile": result.get("profile"),
+            "stats": result.get("stats"),
+        }
+    )
+
+
+@app.route("/cache")
+def get_cache_stats():
+    """Hit/miss counters of the built model cache"""
+    return jsonify(get_executor().cache_stats())
 
 
 @app.errorhandler(404)
@@ -0,0 +1,239 @@
+"""Headless solver benchmarks.
+
+Solves scenarios of scenarios.make_scenario and records the model build time
+and size, the time to the first solution and to the target gap and the final
+objective. Results written with --output can be compared between commits with
+--baseline:
+
+    $ python benchmark.py --suite --output before.json
+    $ python benchmark.py --suite --baseline before.json
+
+--compare solves each scenario with the encodings selectable in a request,
+e.g. the eager and lazy 3-employee loop prevention or the span and counter
+sequence constraints:
+
+    $ python benchmark.py --compare loop_3_mode --employees 20 --sessions 16
+    $ python benchmark.py --compare sequence_encoding --sessions 32
+    $ python benchmark.py --compare break_evenness_encoding --gap-ratio 0
+
+--window solves long rosters window by window, see horizon:
+
+    $ python benchmark.py --sessions 64 --window 16
+
+Each run records when the gap first fell below each of GAP_MILESTONES, and
+the objective of the final roster under the default encodings, comparable
+between encodings that penalize differently.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import time
+
+import ortools
+
+from callback import ObjectiveEarlyStopping
+from evaluator import evaluate
+from horizon import solve_rolling_horizon
+from scenarios import make_scenario
+from solver import model_cache, solve_shift_scheduling
+from util import count_constraints, find_triple_loops
+
+# Request field -> values to compare.
+COMPARISONS = {
+    "loop_3_mode": ("eager", "lazy"),
+    "sequence_encoding": ("span", "counter"),
+    "break_evenness_encoding": ("square", "table", "piecewise", "deviation"),
+}
+
+# Gaps whose time to reach is recorded, e.g. to compare how fast the bound
+# closes.
+GAP_MILESTONES = (0.1, 0.05, 0.02, 0.01)
+
+# Scenario sizes of the suite: (employees, positions, sessions).
+SUITE = {
+    "small": (8, 4, 14),
+    "medium": (16, 8, 14),
+    "large": (24, 12, 28),
+    "xlarge": (32, 16, 28),
+}
+
+# Result fields compared against a baseline, lower is better for all.
+COMPARED = ("build_time", "time_to_first", "time_to_gap", "objective")
+
+
+class TimedEarlyStopping(ObjectiveEarlyStopping):
+    """Records when the first solution and the target gap are reached."""
+
+    def __init__(self, timer_limit: int, target_ratio: float):
+        super().__init__(timer_limit, target_ratio, lambda fields: None)
+        self._target = target_ratio
+        self.start = time.perf_counter()
+        self.time_to_first = None
+        self.time_to_gap = None
+        self.gap_times = dict.fromkeys(GAP_MILESTONES)
+
+    def on_solution_callback(self):
+        now = time.perf_counter() - self.start
+        if self.time_to_first is None:
+            self.time_to_first = now
+        super().on_solution_callback()
+        if self.time_to_gap is None and self.current_ratio() <= self._target:
+            self.time_to_gap = now
+        for gap, reached in self.gap_times.items():
+            if reached is None and self.current_ratio() <= gap:
+                self.gap_times[gap] = now
+
+
+def round_or_none(value: float | None, digits: int = 3) -> float | None:
+    return None if value is None else round(value, digits)
+
+
+def run(data: dict[str, any]) -> dict[str, any]:
+    """Builds and solves one request, returns timings and model size."""
+    # the solve below picks the model built here from the cache
+    model_cache.clear()
+    build_time = proto = clauses = None
+    # the windows of a rolling horizon are only built while solving
+    if not data.get("horizon"):
+        start = time.perf_counter()
+        shift_model = model_cache.get(data)
+        build_time = time.perf_counter() - start
+        proto = shift_model.model.proto
+        clauses = count_constraints(proto).get("bool_or", 0)
+
+    cb = TimedEarlyStopping(15, data["gap_ratio"])
+    solve = solve_rolling_horizon if data.get("horizon") else solve_shift_scheduling
+    result = solve(data, cb)
+    wall_time = time.perf_counter() - cb.start
+
+    solution = result and result["solution"]
+    # the final roster scored with the default encodings
+    reference = {
+        key: value for key, value in data.items() if key not in COMPARISONS
+    }
+    return {
+        "build_time": round_or_none(build_time),
+        "variables": len(proto.variables) if proto else None,
+        "constraints": len(proto.constraints) if proto else None,
+        "clauses": clauses,
+        "wall_time": round(wall_time, 3),
+        "time_to_first": round_or_none(cb.time_to_first),
+        "time_to_gap": round_or_none(cb.time_to_gap),
+        "gap": round(cb.current_ratio(), 4),
+        "gap_times": {
+            str(gap): round_or_none(reached) for gap, reached in cb.gap_times.items()
+        },
+        "objective": result.get("objective") if result else None,
+        "reference_objective": (
+            evaluate(solution, reference)["objective"] if solution else None
+        ),
+        "status": result["status"] if result else None,
+        "loops": len(find_triple_loops(solution)) if solution else None,
+        "loop_cuts": result.get("loop_cuts") if result else None,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict[str, dict], baseline: dict[str, dict]):
+    """Prints the change of the compared fields against a baseline run."""
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        changes = []
+        for key in COMPARED:
+            new, old = result.get(key), baseline[name].get(key)
+            if new is None or old is None:
+                changes.append(f"{key} {old} -> {new}")
+            elif old:
+                changes.append(f"{key} {old} -> {new} ({(new - old) / old:+.0%})")
+            else:
+                changes.append(f"{key} {old} -> {new}")
+        print(name, ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--suite", action="store_true", help="run the SUITE sizes")
+    parser.add_argument("--compare", choices=COMPARISONS)
+    parser.add_argument("--employees", type=int, default=20)
+    parser.add_argument("--positions", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=16)
+    parser.add_argument("--density", type=float, default=0.8)
+    parser.add_argument("--rating-density", type=float, default=1.0)
+    parser.add_argument("--fixed-density", type=float, default=0.0)
+    parser.add_argument("--transitions", type=int, default=0)
+    parser.add_argument("--max-time", type=float, default=30)
+    parser.add_argument("--gap-ratio", type=float, help="override the scenario's")
+    parser.add_argument("--window", type=int, help="rolling horizon window size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of a previous run")
+    args = parser.parse_args()
+
+    sizes = (
+        SUITE
+        if args.suite
+        else {"custom": (args.employees, args.positions, args.sessions)}
+    )
+    modes = COMPARISONS[args.compare] if args.compare else (None,)
+
+    results = {}
+    for size, (num_employees, num_positions, num_sessions) in sizes.items():
+        data = make_scenario(
+            num_employees,
+            num_positions,
+            num_sessions,
+            args.density,
+            args.seed,
+            args.rating_density,
+            args.fixed_density,
+            args.transitions,
+        )
+        data["max_time"] = args.max_time
+        if args.gap_ratio is not None:
+            data["gap_ratio"] = args.gap_ratio
+        if args.window:
+            data["horizon"] = {"window": args.window}
+        for mode in modes:
+            name = size if mode is None else f"{size}/{mode}"
+            if mode is not None:
+                data[args.compare] = mode
+            results[name] = run(data)
+            print(name, json.dumps(results[name]))
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            compare(results, json.load(f)["results"])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "commit": git_commit(),
+                    "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "ortools": ortools.__version__,
+                    "cpu_count": os.cpu_count(),
+                    "args": vars(args),
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
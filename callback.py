@@ -1,82 +1,120 @@
-from ortools.sat.python import cp_model
-from threading import Timer, Lock
-
-
-class ObjectiveEarlyStopping(cp_model.CpSolverSolutionCallback):
-    def __init__(
-        self,
-        timer_limit: int,
-        target_ratio: int,
-        acive_solvers: dict[str, any],
-        solver_id: str,
-        solver_lock: Lock,
-    ):
-        super(ObjectiveEarlyStopping, self).__init__()
-        self._timer_limit = timer_limit
-        self._timer = None
-        self._counter = 0
-        self._previous_length = 0
-        self._current_gap = 0
-        self._current_ratio = 0
-        self._target_ratio = target_ratio
-        self._active_solvers = acive_solvers
-        self._solver_lock = solver_lock
-        self._solver_id = solver_id
-        self._interrupted = False
-
-    def on_solution_callback(self):
-        self._current_gap = abs(self.objective_value - self.best_objective_bound)
-        self._current_ratio = self._current_gap / max(1, self.best_objective_bound)
-
-        if self._interrupted or self._current_ratio <= self._target_ratio:
-            self.StopSearch()
-            return
-
-        with self._solver_lock:
-            if self._solver_id in self._active_solvers:
-                self._active_solvers[self._solver_id]["status"] = "solving"
-                self._active_solvers[self._solver_id]["progress"] = round(
-                    max(
-                        (0.1 - self._current_ratio) / (0.1 - self._target_ratio) * 100,
-                        0,
-                    ),
-                    2,
-                )
-
-        self._counter += 1
-        self._active_solvers[self._solver_id]["count"] = self._counter
-        self._reset_timer()
-
-    def _reset_timer(self):
-        self.clear_timer()
-        self._timer = Timer(self._timer_limit, self.StopSearch)
-        self._timer.start()
-
-    def clear_timer(self):
-        if self._timer:
-            self._timer.cancel()
-
-    def StopSearch(self):
-        self.clear_timer()
-
-        with self._solver_lock:
-            if self._solver_id in self._active_solvers:
-                if self._interrupted:
-                    self._active_solvers[self._solver_id]["status"] = "interrupted"
-                    self._active_solvers[self._solver_id]["progress"] = 0
-                else:
-                    self._active_solvers[self._solver_id]["status"] = "completed"
-                    self._active_solvers[self._solver_id]["progress"] = 100
-
-        super().StopSearch()
-
-    def is_interrupted(self):
-        return self._interrupted
-
-    def InterruptSearch(self):
-        self.clear_timer()
-        self._interrupted = True
-        super().StopSearch()
-
-    def current_ratio(self):
-        return self._current_ratio
+import numpy as np
+from ortools.sat.python import cp_model
+from typing import Callable
+
+from timers import watchdog
+
+
+class ObjectiveEarlyStopping(cp_model.CpSolverSolutionCallback):
+    def __init__(
+        self,
+        timer_limit: int,
+        target_ratio: int,
+        publish: Callable[[dict[str, any]], None],
+    ):
+        super(ObjectiveEarlyStopping, self).__init__()
+        self._timer_limit = timer_limit
+        # stagnation timeout, armed while searching, see _reset_timer
+        self._timer = None
+        # hard limit on the whole solve, see set_deadline
+        self._deadline = None
+        self._counter = 0
+        self._previous_length = 0
+        self._current_gap = 0
+        self._current_ratio = 0
+        self._target_ratio = target_ratio
+        # receives the progress fields of the solver entry to update
+        self._publish = publish
+        self._interrupted = False
+        # reads the roster out of the variable values, see watch
+        self._roster = None
+
+    def on_solution_callback(self):
+        self._current_gap = abs(self.objective_value - self.best_objective_bound)
+        self._current_ratio = self._current_gap / max(1, self.best_objective_bound)
+
+        if self._interrupted or self._current_ratio <= self._target_ratio:
+            self.StopSearch()
+            return
+
+        self._counter += 1
+        fields = {
+            "status": "solving",
+            "progress": round(
+                max(
+                    (0.1 - self._current_ratio) / (0.1 - self._target_ratio) * 100,
+                    0,
+                ),
+                2,
+            ),
+            "count": self._counter,
+        }
+        if self._roster:
+            fields["incumbent"] = {
+                "solution": self._roster(np.asarray(self.response_proto.solution)),
+                "objective": self.objective_value,
+                "bound": self.best_objective_bound,
+                "gap": round(self._current_ratio, 4),
+                "time": round(self.wall_time, 3),
+            }
+        self._publish(fields)
+        self._reset_timer()
+
+    def watch(self, roster: Callable[[np.ndarray], list[list[int]]]):
+        """Publishes each improving roster as "incumbent" with the progress.
+
+        roster reads the roster out of the values of all the model variables.
+        """
+        self._roster = roster
+
+    def _reset_timer(self):
+        if self._timer is None:
+            self._timer = watchdog.schedule(self._timer_limit, self.StopSearch)
+        else:
+            watchdog.reset(self._timer, self._timer_limit)
+
+    def clear_timer(self):
+        if self._timer:
+            watchdog.cancel(self._timer)
+            self._timer = None
+
+    def set_deadline(self, seconds: float):
+        """Stops the search seconds from now, even across re-solves.
+
+        A safety net over the solver time limit, only effective while a
+        search is running.
+        """
+        self.clear_deadline()
+        self._deadline = watchdog.schedule(seconds, self._on_deadline)
+
+    def clear_deadline(self):
+        if self._deadline:
+            watchdog.cancel(self._deadline)
+            self._deadline = None
+
+    def _on_deadline(self):
+        # the stagnation timer is only armed during a search
+        if self._timer is not None:
+            self.StopSearch()
+
+    def StopSearch(self):
+        self.clear_timer()
+
+        # "completed" is only published with the result, once the solve returns
+        if self._interrupted:
+            self._publish({"status": "interrupted", "progress": 0})
+        else:
+            self._publish({"progress": 100})
+
+        super().StopSearch()
+
+    def is_interrupted(self):
+        return self._interrupted
+
+    def InterruptSearch(self):
+        self.clear_timer()
+        self._interrupted = True
+        super().StopSearch()
+
+    def current_ratio(self):
+        return self._current_ratio
@@ -1,274 +1,456 @@
-from ortools.sat.python import cp_model
-import json
-
-
-def negated_bounded_span(
-    works: list[cp_model.BoolVarT], start: int, length: int
-) -> list[cp_model.BoolVarT]:
-    """Filters an isolated sub-sequence of variables assined to True.
-
-    Extract the span of Boolean variables [start, start + length), negate them,
-    and if there is variables to the left/right of this span, surround the span by
-    them in non negated form.
-
-    Args:
-      works: a list of variables to extract the span from.
-      start: the start to the span.
-      length: the length of the span.
-
-    Returns:
-      a list of variables which conjunction will be false if the sub-list is
-      assigned to True, and correctly bounded by variables assigned to False,
-      or by the start or end of works.
-    """
-    sequence = []
-    # left border (start of works, or works[start - 1])
-    if start > 0:
-        sequence.append(works[start - 1])
-    for i in range(length):
-        sequence.append(~works[start + i])
-    # right border (end of works or works[start + length])
-    if start + length < len(works):
-        sequence.append(works[start + length])
-    return sequence
-
-
-def bounded_span(
-    model: cp_model.CpModel, works: list[cp_model.BoolVarT], length: int
-) -> list[cp_model.BoolVarT]:
-    span_worked = []
-    for i in range(len(works) - length + 1):
-        # Create a Boolean variable to represent whether this span is fully worked
-        span_var = model.new_bool_var(f"")
-        span = works[i : i + length]
-
-        # Ensure that if span_var is True, all shifts in the span are worked
-        model.add(sum(span) >= length).only_enforce_if(span_var)
-
-        # Add the span_var to the list
-        span_worked.append(span_var)
-
-    return span_worked
-
-
-def add_soft_sequence_constraint(
-    model: cp_model.CpModel,
-    works: list[cp_model.BoolVarT],
-    hard_min: int,
-    soft_min: int,
-    min_cost: int,
-    soft_max: int,
-    hard_max: int,
-    max_cost: int,
-    prefix: dict,
-) -> tuple[list[cp_model.BoolVarT], list[int]]:
-    """Sequence constraint on true variables with soft and hard bounds.
-
-    This constraint look at every maximal contiguous sequence of variables
-    assigned to true. If forbids sequence of length < hard_min or > hard_max.
-    Then it creates penalty terms if the length is < soft_min or > soft_max.
-
-    Args:
-      model: the sequence constraint is built on this model.
-      works: a list of Boolean variables.
-      hard_min: any sequence of true variables must have a length of at least
-        hard_min.
-      soft_min: any sequence should have a length of at least soft_min, or a
-        linear penalty on the delta will be added to the objective.
-      min_cost: the coefficient of the linear penalty if the length is less than
-        soft_min.
-      soft_max: any sequence should have a length of at most soft_max, or a linear
-        penalty on the delta will be added to the objective.
-      hard_max: any sequence of true variables must have a length of at most
-        hard_max.
-      max_cost: the coefficient of the linear penalty if the length is more than
-        soft_max.
-      prefix: a base name for penalty literals.
-
-    Returns:
-      a tuple (variables_list, coefficient_list) containing the different
-      penalties created by the sequence constraint.
-    """
-    cost_literals = []
-    cost_coefficients = []
-
-    # Forbid sequences that are too short.
-    if hard_min > 0:
-        for length in range(1, hard_min):
-            for start in range(len(works) - length + 1):
-                model.add_bool_or(negated_bounded_span(works, start, length))
-
-    # Penalize sequences that are below the soft limit.
-    if min_cost > 0:
-        for length in range(hard_min, soft_min):
-            for start in range(len(works) - length + 1):
-                span = negated_bounded_span(works, start, length)
-                prefix["violation"] = f"under_span(start={start}, length={length})"
-                # name = f": under_span(start={start}, length={length})"
-                lit = model.new_bool_var(json.dumps(prefix))
-                span.append(lit)
-                model.add_bool_or(span)
-                cost_literals.append(lit)
-                # We filter exactly the sequence with a short length.
-                # The penalty is proportional to the delta with soft_min.
-                cost_coefficients.append(min_cost * (soft_min - length))
-
-    # Penalize sequences that are above the soft limit.
-    if max_cost > 0:
-        for length in range(soft_max + 1, hard_max + 1):
-            for start in range(len(works) - length + 1):
-                span = negated_bounded_span(works, start, length)
-                prefix["violation"] = f"over_span(start={start}, length={length})"
-                # name = f": over_span(start={start}, length={length})"
-                lit = model.new_bool_var(json.dumps(prefix))
-                span.append(lit)
-                model.add_bool_or(span)
-                cost_literals.append(lit)
-                # Cost paid is max_cost * excess length.
-                cost_coefficients.append(max_cost * (length - soft_max))
-
-    # Just forbid any sequence of true variables with length hard_max + 1
-    if hard_max > 0:
-        for start in range(len(works) - hard_max):
-            model.add_bool_or([~works[i] for i in range(start, start + hard_max + 1)])
-
-    return cost_literals, cost_coefficients
-
-
-def add_rev_soft_sequence_constraint(
-    model: cp_model.CpModel,
-    works: list[cp_model.BoolVarT],
-    hard_max: int,
-) -> tuple[list[cp_model.BoolVarT], list[int]]:
-    # todo documentation
-    cost_literals = []
-    cost_coefficients = []
-
-    # Just forbid any sequence of false variables with length hard_max + 1
-    for start in range(len(works) - hard_max):
-        model.add_bool_or([works[i] for i in range(start, start + hard_max + 1)])
-    return cost_literals, cost_coefficients
-
-
-def add_soft_sum_constraint(
-    model: cp_model.CpModel,
-    works: list[cp_model.BoolVarT],
-    hard_min: int,
-    soft_min: int,
-    min_cost: int,
-    soft_max: int,
-    hard_max: int,
-    max_cost: int,
-    max_val: int,
-    prefix: dict,
-) -> tuple[list[cp_model.IntVar], list[int]]:
-    """sum constraint with soft and hard bounds.
-
-    This constraint counts the variables assigned to true from works.
-    If forbids sum < hard_min or > hard_max.
-    Then it creates penalty terms if the sum is < soft_min or > soft_max.
-
-    Args:
-      model: the sequence constraint is built on this model.
-      works: a list of Boolean variables.
-      hard_min: any sequence of true variables must have a sum of at least
-        hard_min.
-      soft_min: any sequence should have a sum of at least soft_min, or a linear
-        penalty on the delta will be added to the objective.
-      min_cost: the coefficient of the linear penalty if the sum is less than
-        soft_min.
-      soft_max: any sequence should have a sum of at most soft_max, or a linear
-        penalty on the delta will be added to the objective.
-      hard_max: any sequence of true variables must have a sum of at most
-        hard_max.
-      max_cost: the coefficient of the linear penalty if the sum is more than
-        soft_max.
-      prefix: a base name for penalty variables.
-
-    Returns:
-      a tuple (variables_list, coefficient_list) containing the different
-      penalties created by the sequence constraint.
-    """
-    cost_variables = []
-    cost_coefficients = []
-    if hard_max == 0 or max_cost == 0:
-        sum_var = model.new_int_var(hard_min, len(works), "")
-    else:
-        sum_var = model.new_int_var(hard_min, hard_max, "")
-
-    # This adds the hard constraints on the sum.
-    model.add(sum_var == sum(works))
-
-    # Penalize sums below the soft_min target.
-    if soft_min > hard_min and min_cost > 0:
-        delta = model.new_int_var(-len(works), len(works), "")
-        model.add(delta == soft_min - sum_var)
-        # TODO(user): Compare efficiency with only excess >= soft_min - sum_var.
-        prefix["violation"] = f"under_sum"
-        excess = model.new_int_var(0, max_val, json.dumps(prefix))
-        # excess = model.new_int_var(0, max_val, prefix + ": under_sum")
-        model.add(excess >= soft_min - sum_var)
-        model.add_max_equality(excess, [delta, 0])
-        cost_variables.append(excess)
-        cost_coefficients.append(min_cost)
-
-    # Penalize sums above the soft_max target.
-    if soft_max < hard_max and max_cost > 0:
-        delta = model.new_int_var(-max_val, max_val, "")
-        model.add(delta == sum_var - soft_max)
-        prefix["violation"] = f"over_sum"
-        excess = model.new_int_var(0, max_val, json.dumps(prefix))
-        # excess = model.new_int_var(0, max_val, prefix + ": over_sum")
-        model.add_max_equality(excess, [delta, 0])
-        cost_variables.append(excess)
-        cost_coefficients.append(max_cost)
-
-    return cost_variables, cost_coefficients
-
-
-def add_one_set_constraint(
-    model: cp_model.CpModel,
-    works: list[cp_model.BoolVarT],
-    hard_min: int,
-    soft_min: int,
-    min_cost: int,
-    prefix: dict,
-) -> tuple[list[cp_model.BoolVarT], list[int]]:
-    """
-    Adds a constraint to ensure that there is at least one group of `soft_min` consecutive shifts.
-    If the constraint is not met, a penalty is applied.
-
-    :param model: The CP-SAT model.
-    :param works: List of Boolean variables representing shifts.
-    :param hard_min: Minimum number of shifts that must be worked (hard constraint).
-    :param soft_min: Desired number of consecutive shifts (soft constraint).
-    :param min_cost: Penalty cost if the soft constraint is violated.
-    :param prefix: Prefix for naming variables.
-    :return: A tuple of (cost_literals, cost_coefficients) for penalties.
-    """
-    cost_literals = []
-    cost_coefficients = []
-
-    # Ensure soft_min is valid
-    if soft_min > len(works):
-        raise ValueError("soft_min cannot be greater than the number of shifts.")
-
-    # Add hard constraint: at least hard_min shifts must be worked
-    model.add_bool_or(bounded_span(model, works, hard_min))
-
-    if soft_min > hard_min:
-        # Create a violation literal
-        violation_lit = model.new_bool_var(json.dumps(prefix))
-
-        # Create a list to track whether each span of soft_min consecutive shifts is worked
-        span_worked = bounded_span(model, works, soft_min)
-        span_worked.append(violation_lit)
-
-        # Ensure that at least one span is worked, or the violation_lit is True
-        model.add_bool_or(span_worked)
-
-        # Add penalty for violating the soft constraint
-        cost_literals.append(violation_lit)
-        cost_coefficients.append(min_cost)
-
-    return cost_literals, cost_coefficients
+import numpy as np
+from ortools.sat.python import cp_model
+
+from penalties import PenaltyScope
+
+
+class WorkGrid:
+    """Work variables of every (employee, position, session) cell.
+
+    The variables are stored in one flat list, cell (e, p, d) at index
+    (e * num_positions + p) * num_sessions + d. The sessions of an employee on
+    a position are then a contiguous slice and the employees or positions of a
+    session a strided one, so the lists the constraint helpers take are built
+    without a lookup per cell. Cells that cannot be set or must be set hold the
+    model constants, shared by every such cell.
+    """
+
+    def __init__(
+        self,
+        num_employees: int,
+        num_positions: int,
+        num_sessions: int,
+        cells: list[cp_model.IntVar] | None = None,
+    ):
+        self.num_employees = num_employees
+        self.num_positions = num_positions
+        self.num_sessions = num_sessions
+        size = num_employees * num_positions * num_sessions
+        self.cells = [None] * size if cells is None else cells
+        self._index = None
+
+    def __getitem__(self, key: tuple[int, int, int]) -> cp_model.IntVar:
+        e, p, d = key
+        return self.cells[(e * self.num_positions + p) * self.num_sessions + d]
+
+    def __setitem__(self, key: tuple[int, int, int], var: cp_model.IntVar):
+        e, p, d = key
+        self.cells[(e * self.num_positions + p) * self.num_sessions + d] = var
+        self._index = None
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def row(
+        self, e: int, p: int, start: int = 0, end: int | None = None
+    ) -> list[cp_model.IntVar]:
+        """Variables of employee e on position p in sessions [start, end)."""
+        base = (e * self.num_positions + p) * self.num_sessions
+        if end is None:
+            end = self.num_sessions
+        return self.cells[base + start : base + end]
+
+    def column(self, p: int, d: int) -> list[cp_model.IntVar]:
+        """Variables of every employee on position p in session d."""
+        stride = self.num_positions * self.num_sessions
+        return self.cells[p * self.num_sessions + d :: stride]
+
+    def positions(self, e: int, d: int) -> list[cp_model.IntVar]:
+        """Variables of employee e on every position in session d."""
+        stride = self.num_positions * self.num_sessions
+        start = e * stride + d
+        return self.cells[start : start + stride : self.num_sessions]
+
+    def index(self) -> np.ndarray:
+        """Variable index of each cell, shaped (employee, position, session)."""
+        if self._index is None:
+            self._index = np.fromiter(
+                (var.index for var in self.cells), dtype=np.int32, count=len(self)
+            ).reshape(self.num_employees, self.num_positions, self.num_sessions)
+        return self._index
+
+    def copy(self, model: cp_model.CpModel) -> "WorkGrid":
+        """The same cells, taken from model, a clone of the model they are in."""
+        variables = {}
+        cells = []
+        for var in self.cells:
+            copied = variables.get(var.index)
+            if copied is None:
+                copied = model.get_bool_var_from_proto_index(var.index)
+                variables[var.index] = copied
+            cells.append(copied)
+        grid = WorkGrid(
+            self.num_employees, self.num_positions, self.num_sessions, cells
+        )
+        grid._index = self._index
+        return grid
+
+
+def negated_bounded_span(
+    works: list[cp_model.BoolVarT], start: int, length: int
+) -> list[cp_model.BoolVarT]:
+    """Filters an isolated sub-sequence of variables assined to True.
+
+    Extract the span of Boolean variables [start, start + length), negate them,
+    and if there is variables to the left/right of this span, surround the span by
+    them in non negated form.
+
+    Args:
+      works: a list of variables to extract the span from.
+      start: the start to the span.
+      length: the length of the span.
+
+    Returns:
+      a list of variables which conjunction will be false if the sub-list is
+      assigned to True, and correctly bounded by variables assigned to False,
+      or by the start or end of works.
+    """
+    sequence = []
+    # left border (start of works, or works[start - 1])
+    if start > 0:
+        sequence.append(works[start - 1])
+    for i in range(length):
+        sequence.append(~works[start + i])
+    # right border (end of works or works[start + length])
+    if start + length < len(works):
+        sequence.append(works[start + length])
+    return sequence
+
+
+def bounded_span(
+    model: cp_model.CpModel, works: list[cp_model.BoolVarT], length: int
+) -> list[cp_model.BoolVarT]:
+    span_worked = []
+    for i in range(len(works) - length + 1):
+        # Create a Boolean variable to represent whether this span is fully worked
+        span_var = model.new_bool_var("")
+        span = works[i : i + length]
+
+        # Ensure that if span_var is True, all shifts in the span are worked
+        model.add(sum(span) >= length).only_enforce_if(span_var)
+
+        # Add the span_var to the list
+        span_worked.append(span_var)
+
+    return span_worked
+
+
+def add_soft_sequence_constraint(
+    model: cp_model.CpModel,
+    works: list[cp_model.BoolVarT],
+    hard_min: int,
+    soft_min: int,
+    min_cost: int,
+    soft_max: int,
+    hard_max: int,
+    max_cost: int,
+    prefix: PenaltyScope,
+    encoding: str = "span",
+) -> tuple[list[cp_model.BoolVarT], list[int]]:
+    """Sequence constraint on true variables with soft and hard bounds.
+
+    This constraint look at every maximal contiguous sequence of variables
+    assigned to true. If forbids sequence of length < hard_min or > hard_max.
+    Then it creates penalty terms if the length is < soft_min or > soft_max.
+
+    Args:
+      model: the sequence constraint is built on this model.
+      works: a list of Boolean variables.
+      hard_min: any sequence of true variables must have a length of at least
+        hard_min.
+      soft_min: any sequence should have a length of at least soft_min, or a
+        linear penalty on the delta will be added to the objective.
+      min_cost: the coefficient of the linear penalty if the length is less than
+        soft_min.
+      soft_max: any sequence should have a length of at most soft_max, or a linear
+        penalty on the delta will be added to the objective.
+      hard_max: any sequence of true variables must have a length of at most
+        hard_max.
+      max_cost: the coefficient of the linear penalty if the length is more than
+        soft_max.
+      prefix: registry scope the penalties are recorded in.
+      encoding: "span" enumerates every (start, length) span, "counter" tracks
+        the run length instead, see add_counter_sequence_constraint.
+
+    Returns:
+      a tuple (variables_list, coefficient_list) containing the different
+      penalties created by the sequence constraint.
+    """
+    if encoding == "counter":
+        return add_counter_sequence_constraint(
+            model,
+            works,
+            hard_min,
+            soft_min,
+            min_cost,
+            soft_max,
+            hard_max,
+            max_cost,
+            prefix,
+        )
+
+    cost_literals = []
+    cost_coefficients = []
+
+    # Forbid sequences that are too short.
+    if hard_min > 0:
+        for length in range(1, hard_min):
+            for start in range(len(works) - length + 1):
+                model.add_bool_or(negated_bounded_span(works, start, length))
+
+    # Penalize sequences that are below the soft limit.
+    if min_cost > 0:
+        for length in range(hard_min, soft_min):
+            for start in range(len(works) - length + 1):
+                span = negated_bounded_span(works, start, length)
+                lit = model.new_bool_var("")
+                span.append(lit)
+                model.add_bool_or(span)
+                cost_literals.append(lit)
+                # We filter exactly the sequence with a short length.
+                # The penalty is proportional to the delta with soft_min.
+                cost_coefficients.append(min_cost * (soft_min - length))
+                prefix.add(
+                    lit,
+                    min_cost,
+                    "under_span",
+                    factor=soft_min - length,
+                    start=start,
+                    length=length,
+                )
+
+    # Penalize sequences that are above the soft limit.
+    if max_cost > 0:
+        for length in range(soft_max + 1, hard_max + 1):
+            for start in range(len(works) - length + 1):
+                span = negated_bounded_span(works, start, length)
+                lit = model.new_bool_var("")
+                span.append(lit)
+                model.add_bool_or(span)
+                cost_literals.append(lit)
+                # Cost paid is max_cost * excess length.
+                cost_coefficients.append(max_cost * (length - soft_max))
+                prefix.add(
+                    lit,
+                    max_cost,
+                    "over_span",
+                    factor=length - soft_max,
+                    start=start,
+                    length=length,
+                )
+
+    # Just forbid any sequence of true variables with length hard_max + 1
+    if hard_max > 0:
+        for start in range(len(works) - hard_max):
+            model.add_bool_or([~works[i] for i in range(start, start + hard_max + 1)])
+
+    return cost_literals, cost_coefficients
+
+
+def add_counter_sequence_constraint(
+    model: cp_model.CpModel,
+    works: list[cp_model.BoolVarT],
+    hard_min: int,
+    soft_min: int,
+    min_cost: int,
+    soft_max: int,
+    hard_max: int,
+    max_cost: int,
+    prefix: PenaltyScope,
+) -> tuple[list[cp_model.IntVar], list[int]]:
+    """Run-length counter encoding of add_soft_sequence_constraint.
+
+    run[i] is the length of the sequence of true variables ending at i, and
+    end[i] is true when such a sequence ends at i. A sequence of length L
+    costs min_cost * (soft_min - L) through one under variable at its end, and
+    max_cost * (L - soft_max) through one over literal per variable past
+    soft_max, so the model grows linearly with len(works) instead of with the
+    number of spans. Unlike the span encoding, an empty sequence is never
+    penalized when hard_min is 0. Penalties are recorded with the session they
+    are paid at as start.
+
+    Returns:
+      a tuple (variables_list, coefficient_list) containing the different
+      penalties created by the sequence constraint.
+    """
+    cost_variables = []
+    cost_coefficients = []
+    n = len(works)
+    max_run = hard_max if 0 < hard_max < n else n
+    penalize_under = min_cost > 0 and soft_min > max(hard_min, 1)
+    penalize_over = max_cost > 0 and soft_max < hard_max
+
+    previous = 0
+    for i in range(n):
+        run = model.new_int_var(0, max_run, "")
+        model.add(run == previous + 1).only_enforce_if(works[i])
+        model.add(run == 0).only_enforce_if(~works[i])
+        previous = run
+
+        if hard_min > 1 or penalize_under:
+            end = works[i]
+            if i + 1 < n:
+                end = model.new_bool_var("")
+                model.add_bool_or([~works[i], works[i + 1], end])
+                model.add_implication(end, works[i])
+                model.add_implication(end, ~works[i + 1])
+
+            # Forbid sequences that are too short.
+            if hard_min > 1:
+                model.add(run >= hard_min).only_enforce_if(end)
+
+            # Penalize sequences that are below the soft limit.
+            if penalize_under:
+                under = model.new_int_var(0, soft_min - max(hard_min, 1), "")
+                model.add(under >= soft_min - run).only_enforce_if(end)
+                cost_variables.append(under)
+                cost_coefficients.append(min_cost)
+                prefix.add(under, min_cost, "under_run", start=i)
+
+        # Penalize each variable of a sequence past the soft limit.
+        if penalize_over and i >= soft_max:
+            over = model.new_bool_var("")
+            model.add(run <= soft_max).only_enforce_if(~over)
+            cost_variables.append(over)
+            cost_coefficients.append(max_cost)
+            prefix.add(over, max_cost, "over_run", start=i)
+
+    return cost_variables, cost_coefficients
+
+
+def add_rev_soft_sequence_constraint(
+    model: cp_model.CpModel,
+    works: list[cp_model.BoolVarT],
+    hard_max: int,
+) -> tuple[list[cp_model.BoolVarT], list[int]]:
+    # todo documentation
+    cost_literals = []
+    cost_coefficients = []
+
+    # Just forbid any sequence of false variables with length hard_max + 1
+    for start in range(len(works) - hard_max):
+        model.add_bool_or([works[i] for i in range(start, start + hard_max + 1)])
+    return cost_literals, cost_coefficients
+
+
+def add_soft_sum_constraint(
+    model: cp_model.CpModel,
+    works: list[cp_model.BoolVarT],
+    hard_min: int,
+    soft_min: int,
+    min_cost: int,
+    soft_max: int,
+    hard_max: int,
+    max_cost: int,
+    max_val: int,
+    prefix: PenaltyScope,
+) -> tuple[list[cp_model.IntVar], list[int]]:
+    """sum constraint with soft and hard bounds.
+
+    This constraint counts the variables assigned to true from works.
+    If forbids sum < hard_min or > hard_max.
+    Then it creates penalty terms if the sum is < soft_min or > soft_max.
+
+    Args:
+      model: the sequence constraint is built on this model.
+      works: a list of Boolean variables.
+      hard_min: any sequence of true variables must have a sum of at least
+        hard_min.
+      soft_min: any sequence should have a sum of at least soft_min, or a linear
+        penalty on the delta will be added to the objective.
+      min_cost: the coefficient of the linear penalty if the sum is less than
+        soft_min.
+      soft_max: any sequence should have a sum of at most soft_max, or a linear
+        penalty on the delta will be added to the objective.
+      hard_max: any sequence of true variables must have a sum of at most
+        hard_max.
+      max_cost: the coefficient of the linear penalty if the sum is more than
+        soft_max.
+      prefix: registry scope the penalties are recorded in.
+
+    Returns:
+      a tuple (variables_list, coefficient_list) containing the different
+      penalties created by the sequence constraint.
+    """
+    cost_variables = []
+    cost_coefficients = []
+    if hard_max == 0 or max_cost == 0:
+        sum_var = model.new_int_var(hard_min, len(works), "")
+    else:
+        sum_var = model.new_int_var(hard_min, hard_max, "")
+
+    # This adds the hard constraints on the sum.
+    model.add(sum_var == sum(works))
+
+    # Penalize sums below the soft_min target.
+    if soft_min > hard_min and min_cost > 0:
+        delta = model.new_int_var(-len(works), len(works), "")
+        model.add(delta == soft_min - sum_var)
+        # TODO(user): Compare efficiency with only excess >= soft_min - sum_var.
+        excess = model.new_int_var(0, max_val, "")
+        model.add(excess >= soft_min - sum_var)
+        model.add_max_equality(excess, [delta, 0])
+        cost_variables.append(excess)
+        cost_coefficients.append(min_cost)
+        prefix.add(excess, min_cost, "under_sum")
+
+    # Penalize sums above the soft_max target.
+    if soft_max < hard_max and max_cost > 0:
+        delta = model.new_int_var(-max_val, max_val, "")
+        model.add(delta == sum_var - soft_max)
+        excess = model.new_int_var(0, max_val, "")
+        model.add_max_equality(excess, [delta, 0])
+        cost_variables.append(excess)
+        cost_coefficients.append(max_cost)
+        prefix.add(excess, max_cost, "over_sum")
+
+    return cost_variables, cost_coefficients
+
+
+def add_one_set_constraint(
+    model: cp_model.CpModel,
+    works: list[cp_model.BoolVarT],
+    hard_min: int,
+    soft_min: int,
+    min_cost: int,
+    prefix: PenaltyScope,
+) -> tuple[list[cp_model.BoolVarT], list[int]]:
+    """
+    Adds a constraint to ensure that there is at least one group of `soft_min` consecutive shifts.
+    If the constraint is not met, a penalty is applied.
+
+    :param model: The CP-SAT model.
+    :param works: List of Boolean variables representing shifts.
+    :param hard_min: Minimum number of shifts that must be worked (hard constraint).
+    :param soft_min: Desired number of consecutive shifts (soft constraint).
+    :param min_cost: Penalty cost if the soft constraint is violated.
+    :param prefix: Registry scope the penalty is recorded in.
+    :return: A tuple of (cost_literals, cost_coefficients) for penalties.
+    """
+    cost_literals = []
+    cost_coefficients = []
+
+    # Ensure soft_min is valid
+    if soft_min > len(works):
+        raise ValueError("soft_min cannot be greater than the number of shifts.")
+
+    # Add hard constraint: at least hard_min shifts must be worked
+    model.add_bool_or(bounded_span(model, works, hard_min))
+
+    if soft_min > hard_min:
+        # Create a violation literal
+        violation_lit = model.new_bool_var("")
+
+        # Create a list to track whether each span of soft_min consecutive shifts is worked
+        span_worked = bounded_span(model, works, soft_min)
+        span_worked.append(violation_lit)
+
+        # Ensure that at least one span is worked, or the violation_lit is True
+        model.add_bool_or(span_worked)
+
+        # Add penalty for violating the soft constraint
+        cost_literals.append(violation_lit)
+        cost_coefficients.append(min_cost)
+        prefix.add(violation_lit, min_cost, "one_set")
+
+    return cost_literals, cost_coefficients
@@ -0,0 +1,428 @@
+"""Scores a roster against a request without solving.
+
+evaluate recomputes every objective term build_model creates, and checks every
+hard constraint, with array operations on the employee x session position
+matrix. Penalty variables of a solve settle to the smallest value the work
+variables allow, so the objective returned is the one CP-SAT reports for the
+same roster once the search has converged on it, and a lower bound of the
+objective of any intermediate solution.
+"""
+
+import math
+
+import numpy as np
+
+from penalties import DEFAULT_WEIGHTS
+from util import rated_positions
+
+
+def runs(rows: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Maximal runs of true values in each row of a boolean matrix.
+
+    Returns:
+      the row, start and length of each run, in row then start order.
+    """
+    padded = np.zeros((rows.shape[0], rows.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = rows
+    steps = np.diff(padded, axis=1)
+    row, start = np.nonzero(steps == 1)
+    _, end = np.nonzero(steps == -1)
+    return row, start, end - start
+
+
+def sequence_costs(
+    works: np.ndarray,
+    hard_min: int,
+    soft_min: int,
+    min_cost: int,
+    soft_max: int,
+    hard_max: int,
+    max_cost: int,
+    encoding: str = "span",
+) -> tuple[np.ndarray, tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Penalty of add_soft_sequence_constraint on each row of works.
+
+    Returns:
+      the penalty of each row, and the (row, start, length) of the runs
+      breaking the hard bounds.
+    """
+    row, start, length = runs(works)
+    cost = np.zeros(len(row), dtype=np.int64)
+    if min_cost > 0:
+        under = (length >= hard_min) & (length < soft_min)
+        cost += np.where(under, min_cost * (soft_min - length), 0)
+    if max_cost > 0:
+        over = (length > soft_max) & (length <= hard_max)
+        cost += np.where(over, max_cost * (length - soft_max), 0)
+    totals = np.bincount(row, weights=cost, minlength=len(works)).astype(np.int64)
+
+    # the span encoding also penalizes empty sequences, between two false
+    # values or a false value and an end of works
+    if encoding == "span" and hard_min == 0 and min_cost > 0 and soft_min > 0:
+        padded = np.zeros((works.shape[0], works.shape[1] + 2), dtype=bool)
+        padded[:, 1:-1] = works
+        gaps = ~padded[:, :-1] & ~padded[:, 1:]
+        totals += min_cost * soft_min * gaps.sum(axis=1)
+
+    bad = length < hard_min
+    if hard_max > 0:
+        bad |= length > hard_max
+    return totals, (row[bad], start[bad], length[bad])
+
+
+def sum_costs(
+    counts: np.ndarray,
+    hard_min: int,
+    soft_min: int,
+    min_cost: int,
+    soft_max: int,
+    hard_max: int,
+    max_cost: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Penalty of add_soft_sum_constraint on each count.
+
+    Returns:
+      the penalty of each count, and whether it breaks the hard bounds.
+    """
+    cost = np.zeros(counts.shape, dtype=np.int64)
+    if soft_min > hard_min and min_cost > 0:
+        cost += min_cost * np.maximum(soft_min - counts, 0)
+    if soft_max < hard_max and max_cost > 0:
+        cost += max_cost * np.maximum(counts - soft_max, 0)
+    bad = counts < hard_min
+    if hard_max != 0 and max_cost != 0:
+        bad |= counts > hard_max
+    return cost, bad
+
+
+def move_counts(solution: np.ndarray, num_positions: int) -> np.ndarray:
+    """moves[d, s1, s2], the staff moving from position s1 to s2 after session d.
+
+    Breaks and staying on a position are not moves.
+    """
+    num_sessions = solution.shape[1]
+    moves = np.zeros((max(num_sessions - 1, 0), num_positions, num_positions), int)
+    source, target = solution[:, :-1], solution[:, 1:]
+    moved = (source > 0) & (target > 0) & (source != target)
+    d = np.nonzero(moved)[1]
+    np.add.at(moves, (d, source[moved], target[moved]), 1)
+    return moves
+
+
+def evaluate(solution: list[list[int]], data: dict[str, any]) -> dict[str, any]:
+    """Objective and hard constraint violations of a roster.
+
+    Args:
+      solution: the position of each employee in each session, 0 being a
+        break, e.g. a result solution edited by hand.
+      data: the request payload the roster is for.
+
+    Returns:
+      the "objective", its terms summed by penalty name in "penalties", the
+      hard constraints broken in "violations", each with a message, and
+      whether the roster is "feasible", i.e. breaks none.
+
+    Raises:
+      ValueError: if the roster does not match the request size.
+    """
+    num_employees = data.get("num_employees")
+    num_positions = len(data.get("positions")) + 1
+    cover_demands = np.asarray(data.get("cover_demands", []), dtype=int).reshape(
+        -1, num_positions - 1
+    )
+    num_sessions = len(cover_demands)
+    max_continous_work = data.get("max_continous_work", 4)
+    min_breaks = math.floor(num_sessions / (max_continous_work + 1))
+    constraints = data.get("constraints", {})
+    weights = {**DEFAULT_WEIGHTS, **data["weights"]}
+    encoding = data.get("sequence_encoding", "span")
+
+    solution = np.asarray(solution, dtype=int)
+    if solution.shape != (num_employees, num_sessions):
+        raise ValueError(
+            f"Roster of shape {list(solution.shape)}, expected "
+            f"[{num_employees}, {num_sessions}] (staff, sessions)"
+        )
+    if solution.size and not (0 <= solution.min() and solution.max() < num_positions):
+        raise ValueError(f"Roster positions must be in [0, {num_positions - 1}]")
+
+    # works[e, p, d]: employee e on position p in session d
+    works = solution[:, None, :] == np.arange(num_positions)[None, :, None]
+    breaks = works[:, 0, :]
+
+    rated = rated_positions(
+        [tuple(item) for item in data.get("rating_constraints", [])],
+        num_employees,
+        num_positions,
+    )
+    fixed_assignments = [tuple(item) for item in data.get("fixed_assignments", [])]
+    unrated = np.ones((num_employees, num_positions), dtype=bool)
+    for e, positions in enumerate(rated):
+        unrated[e, [0, *positions]] = False
+
+    # cells build_model turns into variables (see work_domains), sequences on
+    # none of them are skipped
+    allowed = np.ones(works.shape, dtype=bool)
+    allowed[:, 1:, :] = ~unrated[:, 1:, None] & (cover_demands.T > 0)[None]
+    for e, p, d in fixed_assignments:
+        if p == -1:
+            allowed[e, 0, d] = False
+        else:
+            kept = allowed[e, p, d]
+            allowed[e, :, d] = False
+            allowed[e, p, d] = kept
+
+    penalties = {}
+    violations = []
+
+    def penalize(name: str, cost: np.ndarray):
+        total = int(np.sum(cost))
+        if total:
+            penalties[name] = penalties.get(name, 0) + total
+
+    def violate(constraint: str, message: str, **fields):
+        violations.append({"constraint": constraint, **fields, "message": message})
+
+    def sequence(name: str, rows: tuple, window: slice, bounds: list, **fields):
+        """Penalizes the sequences of works[staff, position, window], skipping
+        the rows without any variable like build_model does."""
+        staff, position = rows
+        offset = window.start or 0
+        cells = works[staff, position, window]
+        kept = allowed[staff, position, window].any(axis=-1)
+        cost, (row, start, length) = sequence_costs(cells, *bounds, encoding)
+        penalize(name, cost[kept])
+        for r, s, n in zip(row.tolist(), start.tolist(), length.tolist()):
+            if not kept[r]:
+                continue
+            e = np.broadcast_to(staff, kept.shape)[r]
+            p = np.broadcast_to(position, kept.shape)[r]
+            violate(
+                name,
+                f"Staff {e + 1}: sequence of {n} on position {p} from session "
+                f"{offset + s + 1} outside [{bounds[0]}, {bounds[4]}]",
+                staff=int(e),
+                position=int(p),
+                start=offset + s,
+                length=n,
+                **fields,
+            )
+
+    # Fixed assignments and ratings
+    for e, p, d in fixed_assignments:
+        if (solution[e, d] == 0) if p == -1 else (solution[e, d] != p):
+            violate(
+                "fixed_assignment",
+                f"Session {d + 1}: staff {e + 1} is not on its fixed assignment",
+                staff=e,
+                session=d,
+            )
+    for e, d in zip(*np.nonzero(unrated[np.arange(num_employees)[:, None], solution])):
+        violate(
+            "rating",
+            f"Session {d + 1}: staff {e + 1} is not rated for position "
+            f"{solution[e, d]}",
+            staff=int(e),
+            session=int(d),
+        )
+
+    # Session preferences
+    for e, p, d, w in data.get("preference", []):
+        if solution[e, d] == p:
+            penalize("preference", w)
+
+    # Position constraints, and the default preference for 2 breaks over 1
+    everyone = np.arange(num_employees)
+    for i, ct in enumerate(
+        data.get("position_constraints", []) + [[0, 1, 2, 5, 4, num_sessions, 0]]
+    ):
+        position, *bounds = ct
+        sequence(
+            "position_constraint",
+            (everyone, position),
+            slice(None),
+            bounds,
+            index=i,
+        )
+
+    # Position assignment (prefer 2/3 continous, 1/4 penalized)
+    staff, position = np.divmod(
+        np.arange(num_employees * (num_positions - 1)), num_positions - 1
+    )
+    bounds = (
+        1,
+        2,
+        weights["short_session"],
+        3,
+        max_continous_work,
+        weights["long_session"],
+    )
+    sequence("position_assignment", (staff, position + 1), slice(None), bounds)
+
+    # Consecutive breaks
+    bounds = (1, 2, weights["short_break"], 4, num_sessions, weights["long_break"])
+    sequence("long_breaks", (everyone, 0), slice(None), bounds)
+
+    # Consecutive constraints
+    for i, ct in enumerate(constraints.get("consecutive_constraints", [])):
+        employees, position, start, end, *bounds, prefix = ct
+        sequence(
+            prefix,
+            (np.asarray(employees, dtype=int), position),
+            slice(start, end + 1),
+            bounds,
+            index=i,
+        )
+
+    # Sum constraints
+    for i, ct in enumerate(constraints.get("sum_constraints", [])):
+        employees, position, start, end, *bounds, prefix = ct
+        counts = works[employees, position, start : end + 1].sum(axis=-1)
+        cost, bad = sum_costs(counts, *bounds)
+        penalize(prefix, cost)
+        for e in np.asarray(employees)[bad].tolist():
+            violate(
+                prefix,
+                f"Staff {e + 1}: position {position} worked out of "
+                f"[{bounds[0]}, {bounds[4]}] sessions {start + 1}-{end + 1}",
+                staff=e,
+                position=position,
+                index=i,
+            )
+
+    # Even position distribution, each rated position worked at least once
+    never_worked = works[:, 1:, :].sum(axis=-1) == 0
+    penalize(
+        "position_evenness",
+        weights["position_evenness"] * (never_worked & ~unrated[:, 1:]),
+    )
+
+    # Break constraints, on every window of sessions
+    break_counts = np.zeros((num_employees, num_sessions + 1), dtype=int)
+    np.cumsum(breaks, axis=1, out=break_counts[:, 1:])
+    for i, (across, hard_min, soft_min, min_cost) in enumerate(
+        data.get("break_constraints", [])
+    ):
+        counts = break_counts[:, across:] - break_counts[:, :-across]
+        cost, bad = sum_costs(
+            counts, hard_min, soft_min, min_cost, num_sessions, num_sessions, 0
+        )
+        penalize("break_constraint", cost)
+        for e, f in zip(*np.nonzero(bad)):
+            violate(
+                "break_constraint",
+                f"Staff {e + 1}: fewer than {hard_min} breaks in sessions "
+                f"{f + 1}-{f + across}",
+                staff=int(e),
+                start=int(f),
+                index=i,
+            )
+
+    # Max continous work
+    row, start, length = runs(~breaks)
+    for e, s, n in zip(row.tolist(), start.tolist(), length.tolist()):
+        if n > max_continous_work:
+            violate(
+                "max_continous_work",
+                f"Staff {e + 1}: works {n} sessions in a row from session {s + 1}",
+                staff=e,
+                start=s,
+                length=n,
+            )
+
+    # One set constraints
+    for i, group in enumerate(constraints.get("one_set", [])):
+        employees, start, end, position, hard_min, soft_min, min_cost, prefix = group
+        cells = works[employees, position, start : end + 1]
+        row, _, length = runs(cells)
+        longest = np.zeros(len(employees), dtype=int)
+        np.maximum.at(longest, row, length)
+        if soft_min > hard_min:
+            penalize(prefix, min_cost * (longest < soft_min))
+        for e in np.asarray(employees)[longest < hard_min].tolist():
+            violate(
+                prefix,
+                f"Staff {e + 1}: no {hard_min} sessions in a row on position "
+                f"{position} in sessions {start + 1}-{end + 1}",
+                staff=e,
+                position=position,
+                index=i,
+            )
+
+    # Penalized transitions
+    for i, (previous_position, next_position, cost) in enumerate(
+        constraints.get("transition", [])
+    ):
+        moved = (solution[:, :-1] == previous_position) & (
+            solution[:, 1:] == next_position
+        )
+        if cost:
+            penalize("transition", cost * moved)
+            continue
+        for e, d in zip(*np.nonzero(moved)):
+            violate(
+                "transition",
+                f"Session {d + 1}: staff {e + 1} moves from position "
+                f"{previous_position} to {next_position}",
+                staff=int(e),
+                session=int(d),
+                index=i,
+            )
+
+    # Cover demands
+    staffed = works[:, 1:, :].sum(axis=0).T
+    for d, p in zip(*np.nonzero(staffed != cover_demands)):
+        violate(
+            "cover",
+            f"Session {d + 1}: position {p + 1} staffed by {staffed[d, p]} "
+            f"instead of {cover_demands[d, p]}",
+            session=int(d),
+            position=int(p + 1),
+        )
+
+    # Loops: closed walks of 2 and 3 moves, every position being distinct as
+    # staying on a position is not a move
+    moves = move_counts(solution, num_positions)
+    checked = []
+    if data.get("prevent_loop_2", True):
+        checked.append(("loop_2", np.einsum("dij,dji->d", moves, moves) // 2))
+    if data.get("prevent_loop_3", True):
+        checked.append(
+            ("loop_3", np.einsum("dij,djk,dki->d", moves, moves, moves) // 3)
+        )
+    for name, loops in checked:
+        for d in np.flatnonzero(loops).tolist():
+            violate(
+                name,
+                f"Session {d + 1}: {loops[d]} staff loops of {name[-1]} "
+                f"positions into session {d + 2}",
+                session=d,
+                count=int(loops[d]),
+            )
+
+    # Break evenness (sum of squared break counts, or of the breaks away from
+    # an even share with the deviation encoding)
+    counts = breaks.sum(axis=1)
+    if data.get("break_evenness_encoding", "square") == "deviation":
+        mean_breaks = (num_employees * num_sessions - cover_demands.sum()) / max(
+            num_employees, 1
+        )
+        deviation = np.maximum(counts - math.ceil(mean_breaks), 0) + np.maximum(
+            math.floor(mean_breaks) - counts, 0
+        )
+        penalize("break_evenness", weights["break_evenness"] * deviation)
+    else:
+        penalize("break_evenness", weights["break_evenness"] * counts**2)
+    for e in np.flatnonzero(counts < min_breaks).tolist():
+        violate(
+            "break_evenness",
+            f"Staff {e + 1}: {counts[e]} breaks, at least {min_breaks} needed",
+            staff=e,
+        )
+
+    return {
+        "objective": sum(penalties.values()),
+        "feasible": not violations,
+        "penalties": penalties,
+        "violations": violations,
+    }
@@ -0,0 +1,396 @@
+import logging
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import (
+    CancelledError,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable
+
+from callback import ObjectiveEarlyStopping
+from heuristic import warm_start
+from horizon import solve_rolling_horizon
+from solver import model_cache, precheck, solve_shift_scheduling
+from timers import Deadline, watchdog
+
+
+class QueueFull(Exception):
+    """Raised when a solve is submitted while the waiting queue is full."""
+
+
+# Seconds between two checks of the cancel flag of a running solve.
+CANCEL_POLL_INTERVAL = 0.1
+
+# Progress channel and cancel flags of a worker process, set by _init_worker.
+_events = None
+_cancelled = None
+
+
+def _init_worker(events: multiprocessing.Queue, cancelled):
+    global _events, _cancelled
+    _events = events
+    _cancelled = cancelled
+
+
+def _watch_cancel(slot: int, callbacks: list[ObjectiveEarlyStopping]) -> Deadline:
+    """Interrupts the searches of callbacks once their slot is cancelled.
+
+    The slot is checked on the watchdog until the returned deadline is
+    cancelled, callbacks may still be added to the list meanwhile. The
+    interrupt is repeated at each check, a search only stops if it was running
+    when interrupted.
+    """
+
+    def check():
+        if _cancelled[slot]:
+            for callback in list(callbacks):
+                callback.InterruptSearch()
+        watchdog.reset(poll, CANCEL_POLL_INTERVAL)
+
+    poll = watchdog.schedule(CANCEL_POLL_INTERVAL, check)
+    return poll
+
+
+def _solve_job(solver_id: str, data: dict[str, any], num_workers: int, slot: int):
+    """Runs one solve in a worker process, reporting through _events.
+
+    Progress and the final status go through the same queue, so the parent
+    never sees a progress update after the result. The solve is interrupted
+    when the parent sets its cancel flag, see SolveExecutor.cancel.
+    """
+
+    def publish(fields: dict[str, any]):
+        _events.put(("progress", solver_id, fields))
+
+    if _cancelled[slot]:
+        # cancelled while waiting in the pool's call queue
+        publish({"status": "interrupted", "progress": 0})
+        return
+
+    publish({"status": "solving"})
+    poll = None
+    try:
+        callback = ObjectiveEarlyStopping(15, data["gap_ratio"], publish)
+        poll = _watch_cancel(slot, [callback])
+        result = _solve(data, callback, num_workers)
+
+        if callback.is_interrupted():
+            publish({"status": "interrupted", "progress": 0})
+        else:
+            publish({"status": "completed", "result": result, "progress": 100})
+
+    except Exception as e:
+        logging.error(f"Solver error: {str(e)}")
+        publish({"status": "error", "error": str(e)})
+    finally:
+        if poll:
+            watchdog.cancel(poll)
+
+    _events.put(("cache", os.getpid(), model_cache.stats()))
+
+
+def _solve(
+    data: dict[str, any], callback: ObjectiveEarlyStopping, num_workers: int
+) -> dict[str, any] | None:
+    # long rosters are solved window by window, see horizon
+    solve = solve_rolling_horizon if data.get("horizon") else solve_shift_scheduling
+    return solve(data, callback, num_workers)
+
+
+def _solve_batch_job(
+    batch_id: str,
+    problems: list[dict[str, any]],
+    items: list[int],
+    heuristic_time: float,
+    num_workers: int,
+    slot: int,
+):
+    """Runs the problems of a batch in threads of one worker process.
+
+    The num_workers cores of the slot are shared by the problems: each gets
+    num_workers // len(problems) CP-SAT workers, at least one, and as many
+    problems are solved at once as that leaves cores for. CP-SAT releases the
+    GIL while searching, and structurally identical problems share their
+    model through the model cache.
+
+    items maps each item of the batch to its problem, identical items sharing
+    one. Progress is published for the whole batch: the mean progress and the
+    total solution count, with the status, progress and best objective of each
+    item in "items". The result lists the result of each item.
+    """
+    lock = threading.Lock()
+    states = [
+        {"status": "queued", "progress": 0, "count": 0, "objective": None}
+        for _ in problems
+    ]
+    callbacks = []
+
+    def publish_batch(fields: dict[str, any]):
+        # called under lock
+        summary = [dict(states[problem]) for problem in items]
+        _events.put(
+            (
+                "progress",
+                batch_id,
+                {
+                    "progress": round(
+                        sum(state["progress"] for state in summary) / len(summary), 2
+                    ),
+                    "count": sum(state["count"] for state in summary),
+                    "items": summary,
+                    **fields,
+                },
+            )
+        )
+
+    def update(problem: int, fields: dict[str, any]):
+        with lock:
+            state = states[problem]
+            state.update(
+                {
+                    key: fields[key]
+                    for key in ("status", "progress", "count", "objective")
+                    if key in fields
+                }
+            )
+            if fields.get("incumbent"):
+                state["objective"] = fields["incumbent"]["objective"]
+            publish_batch({})
+
+    def run(problem: int) -> dict[str, any] | None:
+        data = problems[problem]
+        if _cancelled[slot]:
+            update(problem, {"status": "interrupted"})
+            return None
+        update(problem, {"status": "solving"})
+        try:
+            callback = ObjectiveEarlyStopping(
+                15, data["gap_ratio"], lambda fields: update(problem, fields)
+            )
+            with lock:
+                callbacks.append(callback)
+            # requests that cannot be staffed are rejected by the solver
+            if not precheck(data):
+                warm_start(data, heuristic_time)
+            result = _solve(data, callback, workers)
+        except Exception as e:
+            logging.error(f"Solver error in batch item: {str(e)}")
+            update(problem, {"status": "error"})
+            return {"status": "error", "error": str(e)}
+
+        if callback.is_interrupted():
+            update(problem, {"status": "interrupted"})
+            return None
+        update(
+            problem,
+            {
+                "status": "completed",
+                "progress": 100,
+                "objective": result and result.get("objective"),
+            },
+        )
+        return result
+
+    def feasible(result: dict[str, any] | None) -> bool:
+        # CP-SAT rosters meet the hard constraints, the others are evaluated
+        return bool(result and result.get("solution") and result.get("feasible", True))
+
+    if _cancelled[slot]:
+        # cancelled while waiting in the pool's call queue
+        publish_batch({"status": "interrupted", "progress": 0})
+        return
+
+    with lock:
+        publish_batch({"status": "solving"})
+    workers = max(1, num_workers // len(problems))
+    poll = _watch_cancel(slot, callbacks)
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, num_workers // workers)) as pool:
+            results = list(pool.map(run, range(len(problems))))
+    finally:
+        watchdog.cancel(poll)
+
+    with lock:
+        if _cancelled[slot]:
+            publish_batch({"status": "interrupted", "progress": 0})
+        else:
+            publish_batch(
+                {
+                    "status": "completed",
+                    "progress": 100,
+                    "result": {
+                        "results": [results[problem] for problem in items],
+                        "unique": len(problems),
+                        "feasible": all(map(feasible, results)),
+                    },
+                }
+            )
+
+    _events.put(("cache", os.getpid(), model_cache.stats()))
+
+
+class SolveExecutor:
+    """Bounded process pool running solves with admission control.
+
+    At most max_concurrent solves run at once, each with its share of the
+    cpu_count cores given to the executor as CP-SAT workers. Up to max_queue
+    more wait for a free slot, further submissions are rejected with QueueFull.
+    The limits are those of one executor: processes sharing a host each get
+    their part of its cores and solves, see app. Progress of the worker processes
+    is forwarded to on_event(solver_id, fields) from a listener thread.
+
+    Each submitted solve holds a slot of a shared array of cancel flags until
+    it is done, polled by its worker to interrupt the search, see cancel.
+    """
+
+    def __init__(
+        self,
+        on_event: Callable[[str, dict[str, any]], None],
+        max_concurrent: int = max(1, os.cpu_count() // 4),
+        max_queue: int = 16,
+        cpu_count: int = os.cpu_count(),
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.num_workers = max(1, min(cpu_count // max_concurrent, 8))
+        self._on_event = on_event
+        self._context = multiprocessing.get_context("spawn")
+        self._events = self._context.Queue()
+        self._pool = None
+        self._lock = threading.Lock()
+        # submitted solves not started by a worker yet, in queue order
+        self._waiting = OrderedDict()
+        # cancel flag slot and future of each solve not done yet
+        self._cancelled = self._context.RawArray("b", max_concurrent + max_queue)
+        self._free_slots = list(range(max_concurrent + max_queue))
+        self._slots = {}
+        self._futures = {}
+        # model cache counters of each worker process
+        self._cache_stats = {}
+
+        listener = threading.Thread(target=self._listen)
+        listener.daemon = True
+        listener.start()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_concurrent,
+            mp_context=self._context,
+            initializer=_init_worker,
+            initargs=(self._events, self._cancelled),
+        )
+
+    def submit(self, solver_id: str, data: dict[str, any]):
+        self._submit(solver_id, _solve_job, data)
+
+    def submit_batch(
+        self,
+        batch_id: str,
+        problems: list[dict[str, any]],
+        items: list[int],
+        heuristic_time: float = 0.1,
+    ):
+        """Queues a batch of problems as one solve, see _solve_batch_job.
+
+        The batch takes one slot and the cores of one solve, its problems are
+        solved in parallel with fewer CP-SAT workers each.
+        """
+        self._submit(batch_id, _solve_batch_job, problems, items, heuristic_time)
+
+    def _submit(self, solver_id: str, job: Callable, *args):
+        with self._lock:
+            if len(self._waiting) >= self.max_queue or not self._free_slots:
+                raise QueueFull()
+            if self._pool is None:
+                self._pool = self._new_pool()
+            slot = self._free_slots.pop()
+            self._cancelled[slot] = 0
+            self._slots[solver_id] = slot
+            self._waiting[solver_id] = True
+            future = self._pool.submit(job, solver_id, *args, self.num_workers, slot)
+            self._futures[solver_id] = future
+
+        future.add_done_callback(lambda f: self._on_done(solver_id, f))
+
+    def cancel(self, solver_id: str) -> bool:
+        """Interrupts a solve, False if it is already done or unknown.
+
+        A solve still waiting in the pool is dropped and reported interrupted
+        at once. A running one is interrupted by its worker within
+        CANCEL_POLL_INTERVAL, or at the next constraint family if its model is
+        being built, which frees its CP-SAT workers and reports it interrupted.
+        """
+        with self._lock:
+            future = self._futures.get(solver_id)
+            if future is None:
+                return False
+            self._cancelled[self._slots[solver_id]] = 1
+
+        # runs _on_done at once if dropped, outside the lock
+        if future.cancel():
+            self._on_event(solver_id, {"status": "interrupted", "progress": 0})
+        return True
+
+    def queue_position(self, solver_id: str) -> int | None:
+        """1-based position of a waiting solve, None once it has started."""
+        with self._lock:
+            for position, waiting_id in enumerate(self._waiting, 1):
+                if waiting_id == solver_id:
+                    return position
+        return None
+
+    def cache_stats(self) -> dict[str, int]:
+        """Model cache counters summed over the worker processes."""
+        with self._lock:
+            stats = {"hits": 0, "misses": 0, "size": 0, "max_size": 0}
+            for worker_stats in self._cache_stats.values():
+                for key in stats:
+                    stats[key] += worker_stats[key]
+            stats["workers"] = len(self._cache_stats)
+            return stats
+
+    def _listen(self):
+        while True:
+            kind, key, payload = self._events.get()
+            try:
+                if kind == "cache":
+                    with self._lock:
+                        self._cache_stats[key] = payload
+                    continue
+
+                # started, or interrupted before starting
+                if payload.get("status") in ("solving", "interrupted"):
+                    with self._lock:
+                        self._waiting.pop(key, None)
+                self._on_event(key, payload)
+
+            except Exception as e:
+                logging.error(f"Error forwarding solver progress: {str(e)}")
+
+    def _on_done(self, solver_id: str, future: Future):
+        with self._lock:
+            slot = self._slots.pop(solver_id)
+            self._free_slots.append(slot)
+            self._futures.pop(solver_id, None)
+            if future.cancelled():
+                self._waiting.pop(solver_id, None)
+
+        # results come through the event queue, only crashes are handled here
+        try:
+            error = future.exception()
+        except CancelledError:
+            return
+        if error is None:
+            return
+
+        logging.error(f"Solver process error: {str(error)}")
+        with self._lock:
+            self._waiting.pop(solver_id, None)
+            if isinstance(error, BrokenProcessPool):
+                self._pool = None
+        self._on_event(solver_id, {"status": "error", "error": str(error)})
@@ -0,0 +1,242 @@
+"""Greedy roster construction and swap local search, without CP-SAT.
+
+construct walks the sessions in order and fills the demanded positions of each
+one by a bipartite matching of rated staff, trying first the staff who must
+work, then the ones continuing a short run on the position, then the ones
+with the fewest sessions worked so far. Staff due a break (max_continous_work,
+break_constraints) are only used when the demand cannot be met otherwise.
+local_search then swaps the positions of two employees in a session while it
+improves the evaluation, within a time budget.
+
+The roster is a mediocre one, meant as an instant answer and a solution hint.
+"""
+
+import random
+import time
+
+import numpy as np
+
+from evaluator import evaluate
+from presolve import max_matching, work_domains
+from util import rated_positions
+
+
+def break_due(
+    breaks: np.ndarray,
+    d: int,
+    num_sessions: int,
+    break_constraints: list[tuple[int, ...]],
+) -> np.ndarray:
+    """Staff that must take a break in session d to meet the break constraints.
+
+    Args:
+      breaks: breaks[e, s] for the sessions s < d already assigned.
+      d: the session to assign.
+      num_sessions: the sessions of the whole roster, bounding the windows.
+      break_constraints: (across, hard_min, ...) minimum breaks in any window.
+    """
+    num_employees = breaks.shape[0]
+    due = np.zeros(num_employees, dtype=bool)
+    for across, hard_min, *_ in break_constraints:
+        for f in range(max(0, d - across + 1), min(d, num_sessions - across) + 1):
+            missing = hard_min - breaks[:, f:d].sum(axis=1)
+            due |= missing >= f + across - d
+    return due
+
+
+def unloop(solution: np.ndarray, d: int, domains: list[list[set[int]]]) -> int:
+    """Keeps the staff of position loops into session d on their position.
+
+    A loop of 2 or 3 employees moving between the same positions is forbidden
+    by prevent_loop_2 / prevent_loop_3. Its members staying on their session
+    d - 1 position man the same positions, so the cover is unchanged.
+
+    Returns:
+      the number of loops undone.
+    """
+    undone = 0
+    source, target = solution[:, d - 1], solution[:, d]
+    movers = {}
+    for e in np.flatnonzero((source > 0) & (target > 0) & (source != target)):
+        movers.setdefault(source[e], []).append(e)
+
+    for e1 in [e for group in movers.values() for e in group]:
+        if source[e1] == target[e1]:
+            continue
+        for e2 in movers.get(target[e1], []):
+            loop = None
+            if target[e2] == source[e1]:
+                loop = (e1, e2)
+            else:
+                for e3 in movers.get(target[e2], []):
+                    if target[e3] == source[e1] and e3 != e1:
+                        loop = (e1, e2, e3)
+                        break
+            if loop and all(source[e] in domains[e][d] for e in loop):
+                for e in loop:
+                    target[e] = source[e]
+                undone += 1
+                break
+    return undone
+
+
+def construct(data: dict[str, any], domains: list[list[set[int]]]) -> np.ndarray:
+    """Greedy employee x session roster of a request, see the module docstring.
+
+    Positions that cannot be filled are left to breaks, the evaluation of the
+    roster reports the cover it misses.
+    """
+    num_employees = data["num_employees"]
+    cover_demands = [tuple(item) for item in data.get("cover_demands", [])]
+    num_positions = len(data["positions"]) + 1
+    num_sessions = len(cover_demands)
+    max_continous_work = data.get("max_continous_work", 4)
+    break_constraints = [tuple(item) for item in data.get("break_constraints", [])]
+    # transitions[p1, p2]: cost of moving from p1 to p2, -1 if forbidden
+    transitions = np.zeros((num_positions, num_positions), dtype=int)
+    for p1, p2, cost in data.get("constraints", {}).get("transition", []):
+        transitions[p1, p2] = cost if cost else -1
+
+    allowed = np.zeros((num_employees, num_positions, num_sessions), dtype=bool)
+    for e, staff in enumerate(domains):
+        for d, domain in enumerate(staff):
+            allowed[e, list(domain), d] = True
+
+    solution = np.zeros((num_employees, num_sessions), dtype=int)
+    # sessions worked in a row, on the same position in a row, and in total
+    streak = np.zeros(num_employees, dtype=int)
+    run = np.zeros(num_employees, dtype=int)
+    worked = np.zeros(num_employees, dtype=int)
+    for d, demand in enumerate(cover_demands):
+        previous = solution[:, d - 1] if d else np.zeros(num_employees, dtype=int)
+        forced = ~allowed[:, 0, d]
+        due = (streak >= max_continous_work) | break_due(
+            solution[:, :d] == 0, d, num_sessions, break_constraints
+        )
+
+        def candidates(p: int, relaxed: bool) -> list[int]:
+            """Staff able to man p in session d, in order of preference."""
+            cost = transitions[previous, p]
+            able = allowed[:, p, d] & (relaxed | forced | (~due & (cost >= 0)))
+            staff = np.flatnonzero(able)
+            continuing = (previous[staff] == p) & (run[staff] < 3)
+            order = np.lexsort(
+                (worked[staff], cost[staff] != 0, ~continuing, ~forced[staff])
+            )
+            return staff[order].tolist()
+
+        manned = [p for p in range(1, num_positions) if demand[p - 1] > 0]
+        slot_position = [p for p in manned for _ in range(demand[p - 1])]
+        for relaxed in (False, True):
+            ordered = {p: candidates(p, relaxed) for p in manned}
+            slots = [ordered[p] for p in slot_position]
+            slot_of = max_matching(slots)
+            if len(slot_of) == len(slots):
+                break
+        for e, slot in slot_of.items():
+            solution[e, d] = slot_position[slot]
+        if d:
+            unloop(solution, d, domains)
+
+        working = solution[:, d] > 0
+        streak = np.where(working, streak + 1, 0)
+        run = np.where(working & (solution[:, d] == previous), run + 1, working)
+        worked += working
+    return solution
+
+
+def local_search(
+    solution: np.ndarray,
+    data: dict[str, any],
+    domains: list[list[set[int]]],
+    time_limit: float,
+    seed: int = 0,
+) -> dict[str, any]:
+    """Improves a roster in place by swapping two employees in a session.
+
+    Swaps keep the cover and are tried at random within the domains, a swap is
+    kept if it breaks fewer hard constraints, or as many with a lower
+    objective, until time_limit seconds are spent.
+
+    Returns:
+      the evaluation of the final roster, see evaluate.
+    """
+    rng = random.Random(seed)
+    deadline = time.monotonic() + time_limit
+    best = evaluate(solution, data)
+    score = (len(best["violations"]), best["objective"])
+    num_employees, num_sessions = solution.shape
+    if num_employees < 2 or num_sessions < 1:
+        return best
+
+    while time.monotonic() < deadline:
+        d = rng.randrange(num_sessions)
+        e1, e2 = rng.sample(range(num_employees), 2)
+        p1, p2 = solution[e1, d], solution[e2, d]
+        if p1 == p2 or p2 not in domains[e1][d] or p1 not in domains[e2][d]:
+            continue
+        solution[e1, d], solution[e2, d] = p2, p1
+        evaluation = evaluate(solution, data)
+        if (len(evaluation["violations"]), evaluation["objective"]) < score:
+            best = evaluation
+            score = (len(best["violations"]), best["objective"])
+        else:
+            solution[e1, d], solution[e2, d] = p1, p2
+    return best
+
+
+def heuristic_solution(
+    data: dict[str, any], time_limit: float = 0.1, seed: int = 0
+) -> dict[str, any]:
+    """Roster of a request built greedily then improved by local search.
+
+    Args:
+      data: the request payload.
+      time_limit: seconds for the construction and the local search.
+      seed: random seed of the local search.
+
+    Returns:
+      a result with status "heuristic", the solution, its evaluation (see
+      evaluate) and the time spent.
+    """
+    start = time.monotonic()
+    num_positions = len(data["positions"]) + 1
+    domains = work_domains(
+        data["num_employees"],
+        num_positions,
+        [tuple(item) for item in data.get("cover_demands", [])],
+        rated_positions(
+            [tuple(item) for item in data.get("rating_constraints", [])],
+            data["num_employees"],
+            num_positions,
+        ),
+        [tuple(item) for item in data.get("fixed_assignments", [])],
+    )
+    solution = construct(data, domains)
+    remaining = time_limit - (time.monotonic() - start)
+    evaluation = local_search(solution, data, domains, remaining, seed)
+    return {
+        "status": "heuristic",
+        "solution": solution.tolist(),
+        **evaluation,
+        "time": round(time.monotonic() - start, 3),
+    }
+
+
+def warm_start(data: dict[str, any], time_limit: float = 0.1) -> dict[str, any] | None:
+    """Heuristic roster of a request, set as its hint and fallback roster.
+
+    A hint the request already has, e.g. given by the user, is kept.
+
+    Returns:
+      the heuristic result, see heuristic_solution; None if the request turns
+      the heuristic off or is diagnostic.
+    """
+    if not data.get("heuristic", True) or data.get("diagnose"):
+        return None
+    heuristic = heuristic_solution(data, time_limit)
+    if not data.get("hint_solution"):
+        data["hint_solution"] = heuristic["solution"]
+        data["hint_source"] = "heuristic"
+    data["heuristic_solution"] = heuristic["solution"]
+    return heuristic
@@ -0,0 +1,375 @@
+"""Rolling-horizon decomposition of long rosters.
+
+solve_rolling_horizon splits the sessions into windows overlapping by a few
+sessions and solves them in order, each as a request of its own built by
+window_request, so the model of a window is the usual one on fewer sessions.
+The overlap sessions at the start of a window are fixed to the roster of the
+previous window. The sequence, transition, loop and break window constraints
+crossing the seam then see the sessions committed before it, and are exact
+when the overlap is at least max_continous_work and the longest break window
+minus one. Constraints over a session range are clipped to the window, with
+the sessions committed before it counted in their bounds.
+
+A seam pass then re-solves a window around each seam with both sides fixed,
+and keeps the new roster when the whole request scores better.
+"""
+
+import time
+from typing import Callable
+
+from evaluator import evaluate
+from solver import solve_shift_scheduling
+
+# Sessions of a window, if the request does not set it.
+DEFAULT_WINDOW = 16
+# Share of max_time left for the seam pass.
+SEAM_SHARE = 0.2
+
+
+def window_ranges(num_sessions: int, window: int, overlap: int) -> list[range]:
+    """Session ranges of the windows, each overlapping the previous one."""
+    windows = [range(0, min(window, num_sessions))]
+    while windows[-1].stop < num_sessions:
+        start = windows[-1].stop - overlap
+        windows.append(range(start, min(start + window, num_sessions)))
+    return windows
+
+
+def default_overlap(data: dict[str, any]) -> int:
+    """Overlap making the sequences and break windows exact across seams."""
+    across = [ct[0] for ct in data.get("break_constraints", [])]
+    return max([data.get("max_continous_work", 4)] + [a - 1 for a in across])
+
+
+def embed(
+    roster: list[list[int]], window_roster: list[list[int]], start: int
+) -> list[list[int]]:
+    """Copy of roster with window_roster in its sessions from start on."""
+    end = start + len(window_roster[0]) if window_roster else start
+    return [
+        row[:start] + list(window_row) + row[end:]
+        for row, window_row in zip(roster, window_roster)
+    ]
+
+
+def clip_range(
+    start: int, end: int, window: range, committed: Callable[[int], bool]
+) -> tuple[int, int, list[int], bool] | None:
+    """A session range [start, end] seen from a window.
+
+    Returns:
+      the range clipped to the window in window sessions, the committed
+      sessions of the range outside the window, and whether some sessions of
+      the range are still to be solved; None if the range misses the window.
+    """
+    first, last = max(start, window.start), min(end, window.stop - 1)
+    if first > last:
+        return None
+    outside = [d for d in range(start, end + 1) if d not in window]
+    done = [d for d in outside if committed(d)]
+    return first - window.start, last - window.start, done, len(done) < len(outside)
+
+
+def longest_run(row: list[int], position: int, sessions: list[int]) -> int:
+    """Longest run of consecutive sessions on position among sessions."""
+    longest = run = 0
+    previous = None
+    for d in sessions:
+        if row[d] == position:
+            run = run + 1 if previous == d - 1 else 1
+            longest = max(longest, run)
+        else:
+            run = 0
+        previous = d
+    return longest
+
+
+def window_constraints(
+    data: dict[str, any],
+    window: range,
+    roster: list[list[int]],
+    committed: Callable[[int], bool],
+) -> dict[str, list]:
+    """The session range constraints of a request, seen from a window.
+
+    Sequences are clipped to the window. Sums and one sets get one entry per
+    employee: their bounds are lowered by what the committed sessions outside
+    the window already give, and their minimums are left to a later window
+    while some sessions of the range are still to be solved. A maximum used
+    up before the window cannot be expressed as 0 by add_soft_sum_constraint,
+    it is kept at 1 with any excess over 0 penalized.
+    """
+    constraints = data.get("constraints", {})
+    clipped = {
+        key: value
+        for key, value in constraints.items()
+        if key not in ("consecutive_constraints", "sum_constraints", "one_set")
+    }
+
+    consecutive = []
+    for employees, position, start, end, *bounds in constraints.get(
+        "consecutive_constraints", []
+    ):
+        seen = clip_range(start, end, window, committed)
+        if seen:
+            consecutive.append([employees, position, seen[0], seen[1], *bounds])
+    clipped["consecutive_constraints"] = consecutive
+
+    sums = []
+    for employees, position, start, end, *bounds in constraints.get(
+        "sum_constraints", []
+    ):
+        seen = clip_range(start, end, window, committed)
+        if not seen:
+            continue
+        first, last, done, pending = seen
+        hard_min, soft_min, min_cost, soft_max, hard_max, max_cost, prefix = bounds
+        bounded = hard_max > 0 and max_cost > 0
+        for e in employees:
+            count = sum(1 for d in done if roster[e][d] == position)
+            low, high = (0, 0) if pending else (hard_min, soft_min)
+            entry_soft_max, entry_hard_max = soft_max, hard_max
+            if bounded:
+                entry_soft_max = max(soft_max - count, 0)
+                entry_hard_max = max(hard_max - count, 1)
+            sums.append(
+                [
+                    [e],
+                    position,
+                    first,
+                    last,
+                    max(low - count, 0),
+                    max(high - count, 0),
+                    min_cost,
+                    entry_soft_max,
+                    entry_hard_max,
+                    max_cost,
+                    prefix,
+                ]
+            )
+    clipped["sum_constraints"] = sums
+
+    one_sets = []
+    for employees, start, end, position, hard_min, soft_min, *rest in constraints.get(
+        "one_set", []
+    ):
+        seen = clip_range(start, end, window, committed)
+        if not seen or seen[3]:
+            continue
+        first, last, done, _ = seen
+        length = last - first + 1
+        for e in employees:
+            run = longest_run(roster[e], position, done)
+            if run >= soft_min:
+                continue
+            one_sets.append(
+                [
+                    [e],
+                    first,
+                    last,
+                    position,
+                    0 if run >= hard_min else min(hard_min, length),
+                    min(soft_min, length),
+                    *rest,
+                ]
+            )
+    clipped["one_set"] = one_sets
+    return clipped
+
+
+def window_request(
+    data: dict[str, any],
+    window: range,
+    roster: list[list[int]],
+    fixed: range | list[int],
+    committed: Callable[[int], bool],
+    hint: bool = False,
+) -> dict[str, any]:
+    """Request over the sessions of a window.
+
+    Args:
+      data: the full request.
+      window: the sessions of the window.
+      roster: the full roster, final in the committed sessions.
+      fixed: sessions of the window fixed to roster, e.g. the overlap.
+      committed: whether the roster of a session is final.
+      hint: hint the window with roster, also the fallback roster if the
+        request has a heuristic one.
+    """
+    start, end = window.start, window.stop
+    fixed = set(fixed)
+
+    def shifted(items: list[list]) -> list[list]:
+        """Session-indexed (employee, position, session, ...) items."""
+        return [
+            [e, p, d - start, *rest]
+            for e, p, d, *rest in items
+            if d in window and d not in fixed
+        ]
+
+    sub = {
+        key: value
+        for key, value in data.items()
+        if key not in ("horizon", "previous_solver_id")
+    }
+    sub["cover_demands"] = data["cover_demands"][start:end]
+    if "shift_times" in data:
+        sub["shift_times"] = data["shift_times"][start : end + 1]
+    sub["fixed_assignments"] = shifted(data.get("fixed_assignments", [])) + [
+        [e, roster[e][d], d - start] for d in sorted(fixed) for e in range(len(roster))
+    ]
+    sub["preference"] = shifted(data.get("preference", []))
+    sub["constraints"] = window_constraints(data, window, roster, committed)
+    sub.pop("hint_solution", None)
+    sub.pop("hint_source", None)
+    sub.pop("heuristic_solution", None)
+    if hint:
+        # the roster built so far
+        sub["hint_solution"] = [[row[d] for d in window] for row in roster]
+        sub["hint_source"] = "incumbent"
+        if data.get("heuristic_solution"):
+            sub["heuristic_solution"] = sub["hint_solution"]
+    return sub
+
+
+def solve_rolling_horizon(
+    data: dict[str, any],
+    cb,
+    num_workers=None,
+) -> dict[str, any] | None:
+    """Solves a request window by window, see the module docstring.
+
+    The request "horizon" sets the "window" size in sessions, the "overlap"
+    (default_overlap if not set) and whether to run the "seam_pass" (true by
+    default). Requests fitting in one window, and diagnostic ones, are solved
+    whole. Incumbents are published as full rosters, the sessions after the
+    current window taken from the hint if any.
+
+    Returns:
+      the result of the whole roster, scored by evaluate, its "penalties"
+      listed by name with the penalty of each, and a summary of each window
+      solve; status "VIOLATED" if the roster breaks hard constraints, e.g.
+      ones the windows could not see; None if interrupted.
+    """
+    kwargs = {} if num_workers is None else {"num_workers": num_workers}
+    horizon = data.get("horizon") or {}
+    num_employees = data["num_employees"]
+    num_sessions = len(data["cover_demands"])
+    window_size = horizon.get("window", DEFAULT_WINDOW)
+    overlap = horizon.get("overlap", default_overlap(data))
+    if num_sessions <= window_size or data.get("diagnose"):
+        return solve_shift_scheduling(data, cb, **kwargs)
+    if not 0 < overlap < window_size:
+        raise ValueError(f"Overlap {overlap} must be in [1, {window_size - 1}]")
+
+    # the sessions not solved yet are taken from a full size hint, if any
+    draft = next(
+        (
+            value
+            for value in (data.get("hint_solution"), data.get("heuristic_solution"))
+            if value
+            and len(value) == num_employees
+            and all(len(row) == num_sessions for row in value)
+        ),
+        None,
+    )
+    roster = (
+        [list(row) for row in draft]
+        if draft
+        else [[0] * num_sessions for _ in range(num_employees)]
+    )
+    max_time = data.get("max_time", 15)
+    seam_pass = horizon.get("seam_pass", True)
+    solve_time = max_time * (1 - SEAM_SHARE) if seam_pass else max_time
+    start_time = time.monotonic()
+
+    def solve(window: range, fixed: list[int], committed, budget: float, hint: bool):
+        sub = window_request(data, window, roster, fixed, committed, hint)
+        sub["max_time"] = max(budget, 0.1)
+        started = time.monotonic()
+        result = solve_shift_scheduling(
+            sub,
+            cb,
+            embed=lambda window_roster: embed(roster, window_roster, window.start),
+            **kwargs,
+        )
+        summary = {
+            "start": window.start,
+            "end": window.stop,
+            "fixed": len(fixed),
+            "status": result and result["status"],
+            "objective": result and result.get("objective"),
+            "time": round(time.monotonic() - started, 3),
+        }
+        return result, summary
+
+    windows = window_ranges(num_sessions, window_size, overlap)
+    summaries = []
+    for i, current in enumerate(windows):
+        fixed = list(range(current.start, windows[i - 1].stop)) if i else []
+        free = len(current) - len(fixed)
+        result, summary = solve(
+            current,
+            fixed,
+            lambda d, start=current.start: d < start,
+            solve_time * free / num_sessions,
+            draft is not None,
+        )
+        if result is None:
+            return None
+        summaries.append(summary)
+        if not result.get("solution"):
+            return {
+                **result,
+                "message": f"Sessions {current.start + 1}-{current.stop}: "
+                + result.get("message", "no roster found"),
+                "windows": summaries,
+            }
+        roster = embed(roster, result["solution"], current.start)
+
+    evaluation = evaluate(roster, data)
+    seams = {"tried": 0, "improved": 0}
+    if seam_pass:
+        # re-solve around each seam, both sides fixed
+        for i, seam in enumerate(current.start for current in windows[1:]):
+            remaining = max_time - (time.monotonic() - start_time)
+            if remaining <= 0.1:
+                break
+            low = max(seam - 2 * overlap, 0)
+            high = min(seam + 2 * overlap, num_sessions)
+            free = range(max(seam - overlap, 0), min(seam + overlap, num_sessions))
+            result, summary = solve(
+                range(low, high),
+                [d for d in range(low, high) if d not in free],
+                lambda d: True,
+                remaining / (len(windows) - 1 - i),
+                True,
+            )
+            if result is None:
+                return None
+            seams["tried"] += 1
+            if not result.get("solution"):
+                continue
+            candidate = embed(roster, result["solution"], low)
+            candidate_evaluation = evaluate(candidate, data)
+            if (candidate_evaluation["feasible"] or not evaluation["feasible"]) and (
+                candidate_evaluation["objective"] < evaluation["objective"]
+            ):
+                roster, evaluation = candidate, candidate_evaluation
+                seams["improved"] += 1
+
+    return {
+        "status": "FEASIBLE" if evaluation["feasible"] else "VIOLATED",
+        "solution": roster,
+        "objective": evaluation["objective"],
+        "feasible": evaluation["feasible"],
+        "violations": evaluation["violations"],
+        # the terms of the roster, summed by penalty name as evaluate does
+        "penalties": [
+            {"name": name, "penalty": penalty}
+            for name, penalty in evaluation["penalties"].items()
+        ],
+        "windows": summaries,
+        "seams": seams,
+        "time": round(time.monotonic() - start_time, 3),
+    }
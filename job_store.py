@@ -0,0 +1,303 @@
+"""Stores of the solve jobs served by the app.
+
+A job is a JSON object: its status, progress, incumbent and result, and what
+the app keeps alongside. Each change bumps its "version", which /progress
+streams wait on. MemoryJobStore keeps the jobs of one process, the default.
+SQLiteJobStore keeps them in a SQLite database in WAL mode, shared by the web
+processes of a host and kept across their restarts, so that any of them can
+serve the /progress and /result of a job. Pick one with open_store.
+"""
+
+import abc
+import json
+import sqlite3
+import threading
+import time
+
+# Seconds between two reads of a job waited on in a shared store.
+POLL_INTERVAL = 0.2
+
+
+class JobStore(abc.ABC):
+    """Jobs by id, see the module docstring.
+
+    Jobs past the time set by expire are gone from all the methods. Updates of
+    the current process wake its waiters at once, the ones of other processes
+    within the store's poll interval.
+    """
+
+    @abc.abstractmethod
+    def create(self, job_id: str, fields: dict[str, any]):
+        """Adds a job at version 0, replacing any job with the same id."""
+        ...
+
+    @abc.abstractmethod
+    def get(self, job_id: str) -> dict[str, any] | None:
+        """The job, None if unknown."""
+        ...
+
+    @abc.abstractmethod
+    def update(self, job_id: str, fields: dict[str, any]) -> dict[str, any] | None:
+        """Merges fields into a job.
+
+        Returns:
+          the job before the update, None if unknown, then left unchanged.
+        """
+        ...
+
+    @abc.abstractmethod
+    def increment(self, job_id: str, key: str, delta: int = 1) -> int | None:
+        """Adds delta to a counter of a job, None if unknown.
+
+        Counters are not part of the version, waiters are not woken.
+        """
+        ...
+
+    @abc.abstractmethod
+    def expire(self, job_id: str, delay: float):
+        """Drops a job in delay seconds, unless it already expires."""
+        ...
+
+    @abc.abstractmethod
+    def delete(self, job_id: str):
+        """Drops a job at once."""
+        ...
+
+    @abc.abstractmethod
+    def find(self, **fields) -> dict[str, dict[str, any]]:
+        """The jobs with the given field values, by id."""
+        ...
+
+    @abc.abstractmethod
+    def wait(self, job_id: str, version: int, timeout: float) -> dict[str, any] | None:
+        """The job once past version, or as is after timeout seconds."""
+        ...
+
+
+class MemoryJobStore(JobStore):
+    """Jobs of the current process, in a dict."""
+
+    def __init__(self):
+        self._jobs = {}
+        # expiry time of the jobs set to expire
+        self._expires = {}
+        self._changed = threading.Condition()
+
+    def _live(self, job_id: str) -> dict[str, any] | None:
+        # called with _changed held
+        if self._expires.get(job_id, float("inf")) <= time.time():
+            self._jobs.pop(job_id, None)
+            self._expires.pop(job_id, None)
+        return self._jobs.get(job_id)
+
+    def create(self, job_id: str, fields: dict[str, any]):
+        with self._changed:
+            now = time.time()
+            for expired in [key for key, at in self._expires.items() if at <= now]:
+                self._jobs.pop(expired, None)
+                self._expires.pop(expired)
+            self._jobs[job_id] = {**fields, "version": 0}
+            self._expires.pop(job_id, None)
+
+    def get(self, job_id: str) -> dict[str, any] | None:
+        with self._changed:
+            job = self._live(job_id)
+            return job and dict(job)
+
+    def update(self, job_id: str, fields: dict[str, any]) -> dict[str, any] | None:
+        with self._changed:
+            job = self._live(job_id)
+            if job is None:
+                return None
+            previous = dict(job)
+            job.update(fields)
+            job["version"] += 1
+            self._changed.notify_all()
+            return previous
+
+    def increment(self, job_id: str, key: str, delta: int = 1) -> int | None:
+        with self._changed:
+            job = self._live(job_id)
+            if job is None:
+                return None
+            job[key] = job.get(key, 0) + delta
+            return job[key]
+
+    def expire(self, job_id: str, delay: float):
+        with self._changed:
+            if job_id in self._jobs:
+                self._expires.setdefault(job_id, time.time() + delay)
+
+    def delete(self, job_id: str):
+        with self._changed:
+            self._jobs.pop(job_id, None)
+            self._expires.pop(job_id, None)
+
+    def find(self, **fields) -> dict[str, dict[str, any]]:
+        with self._changed:
+            return {
+                job_id: dict(job)
+                for job_id in list(self._jobs)
+                if (job := self._live(job_id))
+                and all(job.get(key) == value for key, value in fields.items())
+            }
+
+    def wait(self, job_id: str, version: int, timeout: float) -> dict[str, any] | None:
+        with self._changed:
+            self._changed.wait_for(
+                lambda: (self._live(job_id) or {"version": version + 1})["version"]
+                > version,
+                timeout,
+            )
+            job = self._live(job_id)
+            return job and dict(job)
+
+
+class SQLiteJobStore(JobStore):
+    """Jobs in a SQLite database, shared by the processes of a host.
+
+    Each job is a row holding its JSON, changed in immediate transactions so
+    that concurrent updates of a job are merged in turn. WAL mode lets the
+    readers of the /progress streams run alongside the writer. Waiters poll
+    their job every POLL_INTERVAL, or sooner when woken by an update of their
+    process.
+
+    Usage:
+        store = SQLiteJobStore("jobs.db")
+        store.create("solver_1", {"status": "queued"})
+        store.update("solver_1", {"status": "solving"})  # from any process
+    """
+
+    def __init__(self, path: str, poll_interval: float = POLL_INTERVAL):
+        self._path = path
+        self._poll_interval = poll_interval
+        # one connection per thread, sqlite3 connections are not shared
+        self._local = threading.local()
+        self._changed = threading.Condition()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, version INTEGER NOT NULL, "
+                "data TEXT NOT NULL, expires REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # transactions are opened explicitly, see _transaction
+            db = sqlite3.connect(self._path, timeout=30, isolation_level=None)
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self) -> sqlite3.Connection:
+        db = self._connect()
+        db.execute("BEGIN IMMEDIATE")
+        return db
+
+    def _read(self, db: sqlite3.Connection, job_id: str) -> dict[str, any] | None:
+        row = db.execute(
+            "SELECT data, version FROM jobs "
+            "WHERE id = ? AND (expires IS NULL OR expires > ?)",
+            (job_id, time.time()),
+        ).fetchone()
+        return row and {**json.loads(row[0]), "version": row[1]}
+
+    def _write(self, db: sqlite3.Connection, job_id: str, job: dict[str, any]):
+        data = {key: value for key, value in job.items() if key != "version"}
+        db.execute(
+            "UPDATE jobs SET data = ?, version = ? WHERE id = ?",
+            (json.dumps(data), job["version"], job_id),
+        )
+
+    def _change(self, job_id: str, change) -> any:
+        """Runs change(job) on a job in a transaction, then stores the job."""
+        db = self._transaction()
+        try:
+            job = self._read(db, job_id)
+            value = change(job) if job is not None else None
+            if job is not None:
+                self._write(db, job_id, job)
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return value
+
+    def create(self, job_id: str, fields: dict[str, any]):
+        db = self._transaction()
+        try:
+            db.execute("DELETE FROM jobs WHERE expires <= ?", (time.time(),))
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (id, version, data, expires) "
+                "VALUES (?, 0, ?, NULL)",
+                (job_id, json.dumps(fields)),
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def get(self, job_id: str) -> dict[str, any] | None:
+        return self._read(self._connect(), job_id)
+
+    def update(self, job_id: str, fields: dict[str, any]) -> dict[str, any] | None:
+        def change(job):
+            previous = dict(job)
+            job.update(fields)
+            job["version"] += 1
+            return previous
+
+        previous = self._change(job_id, change)
+        if previous is not None:
+            with self._changed:
+                self._changed.notify_all()
+        return previous
+
+    def increment(self, job_id: str, key: str, delta: int = 1) -> int | None:
+        def change(job):
+            job[key] = job.get(key, 0) + delta
+            return job[key]
+
+        return self._change(job_id, change)
+
+    def expire(self, job_id: str, delay: float):
+        self._connect().execute(
+            "UPDATE jobs SET expires = ? WHERE id = ? AND expires IS NULL",
+            (time.time() + delay, job_id),
+        )
+
+    def delete(self, job_id: str):
+        self._connect().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def find(self, **fields) -> dict[str, dict[str, any]]:
+        query = "SELECT id, data, version FROM jobs WHERE "
+        query += "(expires IS NULL OR expires > ?)"
+        params = [time.time()]
+        for key, value in fields.items():
+            query += " AND json_extract(data, ?) = ?"
+            params += [f"$.{key}", value]
+        return {
+            job_id: {**json.loads(data), "version": version}
+            for job_id, data, version in self._connect().execute(query, params)
+        }
+
+    def wait(self, job_id: str, version: int, timeout: float) -> dict[str, any] | None:
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job["version"] > version or remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(self._poll_interval, remaining))
+
+
+def open_store(url: str) -> JobStore:
+    """Job store of a url: "memory", or "sqlite:///path/to/jobs.db"."""
+    if url == "memory":
+        return MemoryJobStore()
+    if url.startswith("sqlite:///"):
+        return SQLiteJobStore(url[len("sqlite:///") :])
+    raise ValueError(f"Unknown job store {url!r}")
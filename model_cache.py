@@ -0,0 +1,101 @@
+import hashlib
+import json
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable
+
+# Request fields that do not change the structure of the model.
+NON_STRUCTURAL = (
+    "weights",
+    "gap_ratio",
+    "max_time",
+    "hint_solution",
+    "hint_source",
+    "previous_solver_id",
+    "solution_encoding",
+    "heuristic",
+    "heuristic_solution",
+)
+
+# Request lists whose order does not matter. The other lists keep their order,
+# which the diagnostic guards refer to their items by, e.g. the constraints.
+ORDERLESS = (
+    "fixed_assignments",
+    "rating_constraints",
+    "preference",
+)
+
+
+def fingerprint(data: dict[str, any]) -> str:
+    """Hashes the structural part of a request.
+
+    Two requests with the same fingerprint build the same model up to the
+    objective coefficients. Weights are only kept as positive or not, since
+    any other weight skips the creation of the matching penalty variables.
+    """
+    canonical = {k: v for k, v in data.items() if k not in NON_STRUCTURAL}
+    for key in ORDERLESS:
+        if key in canonical:
+            canonical[key] = sorted(canonical[key], key=json.dumps)
+    canonical["weights"] = {
+        key: weight > 0 for key, weight in data.get("weights", {}).items()
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+class ModelCache:
+    """LRU cache of built models keyed by request fingerprint.
+
+    The cached models are never solved, each lookup returns a copy with the
+    objective rewritten for the request weights.
+    """
+
+    def __init__(self, build: Callable, max_size: int = 8):
+        self._build = build
+        self._max_size = max_size
+        self._models = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, data: dict[str, any], interrupted: Callable[[], bool] | None = None):
+        """The model of a request, built if not cached.
+
+        interrupted is passed to the build, which may then raise, see
+        build_model; nothing is cached then.
+        """
+        key = fingerprint(data)
+
+        with self._lock:
+            shift_model = self._models.get(key)
+            if shift_model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+
+        if shift_model is None:
+            shift_model = self._build(data, interrupted)
+            with self._lock:
+                self._models[key] = shift_model
+                self._models.move_to_end(key)
+                while len(self._models) > self._max_size:
+                    self._models.popitem(last=False)
+
+        shift_model = shift_model.copy()
+        shift_model.set_objective(data["weights"])
+        return shift_model
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._models),
+                "max_size": self._max_size,
+            }
@@ -0,0 +1,173 @@
+from array import array
+
+import numpy as np
+from ortools.sat.python import cp_model
+
+# Request weights with a default, the others are required.
+DEFAULT_WEIGHTS = {"position_evenness": 5}
+
+
+class PenaltyRegistry:
+    """Side table describing every objective term of a model.
+
+    Rows are stored column-wise in typed arrays: variable index, family, kind,
+    staff, position, start, length, weight and coefficient. This replaces the
+    JSON names on penalty variables, which can stay unnamed, and lets the
+    objective and the penalty breakdown be computed without parsing names.
+
+    The coefficient of a weighted row is the factor of the request weight, so
+    that the objective can be rewritten for new weights without rebuilding the
+    model, whatever the weights it was built with, zero included. -1 stands for
+    "not applicable" in the integer columns.
+    """
+
+    def __init__(self, weights: dict[str, int]):
+        self.weights = weights
+        self.names: list[str] = []
+        self._ids: dict[str, int] = {}
+        self.var = array("i")
+        self.family = array("i")
+        self.kind = array("i")
+        self.staff = array("i")
+        self.position = array("i")
+        self.start = array("i")
+        self.length = array("i")
+        self.weight = array("i")
+        self.coefficient = array("q")
+
+    def __len__(self) -> int:
+        return len(self.var)
+
+    def name_id(self, name: str) -> int:
+        """Interns a family, kind or weight name."""
+        if name not in self._ids:
+            self._ids[name] = len(self.names)
+            self.names.append(name)
+        return self._ids[name]
+
+    def add(
+        self,
+        var: cp_model.IntVar,
+        cost: int,
+        family: str,
+        kind: str,
+        staff: int = -1,
+        position: int = -1,
+        start: int = -1,
+        length: int = -1,
+        weight: str | None = None,
+        factor: int = 1,
+    ):
+        """Registers an objective term var * cost * factor.
+
+        If weight is given, cost is that request weight and only the factor is
+        kept, see coefficients.
+        """
+        self.var.append(var.index)
+        self.family.append(self.name_id(family))
+        self.kind.append(self.name_id(kind))
+        self.staff.append(staff)
+        self.position.append(position)
+        self.start.append(start)
+        self.length.append(length)
+        if weight:
+            self.weight.append(self.name_id(weight))
+            self.coefficient.append(factor)
+        else:
+            self.weight.append(-1)
+            self.coefficient.append(cost * factor)
+
+    def scope(self, family: str, **fields) -> "PenaltyScope":
+        return PenaltyScope(self, family, fields)
+
+    def coefficients(self, weights: dict[str, int]) -> np.ndarray:
+        """Objective coefficient of each row for the given request weights."""
+        by_id = np.ones(len(self.names) + 1, dtype=np.int64)
+        for name, weight in weights.items():
+            if name in self._ids:
+                by_id[self._ids[name]] = weight
+        # weight -1 picks the trailing 1
+        return (
+            np.frombuffer(self.coefficient, dtype=np.int64)
+            * by_id[np.frombuffer(self.weight, dtype=np.int32)]
+        )
+
+    def breakdown(
+        self, values: np.ndarray, weights: dict[str, int]
+    ) -> list[dict[str, any]]:
+        """Lists the non zero objective terms of a solution.
+
+        Args:
+          values: the value of every model variable, indexed by variable index.
+          weights: the request weights.
+
+        Returns:
+          one dict per term with its family, kind, the applicable staff,
+          position, start and length, the variable value and the penalty.
+        """
+        var_values = values[np.frombuffer(self.var, dtype=np.int32)]
+        penalties = var_values * self.coefficients(weights)
+        rows = np.flatnonzero(penalties)
+
+        columns = {
+            "staff": np.frombuffer(self.staff, dtype=np.int32)[rows],
+            "position": np.frombuffer(self.position, dtype=np.int32)[rows],
+            "start": np.frombuffer(self.start, dtype=np.int32)[rows],
+            "length": np.frombuffer(self.length, dtype=np.int32)[rows],
+        }
+        family = np.frombuffer(self.family, dtype=np.int32)[rows]
+        kind = np.frombuffer(self.kind, dtype=np.int32)[rows]
+
+        breakdown = []
+        for i in range(len(rows)):
+            item = {
+                "name": self.names[family[i]],
+                "violation": self.names[kind[i]],
+            }
+            for key, column in columns.items():
+                if column[i] >= 0:
+                    item[key] = int(column[i])
+            item["value"] = int(var_values[rows[i]])
+            item["penalty"] = int(penalties[rows[i]])
+            breakdown.append(item)
+        return breakdown
+
+
+class PenaltyScope:
+    """Penalties of one constraint instance, e.g. one staff and position.
+
+    Passed to the constraint helpers as prefix. The fields common to the
+    instance are given once, min_weight / max_weight name the request weights
+    behind the under_* / over_* penalties, if any, and offset is added to the
+    start of the penalties when the helper works on a sub-range of sessions.
+    """
+
+    def __init__(self, registry: PenaltyRegistry, family: str, fields: dict):
+        self._registry = registry
+        self._family = family
+        self._min_weight = fields.pop("min_weight", None)
+        self._max_weight = fields.pop("max_weight", None)
+        self._offset = fields.pop("offset", 0)
+        self._fields = fields
+
+    def add(
+        self,
+        var: cp_model.IntVar,
+        cost: int,
+        kind: str,
+        factor: int = 1,
+        **fields,
+    ):
+        """Registers the term var * cost * factor, see PenaltyRegistry.add."""
+        weight = self._max_weight if kind.startswith("over") else self._min_weight
+        if "start" in fields:
+            fields["start"] += self._offset
+        self._registry.add(
+            var,
+            cost,
+            self._family,
+            kind,
+            weight=weight,
+            factor=factor,
+            **{**self._fields, **fields},
+        )
@@ -0,0 +1,193 @@
+"""Presolve of the work variables, before the model is built.
+
+Many (employee, position, session) cells of a request are fixed: positions an
+employee is not rated for, positions without cover demand in a session and the
+fixed assignments. build_model creates variables for the open cells only, the
+fixed ones share two constant literals so the constraint builders can skip
+them instead of building constraints on dead variables.
+"""
+
+
+def work_domains(
+    num_employees: int,
+    num_positions: int,
+    cover_demands: list[tuple[int, ...]],
+    rated: list[set[int]],
+    fixed_assignments: list[tuple[int, int, int]],
+) -> list[list[set[int]]]:
+    """Positions each employee may take in each session, 0 being the break.
+
+    Args:
+      num_employees: staff count.
+      num_positions: position count, including the break.
+      cover_demands: demand of each position (but the break) in each session.
+      rated: positions each employee is rated for, see rated_positions.
+      fixed_assignments: (employee, position, session), position -1 meaning
+        the employee works any position.
+
+    Returns:
+      domains[e][d], the set of possible positions. An empty set means the
+      request is infeasible.
+    """
+    manned = [
+        {p for p in range(1, num_positions) if demand[p - 1] > 0}
+        for demand in cover_demands
+    ]
+    domains = [
+        [{0} | (rated[e] & manned[d]) for d in range(len(cover_demands))]
+        for e in range(num_employees)
+    ]
+    for e, p, d in fixed_assignments:
+        if p == -1:
+            domains[e][d].discard(0)
+        else:
+            domains[e][d] &= {p}
+    return domains
+
+
+def distinct_triples(first: set, second: set, third: set) -> int:
+    """Number of (a, b, c) in first x second x third with a, b, c distinct."""
+    return (
+        len(first) * len(second) * len(third)
+        - len(first & second) * len(third)
+        - len(second & third) * len(first)
+        - len(first & third) * len(second)
+        + 2 * len(first & second & third)
+    )
+
+
+def max_matching(slots: list[list[int]]) -> dict[int, int]:
+    """Maximum bipartite matching of slots to employees (augmenting paths).
+
+    Args:
+      slots: the employees each slot may be filled with.
+
+    Returns:
+      the slot filled by each matched employee.
+    """
+    slot_of = {}
+
+    def augment(slot: int, visited: set[int]) -> bool:
+        for e in slots[slot]:
+            if e in visited:
+                continue
+            visited.add(e)
+            if e not in slot_of or augment(slot_of[e], visited):
+                slot_of[e] = slot
+                return True
+        return False
+
+    for slot in range(len(slots)):
+        augment(slot, set())
+    return slot_of
+
+
+def deficient_slots(slots: list[list[int]], slot_of: dict[int, int]) -> set[int]:
+    """Slots reachable from the unfilled ones by alternating paths.
+
+    Together they need more employees than they can be filled with (Hall's
+    condition), so they are what makes a maximum matching fall short.
+    """
+    filled = set(slot_of.values())
+    stack = [slot for slot in range(len(slots)) if slot not in filled]
+    reached = set(stack)
+    while stack:
+        for e in slots[stack.pop()]:
+            slot = slot_of.get(e)
+            if slot is not None and slot not in reached:
+                reached.add(slot)
+                stack.append(slot)
+    return reached
+
+
+def check_feasibility(
+    domains: list[list[set[int]]],
+    cover_demands: list[tuple[int, ...]],
+    positions: list[str],
+) -> list[dict[str, any]]:
+    """Finds the sessions that cannot be staffed, without solving.
+
+    Checks each session for clashing fixed assignments, more demand than
+    staff able to work, more staff forced to work than demand, and a
+    bipartite matching of the demanded positions to the rated employees.
+
+    Args:
+      domains: positions of each employee in each session, see work_domains.
+      cover_demands: demand of each position (but the break) in each session.
+      positions: position names, positions[0] being the break.
+
+    Returns:
+      one dict per conflict, with the check that failed, the session, the
+      staff or positions involved and a message. Empty if no conflict is found,
+      which does not prove the request feasible.
+    """
+    conflicts = []
+    num_employees = len(domains)
+    for d, demand in enumerate(cover_demands):
+        session = [domains[e][d] for e in range(num_employees)]
+
+        clashes = [e for e in range(num_employees) if not session[e]]
+        for e in clashes:
+            conflicts.append(
+                {
+                    "check": "fixed_assignment",
+                    "session": d,
+                    "staff": e,
+                    "message": f"Session {d + 1}: the fixed assignment of staff "
+                    f"{e + 1} clashes with its ratings or the cover demand",
+                }
+            )
+
+        total = sum(demand)
+        able = sum(1 for domain in session if domain - {0})
+        forced = sum(1 for domain in session if domain and 0 not in domain)
+        if total > able:
+            conflicts.append(
+                {
+                    "check": "headcount",
+                    "session": d,
+                    "demand": total,
+                    "staff": able,
+                    "message": f"Session {d + 1}: {total} positions to man "
+                    f"but only {able} staff can work",
+                }
+            )
+            continue
+        if forced > total:
+            conflicts.append(
+                {
+                    "check": "forced_work",
+                    "session": d,
+                    "demand": total,
+                    "staff": forced,
+                    "message": f"Session {d + 1}: {forced} staff are fixed "
+                    f"to work but only {total} positions are manned",
+                }
+            )
+
+        # one slot per demanded position and unit of demand
+        slot_position = [
+            p for p in range(1, len(positions)) for _ in range(demand[p - 1])
+        ]
+        slots = [
+            [e for e in range(num_employees) if p in session[e]] for p in slot_position
+        ]
+        slot_of = max_matching(slots)
+        if len(slot_of) == len(slots):
+            continue
+        deficient = deficient_slots(slots, slot_of)
+        short = sorted({slot_position[slot] for slot in deficient})
+        rated = {e for slot in deficient for e in slots[slot]}
+        conflicts.append(
+            {
+                "check": "matching",
+                "session": d,
+                "positions": short,
+                "demand": len(deficient),
+                "staff": len(rated),
+                "message": f"Session {d + 1}: demand of {len(deficient)} on "
+                f"{', '.join(positions[p] for p in short)} but only "
+                f"{len(rated)} rated staff available",
+            }
+        )
+    return conflicts
@@ -0,0 +1,68 @@
+"""Compact wire encodings of a roster.
+
+A roster is the position of each employee in each session, 0 being a break,
+as an employee x session matrix. The plain encoding is the nested JSON list,
+the compact ones are decoded by decodeRoster in static/js/app.js:
+
+  rle:    {"encoding": "rle", "runs": [[position, length, ...], ...]}, the runs
+          of each employee.
+  packed: {"encoding": "packed", "shape": [employees, sessions],
+          "dtype": "uint8", "data": base64}, the matrix bytes in row order.
+"""
+
+import base64
+
+import numpy as np
+
+ENCODINGS = ("list", "rle", "packed")
+
+# packed dtype -> little endian numpy type, as read by the browser typed arrays
+PACKED_TYPES = {"uint8": "<u1", "uint16": "<u2"}
+
+
+def encode_roster(roster, encoding: str = "list") -> list | dict:
+    """Encodes a roster (nested list or matrix) for the wire."""
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown roster encoding {encoding!r}")
+    matrix = np.asarray(roster, dtype=np.int64)
+    if encoding == "list":
+        return matrix.tolist()
+
+    if encoding == "rle":
+        runs = []
+        for staff in matrix:
+            # start of each run of the same position
+            starts = np.flatnonzero(np.diff(staff, prepend=-1))
+            lengths = np.diff(starts, append=len(staff))
+            runs.append(np.column_stack((staff[starts], lengths)).ravel().tolist())
+        return {"encoding": "rle", "runs": runs}
+
+    dtype = "uint8" if matrix.size == 0 or matrix.max() < 256 else "uint16"
+    data = matrix.astype(PACKED_TYPES[dtype]).tobytes()
+    return {
+        "encoding": "packed",
+        "shape": list(matrix.shape),
+        "dtype": dtype,
+        "data": base64.b64encode(data).decode("ascii"),
+    }
+
+
+def decode_roster(encoded: list | dict) -> list[list[int]]:
+    """Nested list roster from any encoding of encode_roster."""
+    if isinstance(encoded, list):
+        return encoded
+    if encoded.get("encoding") == "rle":
+        return [
+            [
+                position
+                for position, length in zip(runs[::2], runs[1::2])
+                for _ in range(length)
+            ]
+            for runs in encoded["runs"]
+        ]
+    if encoded.get("encoding") == "packed":
+        data = np.frombuffer(
+            base64.b64decode(encoded["data"]), dtype=PACKED_TYPES[encoded["dtype"]]
+        )
+        return data.reshape(encoded["shape"]).astype(np.int64).tolist()
+    raise ValueError(f"Unknown roster encoding {encoded.get('encoding')!r}")
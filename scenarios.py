@@ -0,0 +1,182 @@
+"""Synthetic request payloads for benchmarks.
+
+Scenarios are built on the shifts and positions of static/json/global.json and
+the session times of static/json/template.json, scaled to any number of
+employees, positions and sessions, the same way the web form builds requests:
+sessions outside an employee's shift are fixed breaks, ratings and fixed
+assignments are indexed like in Config.toJson.
+"""
+
+import json
+import os
+import random
+
+JSON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "json")
+
+WEIGHTS = {
+    "break_evenness": 100,
+    "long_break": 25,
+    "long_session": 50,
+    "position_evenness": 10,
+    "short_break": 0,
+    "short_session": 50,
+}
+
+# Share of the staff on shift that can work a session, the others are on a
+# break because of max_continous_work.
+WORKING_SHARE = 0.6
+
+
+def load_json(name: str) -> any:
+    with open(os.path.join(JSON_DIR, name), "r") as f:
+        return json.load(f)
+
+
+def add_minutes(time: str, minutes: int) -> str:
+    """Adds minutes to a "HHMM" time, wrapping around midnight."""
+    total = (int(time[:2]) * 60 + int(time[2:]) + minutes) % (24 * 60)
+    return f"{total // 60:02d}{total % 60:02d}"
+
+
+def session_times(templates: list[dict], num_sessions: int, rng) -> list[str]:
+    """num_sessions + 1 session boundaries starting with a random template.
+
+    The template is extended with the later times of the other templates, then
+    in steps of 30 minutes.
+    """
+    times = list(rng.choice(templates)["shift_times"])
+    later = sorted(
+        {t for template in templates for t in template["shift_times"] if t > times[-1]}
+    )
+    times.extend(later)
+    while len(times) < num_sessions + 1:
+        times.append(add_minutes(times[-1], 30))
+    return times[: num_sessions + 1]
+
+
+def pick_positions(units: dict[str, list[str]], num_positions: int, rng) -> list[str]:
+    """Positions of randomly ordered units, the way a roster usually spans units."""
+    unit_names = list(units)
+    rng.shuffle(unit_names)
+    positions = [p for unit in unit_names for p in units[unit]]
+    while len(positions) < num_positions:
+        positions.append(f"X{len(positions) + 1}")
+    return positions[:num_positions]
+
+
+def on_shift(shift: dict[str, str], times: list[str]) -> list[bool]:
+    """Sessions within a shift, as in Staff.validSession."""
+    return [
+        times[d] >= shift["start"] and times[d + 1] <= shift["end"]
+        for d in range(len(times) - 1)
+    ]
+
+
+def make_scenario(
+    num_employees: int,
+    num_positions: int,
+    num_sessions: int,
+    density: float = 0.8,
+    seed: int = 0,
+    rating_density: float = 1.0,
+    fixed_density: float = 0.0,
+    num_transitions: int = 0,
+) -> dict[str, any]:
+    """Random request payload.
+
+    Args:
+      num_employees: staff count.
+      num_positions: positions drawn from global.json.
+      num_sessions: sessions, from template.json times extended as needed.
+      density: probability for a position to be manned in a session, within
+        the staff available on shift.
+      seed: random seed, the same arguments give the same payload.
+      rating_density: probability for an employee to be rated for a position,
+        everyone is rated for all positions at 1.
+      fixed_density: share of the sessions on shift fixed to a position.
+      num_transitions: penalized position transitions, the first one forbidden.
+
+    Returns:
+      the request payload, with the session times and shifts used.
+    """
+    rng = random.Random(seed)
+    global_data = load_json("global.json")
+    times = session_times(load_json("template.json"), num_sessions, rng)
+    positions = pick_positions(global_data["positions"], num_positions, rng)
+
+    # shifts covering at least a third of the sessions
+    shifts = [
+        name
+        for name, shift in global_data["shifts"].items()
+        if sum(on_shift(shift, times)) * 3 >= num_sessions
+    ] or list(global_data["shifts"])
+    staff_shifts = [rng.choice(shifts) for _ in range(num_employees)]
+    available = [on_shift(global_data["shifts"][s], times) for s in staff_shifts]
+
+    ratings = [set(range(1, num_positions + 1)) for _ in range(num_employees)]
+    rating_constraints = []
+    if rating_density < 1:
+        for e in range(num_employees):
+            ratings[e] = {
+                p for p in range(1, num_positions + 1) if rng.random() < rating_density
+            } or {rng.randint(1, num_positions)}
+            rating_constraints.extend([e, p] for p in sorted(ratings[e]))
+
+    # demand within the rated staff on shift
+    cover_demands = []
+    for d in range(num_sessions):
+        staff = [e for e in range(num_employees) if available[e][d]]
+        capacity = int(len(staff) * WORKING_SHARE)
+        demand = [0] * num_positions
+        for p in rng.sample(range(num_positions), num_positions):
+            rated = sum(1 for e in staff if p + 1 in ratings[e])
+            if capacity > 0 and rated > 0 and rng.random() < density:
+                demand[p] = 1
+                capacity -= 1
+        cover_demands.append(demand)
+
+    fixed_assignments = []
+    for e in range(num_employees):
+        for d in range(num_sessions):
+            if not available[e][d]:
+                fixed_assignments.append([e, 0, d])
+    filled = set()
+    for e in range(num_employees):
+        for d in range(num_sessions):
+            if not available[e][d] or rng.random() >= fixed_density:
+                continue
+            candidates = [
+                p
+                for p in sorted(ratings[e])
+                if cover_demands[d][p - 1] and (p, d) not in filled
+            ]
+            if candidates:
+                p = rng.choice(candidates)
+                filled.add((p, d))
+                fixed_assignments.append([e, p, d])
+
+    transitions = []
+    if num_positions > 1:
+        pairs = [
+            (p1, p2)
+            for p1 in range(1, num_positions + 1)
+            for p2 in range(1, num_positions + 1)
+            if p1 != p2
+        ]
+        for i, (p1, p2) in enumerate(
+            rng.sample(pairs, min(num_transitions, len(pairs)))
+        ):
+            transitions.append([p1, p2, 0 if i == 0 else rng.choice((10, 25, 50))])
+
+    return {
+        "num_employees": num_employees,
+        "positions": positions,
+        "shift_times": times,
+        "shifts": staff_shifts,
+        "cover_demands": cover_demands,
+        "fixed_assignments": fixed_assignments,
+        "rating_constraints": rating_constraints,
+        "constraints": {"transition": transitions} if transitions else {},
+        "gap_ratio": 0.02,
+        "weights": dict(WEIGHTS),
+    }
@@ -1,517 +1,1111 @@
-import math
-import os
-from threading import Lock
-
-from constraints import (
-    add_soft_sequence_constraint,
-    add_soft_sum_constraint,
-    add_rev_soft_sequence_constraint,
-    add_one_set_constraint,
-)
-from util import find_in_tuple
-
-
-from itertools import combinations
-from ortools.sat.python import cp_model
-
-
-def solve_shift_scheduling(
-    data: dict[str, any],
-    cb: cp_model.CpSolverSolutionCallback,
-    active_solvers: dict[str, any],
-    solver_id: str,
-    solver_lock: Lock,
-    num_workers=min(os.cpu_count(), 8),
-):
-    """Solves the shift scheduling problem."""
-    try:
-        num_employees = data.get("num_employees")
-
-        # Manning demands for each session
-        cover_demands = [tuple(item) for item in data.get("cover_demands", [])]
-
-        num_sessions = len(cover_demands)
-
-        positions = [""] + (data.get("positions"))
-        max_continous_work = data.get("max_continous_work", 4)
-        min_breaks = math.floor(num_sessions / (max_continous_work + 1))
-
-        # Fixed assignment: (employee, position, session).
-        fixed_assignments = [tuple(item) for item in data.get("fixed_assignments", [])]
-
-        # Rating constraints: (employee, [positions]).
-        rating_constraints = [
-            tuple(item) for item in data.get("rating_constraints", [])
-        ]
-
-        # Preference: (employee, positions, session, weight)
-        # A negative weight indicates that the employee desire this assignment.
-        preference = [tuple(item) for item in data.get("preference", [])]
-
-        # Position constraints on continuous sequence :
-        #     (position, hard_min, soft_min, min_penalty,
-        #             soft_max, hard_max, max_penalty)
-        # default prefer 2 breaks instead of 1 (penalty)
-        position_constraints = [
-            tuple(item)
-            for item in data.get("position_constraints", [])
-            + [[0, 1, 2, 5, 4, num_sessions, 0]]
-        ]
-
-        # Consecutive constraints
-        consecutive_constraints = [
-            tuple(item)
-            for item in data.get("constraints", {}).get("consecutive_constraints", [])
-        ]
-
-        # Sum constraints on position sessions:
-        #     (position, hard_min, soft_min, min_penalty,
-        #             soft_max, hard_max, max_penalty)
-        sum_constraints = [
-            tuple(item)
-            for item in data.get("constraints", {}).get("sum_constraints", [])
-        ]
-
-        # break constraints
-        # (acrossNsession, hard_min, soft_min, min_penalty)
-        break_constraints = [tuple(item) for item in data.get("break_constraints", [])]
-
-        num_positions = len(positions)
-
-        model = cp_model.CpModel()
-
-        work = {
-            (e, p, d): model.new_bool_var(f"work{e}_{p}_{d}")
-            for e in range(num_employees)
-            for p in range(num_positions)
-            for d in range(num_sessions)
-        }
-
-        # Linear terms of the objective in a minimization context.
-        obj_int_vars: list[cp_model.IntVar] = []
-        obj_int_coeffs: list[int] = []
-        obj_bool_vars: list[cp_model.BoolVarT] = []
-        obj_bool_coeffs: list[int] = []
-
-        # Exactly one position per session.
-        for e in range(num_employees):
-            for d in range(num_sessions):
-                model.add_exactly_one(work[e, p, d] for p in range(num_positions))
-
-        # Fixed assignments.
-        # if position == -1 then employee is working (break is set to false)
-        for e, p, d in fixed_assignments:
-            if p == -1:
-                model.add(work[e, 0, d] == 0)
-            else:
-                model.add(work[e, p, d] == 1)
-
-        # Rating constraints
-        for r in rating_constraints:
-            employee, *ratings = r
-            for d in range(num_sessions):
-                for p in set(range(1, num_positions)) - set(ratings):
-                    model.add(work[employee, p, d] == 0)
-
-        # Session preferences
-        for e, p, d, w in preference:
-            obj_bool_vars.append(work[e, p, d])
-            obj_bool_coeffs.append(w)
-
-        # Position constraints
-        for ct in position_constraints:
-            position, hard_min, soft_min, min_cost, soft_max, hard_max, max_cost = ct
-            for e in range(num_employees):
-                works = [work[e, position, d] for d in range(num_sessions)]
-                variables, coeffs = add_soft_sequence_constraint(
-                    model,
-                    works,
-                    hard_min,
-                    soft_min,
-                    min_cost,
-                    soft_max,
-                    hard_max,
-                    max_cost,
-                    {"name": "position_constraint", "staff": e, "position": position},
-                )
-                obj_bool_vars.extend(variables)
-                obj_bool_coeffs.extend(coeffs)
-
-        # Position assignment constraints (prefer 2/3 continous, 1/4 penalized)
-        for e in range(num_employees):
-            for position in range(1, num_positions):
-                works = [work[e, position, d] for d in range(num_sessions)]
-                variables, coeffs = add_soft_sequence_constraint(
-                    model,
-                    works,
-                    1,
-                    2,
-                    data["weights"]["short_session"],
-                    3,
-                    max_continous_work,
-                    data["weights"]["long_session"],
-                    {"name": "position_assignment", "staff": e, "position": position},
-                )
-                obj_bool_vars.extend(variables)
-                obj_bool_coeffs.extend(coeffs)
-
-        # Consecutive Breaks
-        for e in range(num_employees):
-            works = [work[e, 0, d] for d in range(num_sessions)]
-            variables, coeffs = add_soft_sequence_constraint(
-                model,
-                works,
-                1,
-                2,
-                data["weights"]["short_break"],
-                4,
-                num_sessions,
-                data["weights"]["long_break"],
-                {"name": "long_breaks", "staff": e},
-            )
-            obj_bool_vars.extend(variables)
-            obj_bool_coeffs.extend(coeffs)
-
-        # Consecutive constraints
-        for ct in consecutive_constraints:
-            (
-                employees,
-                position,
-                start,
-                end,
-                hard_min,
-                soft_min,
-                min_cost,
-                soft_max,
-                hard_max,
-                max_cost,
-                prefix,
-            ) = ct
-            for e in employees:
-                works = [work[e, position, d] for d in range(start, end + 1)]
-                variables, coeffs = add_soft_sequence_constraint(
-                    model,
-                    works,
-                    hard_min,
-                    soft_min,
-                    min_cost,
-                    soft_max,
-                    hard_max,
-                    max_cost,
-                    {"name": prefix, "staff": e, "position": position},
-                )
-                obj_bool_vars.extend(variables)
-                obj_bool_coeffs.extend(coeffs)
-
-        # Sum constraints
-        for ct in sum_constraints:
-            (
-                employees,
-                position,
-                start,
-                end,
-                hard_min,
-                soft_min,
-                min_cost,
-                soft_max,
-                hard_max,
-                max_cost,
-                prefix,
-            ) = ct
-
-            for e in employees:
-                works = [work[e, position, d] for d in range(start, end + 1)]
-                variables, coeffs = add_soft_sum_constraint(
-                    model,
-                    works,
-                    hard_min,
-                    soft_min,
-                    min_cost,
-                    soft_max,
-                    hard_max,
-                    max_cost,
-                    num_sessions,
-                    {
-                        "name": prefix,
-                        "staff": e,
-                        "position": position,
-                        "start": start,
-                        "end": end,
-                    },
-                )
-                obj_int_vars.extend(variables)
-                obj_int_coeffs.extend(coeffs)
-
-        # promote even position distribution
-        for e in range(num_employees):
-            # only check valid ratings
-            for p in find_in_tuple(rating_constraints, e) or range(1, num_positions):
-                works = [work[e, p, d] for d in range(num_sessions)]
-                variables, coeffs = add_soft_sum_constraint(
-                    model,
-                    works,
-                    0,
-                    1,
-                    data.get("weights", {}).get(
-                        "position_evenness", 5
-                    ),  # penalty for each position not assigned to employee
-                    num_sessions - min_breaks,  # ? set soft_max and hard_max sessions?
-                    num_sessions - min_breaks,
-                    0,
-                    num_sessions - min_breaks,
-                    {"name": "position_evenness", "staff": e, "position": p},
-                )
-                obj_int_vars.extend(variables)
-                obj_int_coeffs.extend(coeffs)
-
-        # break constraints handling
-        for ct in break_constraints:
-            across, hard_min, soft_min, min_cost = ct
-            for e in range(num_employees):
-                for f in range(num_sessions - (across - 1)):
-                    works = [work[e, 0, d + f] for d in range(across)]
-                    variables, coeffs = add_soft_sum_constraint(
-                        model,
-                        works,
-                        hard_min,
-                        soft_min,
-                        min_cost,
-                        num_sessions,
-                        num_sessions,
-                        0,
-                        num_sessions,
-                        {"name": "break_constraint", "staff": e, "session": f},
-                    )
-                    obj_int_vars.extend(variables)
-                    obj_int_coeffs.extend(coeffs)
-
-        # max continous work constraints (hard constraint)
-        for e in range(num_employees):
-            works = [work[e, 0, d] for d in range(num_sessions)]
-            variables, coeffs = add_rev_soft_sequence_constraint(
-                model,
-                works,
-                max_continous_work,
-            )
-            obj_bool_vars.extend(variables)
-            obj_bool_coeffs.extend(coeffs)
-
-        constraints = data.get("constraints", {})
-
-        # one set constraints
-        for group in constraints.get("one_set", []):
-            employees, start, end, position, hard_min, soft_min, min_cost, prefix = (
-                group
-            )
-            for e in employees:
-                works = [work[e, position, d] for d in range(start, end + 1)]
-                variables, coeffs = add_one_set_constraint(
-                    model,
-                    works,
-                    hard_min,
-                    soft_min,
-                    min_cost,
-                    {
-                        "name": prefix,
-                        "staff": e,
-                        "position": position,
-                        "start": start,
-                        "end": end,
-                    },
-                )
-                obj_bool_vars.extend(variables)
-                obj_bool_coeffs.extend(coeffs)
-
-        # Penalized transitions
-        for previous_position, next_position, cost in constraints.get("transition", []):
-            for e in range(num_employees):
-                for d in range(num_sessions - 1):
-                    transition = [
-                        ~work[e, previous_position, d],
-                        ~work[e, next_position, d + 1],
-                    ]
-                    if cost == 0:
-                        model.add_bool_or(transition)
-                    else:
-                        trans_var = model.new_bool_var(
-                            f'{{"name": "transition", "staff": {e}, "session": {d}, "violation": "{previous_position} -> {next_position}"}}'
-                        )
-                        transition.append(trans_var)
-                        model.add_bool_or(transition)
-                        obj_bool_vars.append(trans_var)
-                        obj_bool_coeffs.append(cost)
-
-        # Cover constraints
-        for p in range(1, num_positions):
-            for d in range(num_sessions):
-                works = [work[e, p, d] for e in range(num_employees)]
-                # Ignore Break.
-                min_demand = cover_demands[d][p - 1]
-                model.add(min_demand == sum(works))
-
-        # prevent loop 2 employees
-        if data.get("prevent_loop_2", True):
-            for e1, e2 in combinations(range(num_employees), 2):
-                for s1 in range(1, num_positions):
-                    for s2 in range(1, num_positions):
-                        if s1 != s2:
-                            for d in range(num_sessions - 1):
-                                if all(
-                                    cover_demands[d + i][s - 1] > 0
-                                    for i in range(2)
-                                    for s in (s1, s2)
-                                ):
-                                    model.add_bool_or(
-                                        [
-                                            ~work[e1, s1, d],
-                                            ~work[e1, s2, d + 1],
-                                            ~work[e2, s2, d],
-                                            ~work[e2, s1, d + 1],
-                                        ]
-                                    )
-
-        # prevent loop 3 employees
-        if data.get("prevent_loop_3", True):
-            for e1, e2, e3 in combinations(range(num_employees), 3):
-                for s1 in range(1, num_positions):
-                    for s2 in range(1, num_positions):
-                        if len({s1, s2}) == 2:
-                            for s3 in range(1, num_positions):
-                                if len({s1, s2, s3}) == 3:
-                                    for d in range(num_sessions - 1):
-                                        if all(
-                                            cover_demands[d + i][s - 1] > 0
-                                            for i in range(2)
-                                            for s in (s1, s2, s3)
-                                        ):
-                                            model.add_bool_or(
-                                                [
-                                                    ~work[e1, s1, d],
-                                                    ~work[e1, s2, d + 1],
-                                                    ~work[e2, s2, d],
-                                                    ~work[e2, s3, d + 1],
-                                                    ~work[e3, s3, d],
-                                                    ~work[e3, s1, d + 1],
-                                                ]
-                                            )
-
-        # Distribute breaks evenly (minimize variance)
-        break_vars: list[cp_model.IntVar] = []
-        for e in range(num_employees):
-            breaks = [work[e, 0, d] for d in range(num_sessions)]
-            employee_break = model.new_int_var(min_breaks, num_sessions, "")
-            model.add(employee_break == sum(breaks))
-            employee_break_sq = model.new_int_var(min_breaks**2, num_sessions**2, "")
-            model.add_multiplication_equality(
-                employee_break_sq, [employee_break, employee_break]
-            )
-            break_vars.append(employee_break_sq)
-
-        # Objective
-        model.minimize(
-            sum(
-                obj_bool_vars[i] * obj_bool_coeffs[i] for i in range(len(obj_bool_vars))
-            )
-            + sum(obj_int_vars[i] * obj_int_coeffs[i] for i in range(len(obj_int_vars)))
-            + sum(break_vars) * data["weights"]["break_evenness"]
-        )
-
-        # Solve the model.
-        solver = cp_model.CpSolver()
-
-        solver.parameters.num_workers = num_workers
-        solver.parameters.max_time_in_seconds = data.get("max_time", 15)
-        solver.parameters.symmetry_level = 1  # or 0
-        solver.parameters.cp_model_presolve = False
-        # solver.parameters.ignore_subsolvers.extend(["feasibility_pump", "ls"])
-        solver.parameters.use_lns = True
-
-        cb._reset_timer()
-        status = solver.solve(model, cb)
-        cb.clear_timer()
-
-        if cb.is_interrupted():
-            # q.put(Message("interrupted").__str__())
-            return
-
-        if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
-            # solution
-            result = {
-                "status": "FEASIBLE",
-                "solution": solution_obj(
-                    solver, work, num_positions, num_employees, num_sessions
-                ),
-            }
-        else:
-            result = {
-                "status": "INFEASIBLE",
-                "solution": None,
-            }
-
-        return result
-
-        # todo return solution
-        #     q.put(
-        #         Message(
-        #             "success",
-        #             "solver",
-        #             f"Done {solver.user_time:.2f}s {cb.current_ratio():.3f}",
-        #             obj,
-        #         ).__str__()
-        #     )
-
-        #     # penalties
-        #     msg = Message("penalties", "solver", "", {"penalties": []})
-        #     for i, var in enumerate(obj_bool_vars):
-        #         if solver.boolean_value(var):
-        #             penalty = obj_bool_coeffs[i]
-        #             if penalty > 0:
-        #                 try:
-        #                     j = json.loads(var.name)
-        #                     j["penalty"] = penalty
-        #                     msg.payload["penalties"].append(j)
-
-        #                 except:
-        #                     j = f'{var.name}, "penalty": {penalty}'
-        #                     msg.payload["penalties"].append(j)
-
-        #             # todo restore with preference implementation
-        #             # else:
-        #             # print(f"  {var.name} fulfilled, gain={-penalty}")
-
-        #     for i, var in enumerate(obj_int_vars):
-        #         if solver.value(var) > 0:
-        #             try:
-        #                 j = json.loads(var.name)
-        #                 j["violation"] = j["violation"] + f" {solver.value(var)}"
-        #                 j["penalty"] = obj_int_coeffs[i]
-        #                 msg.payload["penalties"].append(j)
-
-        #             except:
-        #                 j = (
-        #                     f'{var.name} violated by {solver.value(var)}", '
-        #                     f'"penalty":{obj_int_coeffs[i]}'
-        #                 )
-        #                 msg.payload["penalties"].append(j)
-
-        #     # send penalties
-        #     q.put(msg.__str__())
-
-        # else:
-        #     q.put(Message("error", "solver", "Not feasible", None).__str__())
-    except:
-        pass
-        # q.put(Message("error", "solver", traceback.format_exc(), None).__str__())
-
-
-def solution_obj(model, work, num_positions, num_employees, num_sessions) -> list:
-    sessions = []
-    for e in range(num_employees):
-        staff = []
-        for d in range(num_sessions):
-            for p in range(num_positions):
-                if model.boolean_value(work[e, p, d]):
-                    staff.append(p)
-        sessions.append(staff)
-
-    return sessions
+import math
+import os
+import time
+from dataclasses import dataclass, replace
+from typing import Callable
+
+from constraints import (
+    WorkGrid,
+    add_soft_sequence_constraint,
+    add_soft_sum_constraint,
+    add_rev_soft_sequence_constraint,
+    add_one_set_constraint,
+)
+from evaluator import evaluate
+from model_cache import ModelCache
+from penalties import DEFAULT_WEIGHTS, PenaltyRegistry, PenaltyScope
+from presolve import check_feasibility, distinct_triples, work_domains
+from solver_profiles import apply_profile, request_bucket, solver_profile
+from util import (
+    BuildInterrupted,
+    BuildProfile,
+    Guards,
+    find_triple_loops,
+    rated_positions,
+)
+
+
+from itertools import combinations
+import numpy as np
+from ortools.sat.python import cp_model
+
+
+@dataclass
+class ShiftModel:
+    """A built CP-SAT model and the variables needed to read a roster back."""
+
+    model: cp_model.CpModel
+    work: WorkGrid
+    num_employees: int
+    num_positions: int
+    num_sessions: int
+    # Every objective term, with its weight and what it penalizes.
+    penalties: PenaltyRegistry
+    # Build time and size of each constraint family.
+    profile: BuildProfile
+    # Positions each employee may take in each session, see work_domains.
+    domains: list[list[set[int]]]
+    # Variables, constraints and clauses saved by the presolve.
+    presolve: dict[str, int]
+    # Constraint group of each guard literal index, in diagnostic mode.
+    guards: dict[int, dict[str, any]]
+    # 3-employee loops are cut on demand instead of being enumerated upfront.
+    lazy_loop_3: bool = False
+
+    def copy(self) -> "ShiftModel":
+        """Deep copy, so cuts and hints added to it do not leak into a cache."""
+        model = self.model.clone()
+        return replace(self, model=model, work=self.work.copy(model))
+
+    def set_objective(self, weights: dict[str, int]):
+        """(Re)writes the objective for the given request weights."""
+        weights = {**DEFAULT_WEIGHTS, **weights}
+        variables = [
+            self.model.get_int_var_from_proto_index(index)
+            for index in self.penalties.var
+        ]
+        coeffs = self.penalties.coefficients(weights).tolist()
+        self.model.clear_objective()
+        self.model.minimize(cp_model.LinearExpr.weighted_sum(variables, coeffs))
+
+
+def roster(values: np.ndarray, work_index: np.ndarray) -> np.ndarray:
+    """Position of each employee in each session, from all the variable values.
+
+    Args:
+      values: the value of every model variable, e.g. a response solution.
+      work_index: see WorkGrid.index.
+
+    Returns:
+      an employee x session matrix of positions, 0 being a break.
+    """
+    return np.argmax(values[work_index], axis=1)
+
+
+def add_loop_3_cut(
+    model: cp_model.CpModel,
+    work: WorkGrid,
+    loop: tuple[int, int, int, int, int, int, int],
+):
+    """Forbids e1: s1 -> s2, e2: s2 -> s3, e3: s3 -> s1 between d and d + 1."""
+    e1, e2, e3, s1, s2, s3, d = loop
+    model.add_bool_or(
+        [
+            ~work[e1, s1, d],
+            ~work[e1, s2, d + 1],
+            ~work[e2, s2, d],
+            ~work[e2, s3, d + 1],
+            ~work[e3, s3, d],
+            ~work[e3, s1, d + 1],
+        ]
+    )
+
+
+def add_solution_hint(shift_model: ShiftModel, solution: list[list[int]]) -> int:
+    """Hints the work variables with a roster.
+
+    Args:
+      shift_model: the model to hint.
+      solution: the position of each employee in each session, as returned by
+        solution_obj. Employees, sessions or positions missing from the model
+        (e.g. the roster was edited since) are skipped.
+
+    Returns:
+      the number of (employee, session) cells hinted.
+    """
+    work = shift_model.work
+    hinted = 0
+    for e, staff in enumerate(solution[: shift_model.num_employees]):
+        for d, position in enumerate(staff[: shift_model.num_sessions]):
+            if not isinstance(position, int) or not (
+                0 <= position < shift_model.num_positions
+            ):
+                continue
+            domain = shift_model.domains[e][d]
+            # fixed cells are constants
+            if len(domain) > 1:
+                for p in domain:
+                    shift_model.model.add_hint(work[e, p, d], p == position)
+            hinted += 1
+    return hinted
+
+
+def loop_index(
+    cover_demands: list[tuple[int, ...]], num_positions: int, size: int
+) -> list[tuple[int, ...]]:
+    """Lists the position loops that can occur with the given demands.
+
+    A loop of `size` positions between sessions d and d + 1 is only possible if
+    every position involved is manned in both sessions. Each loop is listed once,
+    starting from its lowest position, in both directions for size 3.
+
+    Returns:
+      a list of (s1, s2, d) tuples for size 2, (s1, s2, s3, d) for size 3.
+    """
+    index = []
+    for d in range(len(cover_demands) - 1):
+        active = [
+            s
+            for s in range(1, num_positions)
+            if cover_demands[d][s - 1] > 0 and cover_demands[d + 1][s - 1] > 0
+        ]
+        if size == 2:
+            index.extend((s1, s2, d) for s1, s2 in combinations(active, 2))
+        else:
+            for s1, s2, s3 in combinations(active, 3):
+                index.append((s1, s2, s3, d))
+                index.append((s1, s3, s2, d))
+    return index
+
+
+def add_break_evenness(
+    model: cp_model.CpModel,
+    breaks: list[cp_model.BoolVarT],
+    min_breaks: int,
+    mean_breaks: float,
+    weight: int,
+    prefix: PenaltyScope,
+    encoding: str = "square",
+):
+    """Break count of an employee, at least min_breaks, and its evenness penalty.
+
+    The "square", "table" and "piecewise" encodings all penalize weight * n^2
+    for n breaks, which over all employees is the variance of the break counts
+    up to a constant:
+      square: a multiplication equality n * n, weak in the LP relaxation.
+      table: an element constraint over the precomputed squares.
+      piecewise: the secants of n^2 between consecutive integers, only linear
+        constraints whose maximum is n^2 at integer n. The penalty is only
+        pulled down to n^2 by a positive weight, so a solution may carry more,
+        see exact_break_squares.
+    "deviation" penalizes weight * the breaks below floor(mean_breaks) or above
+    ceil(mean_breaks) instead, zero for an even share.
+    """
+    num_sessions = len(breaks)
+    employee_break = model.new_int_var(min_breaks, num_sessions, "")
+    model.add(employee_break == sum(breaks))
+
+    if encoding == "deviation":
+        low, high = math.floor(mean_breaks), math.ceil(mean_breaks)
+        deviation = model.new_int_var(0, num_sessions, "")
+        model.add(deviation >= employee_break - high)
+        model.add(deviation >= low - employee_break)
+        prefix.add(deviation, weight, "break_deviation")
+        return
+
+    employee_break_sq = model.new_int_var(min_breaks**2, num_sessions**2, "")
+    if encoding == "table":
+        model.add_element(
+            employee_break,
+            [n * n for n in range(num_sessions + 1)],
+            employee_break_sq,
+        )
+    elif encoding == "piecewise":
+        for n in range(min_breaks, num_sessions):
+            # secant through (n, n^2) and (n + 1, (n + 1)^2)
+            model.add(employee_break_sq >= (2 * n + 1) * employee_break - n * (n + 1))
+    else:
+        model.add_multiplication_equality(
+            employee_break_sq, [employee_break, employee_break]
+        )
+    prefix.add(employee_break_sq, weight, "break_count_squared")
+
+
+def build_model(
+    data: dict[str, any], interrupted: Callable[[], bool] | None = None
+) -> ShiftModel:
+    """Builds the shift scheduling model from a request payload.
+
+    interrupted is checked between the constraint families, the build raises
+    BuildInterrupted once it returns true, see BuildProfile.
+    """
+    num_employees = data.get("num_employees")
+
+    # Manning demands for each session
+    cover_demands = [tuple(item) for item in data.get("cover_demands", [])]
+
+    num_sessions = len(cover_demands)
+
+    positions = [""] + (data.get("positions"))
+    max_continous_work = data.get("max_continous_work", 4)
+    min_breaks = math.floor(num_sessions / (max_continous_work + 1))
+
+    # Fixed assignment: (employee, position, session).
+    fixed_assignments = [tuple(item) for item in data.get("fixed_assignments", [])]
+
+    # Rating constraints: (employee, [positions]).
+    rating_constraints = [tuple(item) for item in data.get("rating_constraints", [])]
+
+    # Preference: (employee, positions, session, weight)
+    # A negative weight indicates that the employee desire this assignment.
+    preference = [tuple(item) for item in data.get("preference", [])]
+
+    # Position constraints on continuous sequence :
+    #     (position, hard_min, soft_min, min_penalty,
+    #             soft_max, hard_max, max_penalty)
+    # default prefer 2 breaks instead of 1 (penalty)
+    position_constraints = [
+        tuple(item)
+        for item in data.get("position_constraints", [])
+        + [[0, 1, 2, 5, 4, num_sessions, 0]]
+    ]
+
+    # Consecutive constraints
+    consecutive_constraints = [
+        tuple(item)
+        for item in data.get("constraints", {}).get("consecutive_constraints", [])
+    ]
+
+    # Sum constraints on position sessions:
+    #     (position, hard_min, soft_min, min_penalty,
+    #             soft_max, hard_max, max_penalty)
+    sum_constraints = [
+        tuple(item) for item in data.get("constraints", {}).get("sum_constraints", [])
+    ]
+
+    # break constraints
+    # (acrossNsession, hard_min, soft_min, min_penalty)
+    break_constraints = [tuple(item) for item in data.get("break_constraints", [])]
+
+    num_positions = len(positions)
+    lazy_loop_3 = data.get("loop_3_mode", "eager") == "lazy"
+    # "span" or "counter", see add_soft_sequence_constraint
+    sequence_encoding = data.get("sequence_encoding", "span")
+    # "square", "table", "piecewise" or "deviation", see add_break_evenness
+    break_evenness_encoding = data.get("break_evenness_encoding", "square")
+
+    # Diagnostic mode: the constraint groups are guarded by literals to find
+    # the ones in conflict, see diagnose.
+    diagnostic = data.get("diagnose", False)
+
+    model = cp_model.CpModel()
+    # Build time and model growth of each constraint family.
+    profile = BuildProfile(model, interrupted)
+    guards = Guards(model, diagnostic)
+
+    # Presolve: ratings, fixed assignments and positions without demand fix
+    # work cells, those are constants instead of variables.
+    rated = rated_positions(rating_constraints, num_employees, num_positions)
+    if diagnostic:
+        # every cell open, ratings, fixed assignments and demand are guarded
+        domains = [
+            [set(range(num_positions)) for _ in range(num_sessions)]
+            for _ in range(num_employees)
+        ]
+    else:
+        domains = work_domains(
+            num_employees, num_positions, cover_demands, rated, fixed_assignments
+        )
+    # What the presolve saved, compared to pinning every fixed cell.
+    presolve = {
+        "variables": 0,
+        "constraints": 0,
+        "clauses": 0,
+        "sequences": 0,
+    }
+    if not diagnostic:
+        presolve["constraints"] = len(fixed_assignments) + num_sessions * sum(
+            num_positions - 1 - len(r) for r in rated
+        )
+
+    with profile.family("work"):
+        false, true = model.new_constant(0), model.new_constant(1)
+        work = WorkGrid(num_employees, num_positions, num_sessions)
+        cells = work.cells
+        for e in range(num_employees):
+            for d in range(num_sessions):
+                domain = domains[e][d]
+                # flat index of (e, p, d), see WorkGrid
+                i = e * num_positions * num_sessions + d
+                for p in range(num_positions):
+                    if p not in domain:
+                        cells[i] = false
+                    elif len(domain) == 1:
+                        cells[i] = true
+                    else:
+                        cells[i] = model.new_bool_var(f"work{e}_{p}_{d}")
+                    i += num_sessions
+                if len(domain) < 2:
+                    presolve["variables"] += num_positions
+                else:
+                    presolve["variables"] += num_positions - len(domain)
+
+    def never_set(works: list[cp_model.IntVar]) -> bool:
+        return all(w is false for w in works)
+
+    def clause(*literals: cp_model.IntVar) -> list[cp_model.BoolVarT] | None:
+        """Clause forbidding all the cells together, None if always satisfied."""
+        if any(literal is false for literal in literals):
+            return None
+        return [~literal for literal in literals if literal is not true]
+
+    # Linear terms of the objective in a minimization context.
+    weights = {**DEFAULT_WEIGHTS, **data["weights"]}
+    penalties = PenaltyRegistry(weights)
+
+    # Exactly one position per session.
+    with profile.family("one_position"):
+        for e in range(num_employees):
+            for d in range(num_sessions):
+                if len(domains[e][d]) == 1:
+                    presolve["constraints"] += 1
+                    continue
+                model.add_exactly_one(
+                    literal for literal in work.positions(e, d) if literal is not false
+                )
+
+    if diagnostic:
+        # Fixed assignments.
+        # if position == -1 then employee is working (break is set to false)
+        with profile.family("fixed_assignments"):
+            for e, p, d in fixed_assignments:
+                with guards.guard("fixed_assignment", staff=e, session=d):
+                    if p == -1:
+                        model.add(work[e, 0, d] == 0)
+                    else:
+                        model.add(work[e, p, d] == 1)
+
+        # Rating constraints
+        with profile.family("rating"):
+            for e in range(num_employees):
+                with guards.guard("rating", staff=e):
+                    for d in range(num_sessions):
+                        for p in set(range(1, num_positions)) - rated[e]:
+                            model.add(work[e, p, d] == 0)
+
+    # Session preferences
+    with profile.family("preference"):
+        for e, p, d, w in preference:
+            penalties.add(work[e, p, d], w, "preference", "preference", e, p, d, 1)
+
+    # Position constraints
+    with profile.family("position_constraint"):
+        for i, ct in enumerate(position_constraints):
+            with guards.guard("position_constraint", index=i):
+                position, hard_min, soft_min, min_cost, soft_max, hard_max, max_cost = (
+                    ct
+                )
+                for e in range(num_employees):
+                    works = work.row(e, position)
+                    if never_set(works):
+                        presolve["sequences"] += 1
+                        continue
+                    add_soft_sequence_constraint(
+                        model,
+                        works,
+                        hard_min,
+                        soft_min,
+                        min_cost,
+                        soft_max,
+                        hard_max,
+                        max_cost,
+                        penalties.scope(
+                            "position_constraint", staff=e, position=position
+                        ),
+                        sequence_encoding,
+                    )
+
+    # Position assignment constraints (prefer 2/3 continous, 1/4 penalized)
+    with profile.family("position_assignment"), guards.guard("position_assignment"):
+        for e in range(num_employees):
+            for position in range(1, num_positions):
+                works = work.row(e, position)
+                if never_set(works):
+                    presolve["sequences"] += 1
+                    continue
+                add_soft_sequence_constraint(
+                    model,
+                    works,
+                    1,
+                    2,
+                    data["weights"]["short_session"],
+                    3,
+                    max_continous_work,
+                    data["weights"]["long_session"],
+                    penalties.scope(
+                        "position_assignment",
+                        staff=e,
+                        position=position,
+                        min_weight="short_session",
+                        max_weight="long_session",
+                    ),
+                    sequence_encoding,
+                )
+
+    # Consecutive Breaks
+    with profile.family("long_breaks"), guards.guard("long_breaks"):
+        for e in range(num_employees):
+            works = work.row(e, 0)
+            add_soft_sequence_constraint(
+                model,
+                works,
+                1,
+                2,
+                data["weights"]["short_break"],
+                4,
+                num_sessions,
+                data["weights"]["long_break"],
+                penalties.scope(
+                    "long_breaks",
+                    staff=e,
+                    min_weight="short_break",
+                    max_weight="long_break",
+                ),
+                sequence_encoding,
+            )
+
+    # Consecutive constraints
+    with profile.family("consecutive_constraints"):
+        for i, ct in enumerate(consecutive_constraints):
+            with guards.guard("consecutive_constraint", index=i):
+                (
+                    employees,
+                    position,
+                    start,
+                    end,
+                    hard_min,
+                    soft_min,
+                    min_cost,
+                    soft_max,
+                    hard_max,
+                    max_cost,
+                    prefix,
+                ) = ct
+                for e in employees:
+                    works = work.row(e, position, start, end + 1)
+                    if never_set(works):
+                        presolve["sequences"] += 1
+                        continue
+                    add_soft_sequence_constraint(
+                        model,
+                        works,
+                        hard_min,
+                        soft_min,
+                        min_cost,
+                        soft_max,
+                        hard_max,
+                        max_cost,
+                        penalties.scope(
+                            prefix, staff=e, position=position, offset=start
+                        ),
+                        sequence_encoding,
+                    )
+
+    # Sum constraints
+    with profile.family("sum_constraints"):
+        for i, ct in enumerate(sum_constraints):
+            with guards.guard("sum_constraint", index=i):
+                (
+                    employees,
+                    position,
+                    start,
+                    end,
+                    hard_min,
+                    soft_min,
+                    min_cost,
+                    soft_max,
+                    hard_max,
+                    max_cost,
+                    prefix,
+                ) = ct
+
+                for e in employees:
+                    works = work.row(e, position, start, end + 1)
+                    add_soft_sum_constraint(
+                        model,
+                        works,
+                        hard_min,
+                        soft_min,
+                        min_cost,
+                        soft_max,
+                        hard_max,
+                        max_cost,
+                        num_sessions,
+                        penalties.scope(
+                            prefix,
+                            staff=e,
+                            position=position,
+                            start=start,
+                            length=end - start + 1,
+                        ),
+                    )
+
+    # promote even position distribution
+    with profile.family("position_evenness"), guards.guard("position_evenness"):
+        for e in range(num_employees):
+            # only check valid ratings
+            for p in sorted(rated[e]):
+                works = work.row(e, p)
+                add_soft_sum_constraint(
+                    model,
+                    works,
+                    0,
+                    1,
+                    data.get("weights", {}).get(
+                        "position_evenness", DEFAULT_WEIGHTS["position_evenness"]
+                    ),  # penalty for each position not assigned to employee
+                    num_sessions - min_breaks,  # ? set soft_max and hard_max sessions?
+                    num_sessions - min_breaks,
+                    0,
+                    num_sessions - min_breaks,
+                    penalties.scope(
+                        "position_evenness",
+                        staff=e,
+                        position=p,
+                        min_weight="position_evenness",
+                    ),
+                )
+
+    # break constraints handling
+    with profile.family("break_constraint"):
+        for i, ct in enumerate(break_constraints):
+            with guards.guard("break_constraint", index=i):
+                across, hard_min, soft_min, min_cost = ct
+                for e in range(num_employees):
+                    breaks = work.row(e, 0)
+                    for f in range(num_sessions - (across - 1)):
+                        works = breaks[f : f + across]
+                        add_soft_sum_constraint(
+                            model,
+                            works,
+                            hard_min,
+                            soft_min,
+                            min_cost,
+                            num_sessions,
+                            num_sessions,
+                            0,
+                            num_sessions,
+                            penalties.scope(
+                                "break_constraint", staff=e, start=f, length=across
+                            ),
+                        )
+
+    # max continous work constraints (hard constraint)
+    with profile.family("max_continous_work"), guards.guard("max_continous_work"):
+        for e in range(num_employees):
+            works = work.row(e, 0)
+            add_rev_soft_sequence_constraint(
+                model,
+                works,
+                max_continous_work,
+            )
+
+    constraints = data.get("constraints", {})
+
+    # one set constraints
+    with profile.family("one_set"):
+        for i, group in enumerate(constraints.get("one_set", [])):
+            with guards.guard("one_set", index=i):
+                (
+                    employees,
+                    start,
+                    end,
+                    position,
+                    hard_min,
+                    soft_min,
+                    min_cost,
+                    prefix,
+                ) = group
+                for e in employees:
+                    works = work.row(e, position, start, end + 1)
+                    add_one_set_constraint(
+                        model,
+                        works,
+                        hard_min,
+                        soft_min,
+                        min_cost,
+                        penalties.scope(
+                            prefix,
+                            staff=e,
+                            position=position,
+                            start=start,
+                            length=end - start + 1,
+                        ),
+                    )
+
+    # Penalized transitions
+    with profile.family("transition"):
+        for i, (previous_position, next_position, cost) in enumerate(
+            constraints.get("transition", [])
+        ):
+            with guards.guard("transition", index=i):
+                for e in range(num_employees):
+                    previous = work.row(e, previous_position)
+                    following = work.row(e, next_position)
+                    for d in range(num_sessions - 1):
+                        transition = clause(previous[d], following[d + 1])
+                        if transition is None:
+                            presolve["clauses"] += 1
+                            continue
+                        if cost == 0:
+                            model.add_bool_or(transition)
+                        else:
+                            trans_var = model.new_bool_var("")
+                            transition.append(trans_var)
+                            model.add_bool_or(transition)
+                            penalties.add(
+                                trans_var,
+                                cost,
+                                "transition",
+                                f"{previous_position} -> {next_position}",
+                                e,
+                                previous_position,
+                                d,
+                                2,
+                            )
+
+    # Cover constraints
+    with profile.family("cover"):
+        for p in range(1, num_positions):
+            for d in range(num_sessions):
+                with guards.guard("cover", session=d):
+                    # Ignore Break.
+                    works = [
+                        literal for literal in work.column(p, d) if literal is not false
+                    ]
+                    min_demand = cover_demands[d][p - 1]
+                    model.add(cp_model.LinearExpr.sum(works) == min_demand)
+
+    # Only employees who may move from s1 to s2 between d and d + 1 can form a
+    # loop, the other clauses are trivially satisfied. Each is listed with the
+    # negated literals of its move, the s1 cell in d and s2 cell in d + 1, so a
+    # loop clause is the concatenation of the moves.
+    eligible = {}
+    for s1, s2, d in loop_index(cover_demands, num_positions, 2):
+        for source, target in ((s1, s2), (s2, s1)):
+            sources, targets = work.column(source, d), work.column(target, d + 1)
+            eligible[source, target, d] = [
+                (e, clause(sources[e], targets[e]))
+                for e in range(num_employees)
+                if source in domains[e][d] and target in domains[e][d + 1]
+            ]
+    # the same, from the ratings only, to count the clauses saved
+    rated_eligible = {
+        (s1, s2): {e for e in range(num_employees) if {s1, s2} <= rated[e]}
+        for s1 in range(1, num_positions)
+        for s2 in range(1, num_positions)
+        if s1 != s2
+    }
+
+    # prevent loop 2 employees
+    # A loop is a mover from s1 to s2 and another from s2 to s1, so each
+    # clause pairs the two directions.
+    with profile.family("loop_2"), guards.guard("loop_2"):
+        if data.get("prevent_loop_2", True):
+            for s1, s2, d in loop_index(cover_demands, num_positions, 2):
+                num_rated = len(rated_eligible[s1, s2])
+                presolve["clauses"] += num_rated * (num_rated - 1)
+                for e1, move1 in eligible[s1, s2, d]:
+                    for e2, move2 in eligible[s2, s1, d]:
+                        if e2 != e1:
+                            model.add_bool_or(move1 + move2)
+                            presolve["clauses"] -= 1
+
+    # prevent loop 3 employees
+    # In lazy mode the clauses are only added once a solution shows the loop.
+    with profile.family("loop_3"), guards.guard("loop_3"):
+        if data.get("prevent_loop_3", True) and not lazy_loop_3:
+            for s1, s2, s3, d in loop_index(cover_demands, num_positions, 3):
+                presolve["clauses"] += distinct_triples(
+                    rated_eligible[s1, s2],
+                    rated_eligible[s2, s3],
+                    rated_eligible[s3, s1],
+                )
+                for e1, move1 in eligible[s1, s2, d]:
+                    for e2, move2 in eligible[s2, s3, d]:
+                        if e2 == e1:
+                            continue
+                        loop = move1 + move2
+                        for e3, move3 in eligible[s3, s1, d]:
+                            if e3 != e1 and e3 != e2:
+                                model.add_bool_or(loop + move3)
+                                presolve["clauses"] -= 1
+
+    # Distribute breaks evenly (minimize variance)
+    with profile.family("break_evenness"), guards.guard("break_evenness"):
+        # every cell is manned exactly, so the breaks add up to a constant
+        total_breaks = num_employees * num_sessions - sum(map(sum, cover_demands))
+        for e in range(num_employees):
+            add_break_evenness(
+                model,
+                work.row(e, 0),
+                min_breaks,
+                total_breaks / num_employees,
+                weights["break_evenness"],
+                penalties.scope("break_evenness", staff=e, min_weight="break_evenness"),
+                break_evenness_encoding,
+            )
+
+    shift_model = ShiftModel(
+        model,
+        work,
+        num_employees,
+        num_positions,
+        num_sessions,
+        penalties,
+        profile,
+        domains,
+        presolve,
+        guards.groups,
+        lazy_loop_3,
+    )
+    # the model is cached, it must not keep the callback of this request
+    profile.interrupted = None
+    shift_model.set_objective(weights)
+    return shift_model
+
+
+# Seconds a search may overrun max_time before the callback stops it.
+DEADLINE_GRACE = 1.0
+# Share of the time left given to each lazy loop 3 round after the first.
+LAZY_ROUND_SHARE = 0.5
+# Seconds under which no other lazy loop 3 round is started.
+MIN_ROUND_TIME = 0.1
+
+# Built models shared by the solver threads, see model_cache.fingerprint.
+model_cache = ModelCache(build_model, int(os.environ.get("MODEL_CACHE_SIZE", 8)))
+
+
+def precheck(data: dict[str, any]) -> list[dict[str, any]]:
+    """Staffing conflicts of a request found without solving it.
+
+    See check_feasibility, an empty list does not prove the request feasible.
+    """
+    num_employees = data.get("num_employees")
+    positions = [""] + data.get("positions")
+    cover_demands = [tuple(item) for item in data.get("cover_demands", [])]
+    rated = rated_positions(
+        [tuple(item) for item in data.get("rating_constraints", [])],
+        num_employees,
+        len(positions),
+    )
+    domains = work_domains(
+        num_employees,
+        len(positions),
+        cover_demands,
+        rated,
+        [tuple(item) for item in data.get("fixed_assignments", [])],
+    )
+    return check_feasibility(domains, cover_demands, positions)
+
+
+def infeasible_result(conflicts: list[dict[str, any]]) -> dict[str, any]:
+    """Solve result of a request rejected by precheck."""
+    message = conflicts[0]["message"]
+    if len(conflicts) > 1:
+        message += f" (and {len(conflicts) - 1} more conflicts)"
+    return {
+        "status": "INFEASIBLE",
+        "solution": None,
+        "message": message,
+        "conflicts": conflicts,
+    }
+
+
+def incumbent_of(solver: cp_model.CpSolver, work: WorkGrid) -> dict[str, any]:
+    """Roster, objective and variable values of the last solution found."""
+    values = np.asarray(solver.response_proto.solution)
+    return {
+        "values": values,
+        "solution": roster(values, work.index()).tolist(),
+        "objective": solver.objective_value,
+    }
+
+
+def solve_shift_scheduling(
+    data: dict[str, any],
+    cb: cp_model.CpSolverSolutionCallback,
+    num_workers=min(os.cpu_count(), 8),
+    embed: Callable[[list[list[int]]], list[list[int]]] | None = None,
+    parameters: dict[str, any] | None = None,
+):
+    """Solves the shift scheduling problem.
+
+    embed maps the rosters of this request to the published incumbents, e.g.
+    a window into the full roster, see horizon.solve_rolling_horizon.
+    parameters are the CP-SAT parameters of the search, the profile tuned for
+    the size of the request if None, see solver_profiles.
+    """
+    try:
+        # Requests that cannot be staffed are rejected without solving.
+        conflicts = precheck(data)
+        if conflicts:
+            return infeasible_result(conflicts)
+
+        try:
+            shift_model = model_cache.get(data, cb.is_interrupted)
+        except BuildInterrupted:
+            return
+        if data.get("diagnose"):
+            return diagnose(shift_model, data.get("max_time", 15), num_workers)
+        model = shift_model.model
+        work = shift_model.work
+
+        # Solve the model.
+        solver = cp_model.CpSolver()
+
+        solver.parameters.num_workers = num_workers
+        apply_profile(
+            solver.parameters,
+            solver_profile(data) if parameters is None else parameters,
+        )
+
+        # Publish the improving rosters as they are found.
+        work_index = shift_model.work.index()
+        if embed is None:
+            cb.watch(lambda values: roster(values, work_index).tolist())
+        else:
+            cb.watch(lambda values: embed(roster(values, work_index).tolist()))
+
+        # Warm start from a previous roster of the same problem.
+        hint = data.get("hint_solution")
+        hinted = add_solution_hint(shift_model, hint) if hint else 0
+        if hinted:
+            # a feasible hint is the first solution as is, repairing it would
+            # only delay that
+            try:
+                feasible_hint = evaluate(hint, data)["feasible"]
+            except ValueError:
+                feasible_hint = False
+            solver.parameters.repair_hint = not feasible_hint
+
+        # Lazy loop 3: solve, cut the loops found in the incumbent and re-solve
+        # from it until the time budget is spent. The first round stops at the
+        # first roster, the next ones get LAZY_ROUND_SHARE of the time left, so
+        # that cut rounds get time.
+        max_time = data.get("max_time", 15)
+        deadline = time.monotonic() + max_time
+        # stops a search overrunning the time limit, e.g. in a late re-solve
+        cb.set_deadline(max_time + DEADLINE_GRACE)
+        loop_cuts = 0
+        # the last roster found, its loops, and the last loop free one
+        incumbent = None
+        loops = []
+        loop_free = None
+        while True:
+            # interrupted while building, an interrupt only stops a running search
+            if cb.is_interrupted():
+                cb.clear_deadline()
+                return
+            time_left = deadline - time.monotonic()
+            if shift_model.lazy_loop_3:
+                first = incumbent is None
+                solver.parameters.stop_after_first_solution = first
+                if not first:
+                    time_left *= LAZY_ROUND_SHARE
+            solver.parameters.max_time_in_seconds = max(time_left, 0.1)
+            cb._reset_timer()
+            status = solver.solve(model, cb)
+            cb.clear_timer()
+
+            if cb.is_interrupted():
+                # q.put(Message("interrupted").__str__())
+                cb.clear_deadline()
+                return
+
+            if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+                incumbent = incumbent_of(solver, work)
+                if not shift_model.lazy_loop_3:
+                    break
+                loops = find_triple_loops(incumbent["solution"])
+                if not loops:
+                    loop_free = incumbent
+                    if status == cp_model.OPTIMAL:
+                        break
+                for loop in loops:
+                    add_loop_3_cut(model, work, loop)
+                loop_cuts += len(loops)
+                model.clear_hints()
+                add_solution_hint(shift_model, incumbent["solution"])
+            elif status != cp_model.UNKNOWN or not shift_model.lazy_loop_3:
+                break
+
+            if time.monotonic() >= deadline - MIN_ROUND_TIME:
+                break
+        solver.parameters.stop_after_first_solution = False
+
+        # a roster with loops is only returned if no loop free one was found
+        if loops and loop_free is not None:
+            incumbent, loops = loop_free, []
+        cb.clear_deadline()
+
+        if incumbent is not None:
+            # solution
+            result = {
+                "status": "FEASIBLE",
+                "solution": incumbent["solution"],
+            }
+            # penalties
+            result["objective"] = incumbent["objective"]
+            result["penalties"] = shift_model.penalties.breakdown(
+                incumbent["values"],
+                {**DEFAULT_WEIGHTS, **data["weights"]},
+            )
+            if data.get("break_evenness_encoding") == "piecewise":
+                exact_break_squares(
+                    result, {**DEFAULT_WEIGHTS, **data["weights"]}["break_evenness"]
+                )
+            if shift_model.lazy_loop_3:
+                result["loop_cuts"] = loop_cuts
+            if loops:
+                # no loop free roster found in time, the loops are listed
+                result["status"] = "VIOLATED"
+                result["feasible"] = False
+                result["loops"] = loops
+                result["violations"] = evaluate(result["solution"], data)["violations"]
+            if hinted:
+                kept = sum(
+                    1
+                    for staff, hint_staff in zip(result["solution"], hint)
+                    for position, hint_position in zip(staff, hint_staff)
+                    if position == hint_position
+                )
+                result["hint"] = {
+                    # "user", "heuristic" from warm_start or "incumbent", the
+                    # roster of a previous solve
+                    "source": data.get("hint_source", "user"),
+                    "cells": hinted,
+                    "kept": kept,
+                    "ratio": round(kept / hinted, 3),
+                }
+        elif status == cp_model.UNKNOWN and data.get("heuristic_solution"):
+            # no roster in time, fall back to the heuristic one
+            evaluation = evaluate(data["heuristic_solution"], data)
+            result = {
+                "status": "heuristic",
+                "solution": data["heuristic_solution"],
+                "objective": evaluation["objective"],
+                "feasible": evaluation["feasible"],
+                "violations": evaluation["violations"],
+            }
+        else:
+            result = {
+                "status": "INFEASIBLE",
+                "solution": None,
+            }
+
+        result["profile"] = shift_model.profile.report()
+        result["presolve"] = shift_model.presolve
+        result["stats"] = solver_stats(solver, status)
+        result["stats"]["size_bucket"] = request_bucket(data)
+        return result
+    except:
+        pass
+        # q.put(Message("error", "solver", traceback.format_exc(), None).__str__())
+
+
+def diagnose(
+    shift_model: ShiftModel, max_time: float, num_workers: int
+) -> dict[str, any]:
+    """Finds constraint groups that cannot be satisfied together.
+
+    The model must be built in diagnostic mode, where each constraint family
+    and each user supplied constraint entry is guarded by a literal. The guards
+    are solved as assumptions, without objective. If infeasible, the core given
+    by sufficient_assumptions_for_infeasibility is shrunk by dropping one group
+    at a time while the rest stays infeasible, within max_time.
+
+    Returns:
+      the result, with "core" listing the conflicting groups and whether the
+      core is "minimal", i.e. every group was tried within the time budget.
+    """
+    model = shift_model.model
+    model.clear_objective()
+    solver = cp_model.CpSolver()
+    solver.parameters.num_workers = num_workers
+    deadline = time.monotonic() + max_time
+
+    def solve(assumptions: list[int]) -> int:
+        model.clear_assumptions()
+        model.add_assumptions(
+            [model.get_bool_var_from_proto_index(index) for index in assumptions]
+        )
+        solver.parameters.max_time_in_seconds = max(deadline - time.monotonic(), 0.1)
+        return solver.solve(model)
+
+    status = solve(list(shift_model.guards))
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        return {
+            "status": "FEASIBLE",
+            "solution": solution_obj(solver, shift_model.work),
+            "core": [],
+        }
+    if status != cp_model.INFEASIBLE:
+        return {"status": solver.status_name(status), "solution": None, "core": []}
+
+    core = list(solver.sufficient_assumptions_for_infeasibility())
+    minimal = True
+    for index in list(core):
+        if time.monotonic() >= deadline:
+            minimal = False
+            break
+        if index not in core:
+            continue
+        status = solve([i for i in core if i != index])
+        if status == cp_model.INFEASIBLE:
+            # a smaller core, without this group
+            core = list(solver.sufficient_assumptions_for_infeasibility())
+        elif status not in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+            minimal = False
+
+    groups = [shift_model.guards[index] for index in core]
+    if not groups:
+        message = "Infeasible whatever the constraints, check the staff and demand"
+    else:
+        message = "Conflicting constraints: " + ", ".join(
+            " ".join(
+                [group["group"]]
+                + [
+                    f"{key} {value + 1}"
+                    for key, value in group.items()
+                    if key != "group"
+                ]
+            )
+            for group in groups
+        )
+    return {
+        "status": "INFEASIBLE",
+        "solution": None,
+        "core": groups,
+        "minimal": minimal,
+        "message": message,
+    }
+
+
+def solver_stats(solver: cp_model.CpSolver, status) -> dict[str, any]:
+    """Search statistics of the last solve."""
+    response = solver.response_proto
+    return {
+        "status": solver.status_name(status),
+        "conflicts": solver.num_conflicts,
+        "branches": solver.num_branches,
+        "deterministic_time": round(response.deterministic_time, 3),
+        "wall_time": round(solver.wall_time, 3),
+        "user_time": round(solver.user_time, 3),
+        "num_booleans": solver.num_booleans,
+        "solution_info": response.solution_info,
+    }
+
+
+def exact_break_squares(result: dict[str, any], weight: int):
+    """Scores the break counts of a result roster at exactly n^2, in place.
+
+    The piecewise encoding only bounds the squares from below, so the solver
+    values, and the objective, may exceed the squares of the break counts, see
+    add_break_evenness. The objective is lowered by the difference.
+    """
+    breaks = [staff.count(0) for staff in result["solution"]]
+    penalties = []
+    for item in result["penalties"]:
+        if item["violation"] == "break_count_squared":
+            value = breaks[item["staff"]] ** 2
+            result["objective"] -= item["penalty"] - value * weight
+            item = {**item, "value": value, "penalty": value * weight}
+        if item["penalty"]:
+            penalties.append(item)
+    result["penalties"] = penalties
+
+
+def solution_obj(solver: cp_model.CpSolver, work: WorkGrid) -> list:
+    """Roster of the last solution, read in one call from the response."""
+    return roster(np.asarray(solver.response_proto.solution), work.index()).tolist()
@@ -0,0 +1,94 @@
+"""CP-SAT parameter profiles by request size, written by tune.py.
+
+Requests are grouped in size buckets of employees x positions x sessions, see
+size_bucket. solve_shift_scheduling looks up the profile tuned for the bucket
+of a request in PROFILES_PATH, and falls back to DEFAULT_PROFILE for buckets
+without one or when there is no profile file. The file is read again when it
+changes, so a new tuning run is picked up by running workers.
+"""
+
+import json
+import logging
+import os
+
+from ortools.sat.python import cp_model
+
+PROFILES_PATH = os.environ.get(
+    "SOLVER_PROFILES",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "solver_profiles.json"),
+)
+
+# CP-SAT parameters of the buckets without a tuned profile.
+DEFAULT_PROFILE = {
+    "symmetry_level": 1,
+    "cp_model_presolve": False,
+    "use_lns": True,
+}
+
+# Upper bounds of the buckets of each dimension, larger sizes share one bucket.
+EMPLOYEE_BUCKETS = (8, 16, 24, 32)
+POSITION_BUCKETS = (4, 8, 12, 16)
+SESSION_BUCKETS = (14, 28, 56)
+
+# path -> (modification time, profiles) of the files read so far
+_loaded = {}
+
+
+def size_bucket(num_employees: int, num_positions: int, num_sessions: int) -> str:
+    """Bucket of a request size, e.g. "16x8x28" for 10 x 5 x 20 or ">32x4x14"."""
+
+    def bound(value: int, bounds: tuple[int, ...]) -> str:
+        return next((str(b) for b in bounds if value <= b), f">{bounds[-1]}")
+
+    return "x".join(
+        (
+            bound(num_employees, EMPLOYEE_BUCKETS),
+            bound(num_positions, POSITION_BUCKETS),
+            bound(num_sessions, SESSION_BUCKETS),
+        )
+    )
+
+
+def request_bucket(data: dict[str, any]) -> str:
+    """Size bucket of a request payload."""
+    return size_bucket(
+        data["num_employees"], len(data["positions"]), len(data["cover_demands"])
+    )
+
+
+def valid(profile: dict[str, any]) -> bool:
+    """Whether the parameters of a profile are all CP-SAT parameters."""
+    try:
+        apply_profile(cp_model.CpSolver().parameters, profile["parameters"])
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        logging.warning(f"Ignoring solver profile {profile!r}: {str(e)}")
+        return False
+    return True
+
+
+def load_profiles(path: str = PROFILES_PATH) -> dict[str, dict[str, any]]:
+    """Valid tuned profiles by bucket, empty if the file is missing or unreadable."""
+    try:
+        mtime = os.path.getmtime(path)
+        if path not in _loaded or _loaded[path][0] != mtime:
+            with open(path, "r") as f:
+                profiles = json.load(f)["profiles"]
+            _loaded[path] = (
+                mtime,
+                {bucket: p for bucket, p in profiles.items() if valid(p)},
+            )
+    except (OSError, ValueError, KeyError, AttributeError):
+        return {}
+    return _loaded[path][1]
+
+
+def solver_profile(data: dict[str, any]) -> dict[str, any]:
+    """CP-SAT parameters for a request, tuned for its size bucket if possible."""
+    profile = load_profiles().get(request_bucket(data))
+    return {**DEFAULT_PROFILE, **(profile["parameters"] if profile else {})}
+
+
+def apply_profile(parameters, profile: dict[str, any]):
+    """Sets the scalar CP-SAT parameters of a profile on solver.parameters."""
+    for key, value in profile.items():
+        setattr(parameters, key, value)
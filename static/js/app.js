@@ -2,6 +2,7 @@ class CpsatSolver {
     constructor() {
         this.eventSource = null;
         this.solverId = null;
+        this.lastSolution = null;
         this.initializeEventHandlers();
     }
 
@@ -11,12 +12,37 @@ class CpsatSolver {
             e.preventDefault();
             this.solveOptimization();
         });
+
+        document.getElementById('cancelBtn').addEventListener('click', (e) => {
+            e.preventDefault();
+            this.cancelOptimization();
+        });
+    }
+
+    // Interrupt the running solve, "interrupted" then comes on the stream
+    async cancelOptimization() {
+        if (!this.solverId) {
+            return;
+        }
+        document.getElementById('cancelBtn').disabled = true;
+        try {
+            await fetch(`/solve/${this.solverId}`, { method: 'DELETE' });
+        } catch (error) {
+            console.error('Error cancelling optimization:', error);
+        }
     }
 
-    async solveOptimization() {
+    async solveOptimization(options = {}) {
         try {
             // Collect and validate form data
-            const data = config.toJson();
+            const data = Object.assign(config.toJson(), options);
+            // rosters come back as base64 bytes, see decodeRoster
+            data.solution_encoding = 'packed';
+
+            // Warm start from the previous roster
+            if (this.lastSolution) {
+                data.hint_solution = this.lastSolution;
+            }
 
             // Reset UI
             this.resetUI();
@@ -43,6 +69,9 @@ class CpsatSolver {
 
             const result = await response.json();
             this.solverId = result.solver_id;
+            const cancelButton = document.getElementById('cancelBtn');
+            cancelButton.disabled = false;
+            cancelButton.classList.remove('d-none');
 
             // Start listening for progress updates
             this.startProgressStream();
@@ -75,12 +104,21 @@ class CpsatSolver {
         }
 
         this.eventSource = new EventSource(`/progress/${this.solverId}`);
+        // the server only sends the fields that changed, merged here
+        this.progressState = {};
+        this.shownIncumbent = null;
 
         this.eventSource.onmessage = (event) => {
             try {
                 const data = JSON.parse(event.data);
                 console.log('Progress update:', data);
-                this.handleProgressUpdate(data);
+                for (const key of ['result', 'incumbent']) {
+                    if (data[key] && data[key].solution) {
+                        data[key].solution = this.decodeRoster(data[key].solution);
+                    }
+                }
+                Object.assign(this.progressState, data);
+                this.handleProgressUpdate(this.progressState);
             } catch (error) {
                 console.error('Error parsing progress data:', error);
             }
@@ -94,6 +132,39 @@ class CpsatSolver {
         };
     }
 
+    // Nested list roster from a roster_codec.py encoding
+    decodeRoster(solution) {
+        if (Array.isArray(solution)) {
+            return solution;
+        }
+        if (solution.encoding === 'rle') {
+            return solution.runs.map(runs => {
+                const staff = [];
+                for (let i = 0; i < runs.length; i += 2) {
+                    for (let n = 0; n < runs[i + 1]; n++) {
+                        staff.push(runs[i]);
+                    }
+                }
+                return staff;
+            });
+        }
+        if (solution.encoding === 'packed') {
+            const binary = atob(solution.data);
+            const bytes = new Uint8Array(binary.length);
+            for (let i = 0; i < binary.length; i++) {
+                bytes[i] = binary.charCodeAt(i);
+            }
+            const values = solution.dtype === 'uint16' ? new Uint16Array(bytes.buffer) : bytes;
+            const [employees, sessions] = solution.shape;
+            const roster = [];
+            for (let e = 0; e < employees; e++) {
+                roster.push(Array.from(values.subarray(e * sessions, (e + 1) * sessions)));
+            }
+            return roster;
+        }
+        throw new Error(`Unknown roster encoding ${solution.encoding}`);
+    }
+
     handleProgressUpdate(data) {
         if (data.error) {
             this.showError(data.error);
@@ -103,6 +174,23 @@ class CpsatSolver {
 
         // Update progress
         this.updateProgress(data.progress || 0, parseInt(data.count) || 0, data.status || 'unknown');
+        if (data.status === 'queued' && data.queue_position) {
+            document.getElementById('statusText').textContent = `Queued (#${data.queue_position})`;
+        }
+
+        // Show the best roster so far, until the final one comes
+        if ((data.status === 'solving' || data.status === 'queued') && data.incumbent && data.incumbent !== this.shownIncumbent) {
+            const firstIncumbent = !this.shownIncumbent;
+            this.shownIncumbent = data.incumbent;
+            this.showResults(data.incumbent, data.positions, firstIncumbent);
+            const summary = data.incumbent.status === 'heuristic'
+                ? `Heuristic roster: objective ${data.incumbent.objective}` +
+                  (data.incumbent.feasible ? '' : ', breaks some constraints')
+                : `Best roster so far: objective ${data.incumbent.objective}, ` +
+                  `gap ${(data.incumbent.gap * 100).toFixed(1)}%`;
+            document.getElementById('resultContent').insertAdjacentHTML('afterbegin',
+                `<p class="text-muted small mb-1">${summary}</p>`);
+        }
 
         // Handle completion
         if (data.status === 'completed') {
@@ -113,6 +201,9 @@ class CpsatSolver {
             this.eventSource.close();
             this.showError(data.error || 'Solver encountered an error');
             this.resetSolveButton();
+        } else if (data.status === 'interrupted') {
+            this.eventSource.close();
+            this.resetSolveButton();
         }
     }
 
@@ -132,6 +223,7 @@ class CpsatSolver {
     getStatusBadgeClass(status) {
         const classMap = {
             'initializing': 'bg-secondary',
+            'queued': 'bg-info',
             'solving': 'bg-primary',
             'completed': 'bg-success',
             'error': 'bg-danger',
@@ -148,14 +240,32 @@ class CpsatSolver {
 
         if (result.status === 'OPTIMAL' || result.status === 'FEASIBLE') {
             console.log('Solution found:', result);
+            this.lastSolution = result.solution;
             this.showResults(result, positions);
+        } else if (result.status === 'heuristic') {
+            // the solver found no roster in time
+            this.showResults(result, positions);
+            const violations = (result.violations || []).map(v => `<li>${v.message}</li>`).join('');
+            document.getElementById('resultContent').insertAdjacentHTML('afterbegin',
+                `<p class="text-warning small mb-1">No roster found by the solver in time, ` +
+                `showing the heuristic one (objective ${result.objective}).</p>` +
+                (violations ? `<ul class="small text-warning">${violations}</ul>` : ''));
+        } else if (result.status === 'VIOLATED') {
+            // a roster breaking some hard constraints, e.g. position loops
+            this.lastSolution = result.solution;
+            this.showResults(result, positions);
+            const violations = (result.violations || []).map(v => `<li>${v.message}</li>`).join('');
+            document.getElementById('resultContent').insertAdjacentHTML('afterbegin',
+                `<p class="text-warning small mb-1">No roster meeting every constraint found in time, ` +
+                `showing the best one (objective ${result.objective}).</p>` +
+                (violations ? `<ul class="small text-warning">${violations}</ul>` : ''));
         } else {
             console.log('No solution found:', result);
             this.showNoSolution(result);
         }
     }
 
-    showResults(result, positions) {
+    showResults(result, positions, scroll = true) {
         const resultsDiv = document.getElementById('results');
         const resultContent = document.getElementById('resultContent');
 
@@ -187,7 +297,9 @@ class CpsatSolver {
 
         resultContent.innerHTML = table;
         resultsDiv.classList.remove('d-none');
-        resultsDiv.scrollIntoView();
+        if (scroll) {
+            resultsDiv.scrollIntoView();
+        }
     }
 
     showNoSolution(result) {
@@ -199,12 +311,46 @@ class CpsatSolver {
             <p>${result.message || 'Unable to generate roster with current staff and positions.'}</p>
         `;
 
+        // conflicts found by the pre-check, with the session times
+        if (result.conflicts && result.conflicts.length > 1) {
+            let list = '<ul class="mb-0">';
+            for (const conflict of result.conflicts) {
+                const session = conflict.session;
+                const times = config.shift_times[session] && config.shift_times[session + 1]
+                    ? ` (${config.shift_times[session]}-${config.shift_times[session + 1]})`
+                    : '';
+                list += `<li>${conflict.message}${times}</li>`;
+            }
+            list += '</ul>';
+            noSolutionContent.innerHTML += list;
+        }
+
+        // conflicting constraints found by a diagnostic solve
+        if (result.core && result.core.length > 0) {
+            let list = '<ul class="mb-0">';
+            for (const group of result.core) {
+                const fields = Object.entries(group)
+                    .filter(([key]) => key !== 'group')
+                    .map(([key, value]) => `${key} ${value + 1}`);
+                list += `<li>${[group.group.replaceAll('_', ' ')].concat(fields).join(', ')}</li>`;
+            }
+            list += '</ul>';
+            noSolutionContent.innerHTML += list;
+        } else if (result.status === 'INFEASIBLE' && !result.conflicts && !('core' in result)) {
+            const diagnoseButton = document.createElement('button');
+            diagnoseButton.className = 'btn btn-sm btn-outline-secondary mt-2';
+            diagnoseButton.textContent = 'Find conflicting constraints';
+            diagnoseButton.addEventListener('click', () => this.solveOptimization({ diagnose: true }));
+            noSolutionContent.appendChild(diagnoseButton);
+        }
+
         noSolutionDiv.classList.remove('d-none');
     }
 
     formatStatus(status) {
         const statusMap = {
             'initializing': 'Initializing',
+            'queued': 'Queued',
             'solving': 'Solving',
             'completed': 'Completed',
             'interrupted': 'Interrupted',
@@ -217,6 +363,7 @@ class CpsatSolver {
         const solveButton = document.getElementById('solveBtn');
         solveButton.disabled = false;
         solveButton.innerHTML = '<i class="fas fa-play me-2"></i>Generate';
+        document.getElementById('cancelBtn').classList.add('d-none');
     }
 
     showError(message) {
@@ -0,0 +1,28 @@
+import pytest
+
+from callback import ObjectiveEarlyStopping
+from evaluator import evaluate
+from scenarios import make_scenario
+from solver import model_cache, solve_shift_scheduling
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_objective_matches_solver(seed):
+    data = make_scenario(5, 3, 8, seed=seed, fixed_density=0.1, num_transitions=2)
+    data["max_time"] = 5
+    model_cache.clear()
+    cb = ObjectiveEarlyStopping(5, data["gap_ratio"], lambda fields: None)
+
+    result = solve_shift_scheduling(data, cb, num_workers=1)
+
+    assert result["status"] == "FEASIBLE"
+    evaluation = evaluate(result["solution"], data)
+    assert evaluation["feasible"], evaluation["violations"]
+    assert evaluation["objective"] == result["objective"]
+    solver_penalties = {}
+    for item in result["penalties"]:
+        name = item["name"]
+        solver_penalties[name] = solver_penalties.get(name, 0) + item["penalty"]
+    assert {name: p for name, p in evaluation["penalties"].items() if p} == {
+        name: p for name, p in solver_penalties.items() if p
+    }
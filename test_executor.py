@@ -0,0 +1,58 @@
+import queue
+import threading
+import time
+
+import executor
+from scenarios import make_scenario
+
+
+def run_cancelled(data, after):
+    """Runs _solve_job in this process, cancelled after seconds (None: before)."""
+    events = queue.Queue()
+    cancelled = [int(after is None)]
+    executor._init_worker(events, cancelled)
+    timer = threading.Timer(after or 0, cancelled.__setitem__, (0, 1))
+    timer.start()
+    started = time.monotonic()
+    executor._solve_job("solve", data, 1, 0)
+    elapsed = time.monotonic() - started
+    timer.cancel()
+
+    statuses = []
+    while not events.empty():
+        kind, _, payload = events.get()
+        if kind == "progress" and "status" in payload:
+            statuses.append(payload["status"])
+    return statuses, elapsed
+
+
+def test_cancel_flag_stops_a_solve():
+    data = make_scenario(16, 5, 24, seed=0)
+    data["max_time"] = 30
+    data["gap_ratio"] = 0
+
+    statuses, elapsed = run_cancelled(data, 1)
+
+    assert statuses[0] == "solving"
+    assert statuses[-1] == "interrupted"
+    assert "completed" not in statuses
+    assert elapsed < 10
+
+
+def test_cancelled_before_start():
+    data = make_scenario(4, 2, 4, seed=0)
+
+    statuses, _ = run_cancelled(data, None)
+
+    assert statuses == ["interrupted"]
+
+
+def test_cancel_flag_stops_a_build():
+    # builds for seconds, cancelled between two constraint families
+    data = make_scenario(30, 6, 48, seed=0)
+    data["max_time"] = 30
+
+    statuses, elapsed = run_cancelled(data, 0.5)
+
+    assert statuses == ["solving", "interrupted"]
+    assert elapsed < 3
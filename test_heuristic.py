@@ -0,0 +1,45 @@
+from evaluator import evaluate
+from heuristic import construct, heuristic_solution
+from presolve import work_domains
+from scenarios import WEIGHTS, make_scenario
+from util import rated_positions
+
+
+def domains_of(data):
+    num_positions = len(data["positions"]) + 1
+    return work_domains(
+        data["num_employees"],
+        num_positions,
+        [tuple(item) for item in data["cover_demands"]],
+        rated_positions(
+            [tuple(item) for item in data.get("rating_constraints", [])],
+            data["num_employees"],
+            num_positions,
+        ),
+        [tuple(item) for item in data.get("fixed_assignments", [])],
+    )
+
+
+def test_construct_meets_break_constraints():
+    # one position manned in every session by 2 staff, each needing a break
+    # in any 3 sessions
+    data = {
+        "num_employees": 2,
+        "positions": ["A"],
+        "cover_demands": [[1]] * 8,
+        "break_constraints": [[3, 1, 1, 0]],
+        "weights": dict(WEIGHTS),
+    }
+
+    solution = construct(data, domains_of(data))
+
+    assert evaluate(solution, data)["feasible"], solution.tolist()
+
+
+def test_heuristic_solution_is_evaluated():
+    data = make_scenario(8, 4, 10, seed=0)
+
+    result = heuristic_solution(data, time_limit=0.05)
+
+    assert result["status"] == "heuristic"
+    assert evaluate(result["solution"], data)["objective"] == result["objective"]
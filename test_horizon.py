@@ -0,0 +1,43 @@
+import pytest
+
+from callback import ObjectiveEarlyStopping
+from evaluator import evaluate
+from horizon import DEFAULT_WINDOW, solve_rolling_horizon, window_ranges
+from scenarios import make_scenario
+
+
+def test_seam_constraints_hold():
+    data = make_scenario(8, 3, DEFAULT_WINDOW + 8, density=0.5, seed=3)
+    data["max_continous_work"] = 3
+    data["break_constraints"] = [[5, 2, 2, 0]]
+    data["horizon"] = {"window": DEFAULT_WINDOW, "overlap": 4}
+    data["max_time"] = 5
+    cb = ObjectiveEarlyStopping(5, data["gap_ratio"], lambda fields: None)
+
+    result = solve_rolling_horizon(data, cb, num_workers=1)
+
+    assert result is not None
+    assert len(result["windows"]) == len(
+        window_ranges(len(data["cover_demands"]), DEFAULT_WINDOW, 4)
+    )
+    evaluation = evaluate(result["solution"], data)
+    assert result["status"] == "FEASIBLE"
+    assert evaluation["feasible"], evaluation["violations"]
+    assert result["objective"] == evaluation["objective"]
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_status_follows_feasibility(seed):
+    # an overlap shorter than max_continous_work lets runs cross the seams
+    data = make_scenario(4, 2, 24, density=1.0, seed=seed)
+    data["max_continous_work"] = 3
+    data["horizon"] = {"window": 8, "overlap": 1, "seam_pass": False}
+    data["max_time"] = 2
+    cb = ObjectiveEarlyStopping(2, data["gap_ratio"], lambda fields: None)
+
+    result = solve_rolling_horizon(data, cb, num_workers=1)
+
+    assert result is not None
+    evaluation = evaluate(result["solution"], data)
+    assert result["feasible"] == evaluation["feasible"]
+    assert result["status"] == ("FEASIBLE" if evaluation["feasible"] else "VIOLATED")
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from job_store import MemoryJobStore, SQLiteJobStore, open_store
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryJobStore()
+    return SQLiteJobStore(str(tmp_path / "jobs.db"), poll_interval=0.02)
+
+
+def test_create_update_increment(store):
+    store.create("a", {"status": "queued", "progress": 0})
+
+    previous = store.update("a", {"status": "solving", "progress": 10})
+
+    assert previous == {"status": "queued", "progress": 0, "version": 0}
+    assert store.get("a") == {"status": "solving", "progress": 10, "version": 1}
+    assert store.increment("a", "views") == 1
+    assert store.increment("a", "views", 2) == 3
+    assert store.get("a")["version"] == 1
+    assert store.update("missing", {"status": "solving"}) is None
+    assert store.increment("missing", "views") is None
+    assert store.get("missing") is None
+
+
+def test_wait(store):
+    store.create("a", {"status": "queued"})
+    threading.Timer(0.1, store.update, ("a", {"status": "solving"})).start()
+
+    job = store.wait("a", 0, 2)
+
+    assert job["status"] == "solving"
+    assert job["version"] == 1
+    started = time.monotonic()
+    assert store.wait("a", 1, 0.1)["version"] == 1
+    assert time.monotonic() - started >= 0.09
+    assert store.wait("missing", 0, 0.1) is None
+
+
+def test_expire_and_delete(store):
+    store.create("a", {"status": "completed"})
+    store.create("b", {"status": "completed"})
+
+    store.expire("a", 0.05)
+    store.expire("a", 60)  # the first expiry is kept
+    store.delete("b")
+    time.sleep(0.1)
+
+    assert store.get("a") is None
+    assert store.get("b") is None
+    assert store.update("a", {"status": "solving"}) is None
+    assert store.find() == {}
+
+
+def test_find(store):
+    store.create("a", {"status": "solving", "batch": False})
+    store.create("b", {"status": "completed", "batch": False})
+    store.create("c", {"status": "solving", "batch": True})
+
+    assert set(store.find(status="solving")) == {"a", "c"}
+    assert set(store.find(status="solving", batch=False)) == {"a"}
+    assert store.find(status="error") == {}
+
+
+def test_sqlite_store_is_shared(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first, second = SQLiteJobStore(path), open_store(f"sqlite:///{path}")
+    first.create("a", {"status": "queued"})
+
+    second.update("a", {"status": "solving"})
+
+    assert first.get("a") == {"status": "solving", "version": 1}
+    assert isinstance(open_store("memory"), MemoryJobStore)
+    with pytest.raises(ValueError):
+        open_store("redis://localhost")
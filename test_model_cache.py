@@ -0,0 +1,53 @@
+from model_cache import ModelCache, fingerprint
+from scenarios import make_scenario
+
+
+class FakeModel:
+    def __init__(self, data):
+        self.data = data
+        self.weights = None
+
+    def copy(self):
+        return FakeModel(self.data)
+
+    def set_objective(self, weights):
+        self.weights = weights
+
+
+def test_fingerprint_ignores_non_structural_fields():
+    data = make_scenario(6, 3, 8, seed=1)
+    other = dict(data, max_time=99, gap_ratio=0.5, hint_solution=[[1]])
+    other["weights"] = {key: weight * 2 for key, weight in data["weights"].items()}
+    other["rating_constraints"] = list(reversed(data["rating_constraints"]))
+
+    assert fingerprint(other) == fingerprint(data)
+
+
+def test_fingerprint_changes_with_structure():
+    data = make_scenario(6, 3, 8, seed=1)
+    key = fingerprint(data)
+
+    assert fingerprint(dict(data, num_employees=7)) != key
+    assert fingerprint(dict(data, cover_demands=data["cover_demands"][:-1])) != key
+    # a zero weight skips the penalty variables
+    weights = dict(data["weights"], preference=0)
+    assert fingerprint(dict(data, weights=weights)) != key
+
+
+def test_lru_eviction():
+    built = []
+    cache = ModelCache(
+        lambda data, interrupted: built.append(data) or FakeModel(data), 2
+    )
+    requests = [make_scenario(4, 2, 4, seed=seed) for seed in range(3)]
+
+    cache.get(requests[0])
+    cache.get(requests[1])
+    cache.get(requests[0])
+    cache.get(requests[2])  # evicts requests[1], the least recently used
+    model = cache.get(requests[0])
+    cache.get(requests[1])
+
+    assert model.weights == requests[0]["weights"]
+    assert built == [requests[0], requests[1], requests[2], requests[1]]
+    assert cache.stats() == {"hits": 2, "misses": 4, "size": 2, "max_size": 2}
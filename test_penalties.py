@@ -0,0 +1,63 @@
+import pytest
+
+from callback import ObjectiveEarlyStopping
+from evaluator import evaluate
+from scenarios import make_scenario
+from solver import exact_break_squares, model_cache, solve_shift_scheduling
+
+
+def solve(data):
+    cb = ObjectiveEarlyStopping(5, data["gap_ratio"], lambda fields: None)
+    return solve_shift_scheduling(data, cb, num_workers=1)
+
+
+@pytest.mark.parametrize("encoding", ["square", "table", "piecewise", "deviation"])
+def test_zero_break_evenness_weight(encoding):
+    data = make_scenario(6, 3, 8, seed=1)
+    data["weights"]["break_evenness"] = 0
+    data["break_evenness_encoding"] = encoding
+    data["max_time"] = 5
+    model_cache.clear()
+
+    result = solve(data)
+
+    assert result is not None
+    assert result["status"] == "FEASIBLE"
+    breakdown = evaluate(result["solution"], data)
+    assert breakdown["objective"] == result["objective"]
+
+
+def test_exact_break_squares():
+    # the piecewise secants let the square of 2 breaks take 5
+    result = {
+        "solution": [[0, 1, 0], [1, 2, 1]],
+        "objective": 510,
+        "penalties": [
+            {
+                "name": "break_evenness",
+                "violation": "break_count_squared",
+                "staff": 0,
+                "value": 5,
+                "penalty": 500,
+            },
+            {
+                "name": "break_evenness",
+                "violation": "break_count_squared",
+                "staff": 1,
+                "value": 0,
+                "penalty": 0,
+            },
+            {
+                "name": "preference",
+                "violation": "preference",
+                "staff": 1,
+                "value": 1,
+                "penalty": 10,
+            },
+        ],
+    }
+
+    exact_break_squares(result, 100)
+
+    assert result["objective"] == 410
+    assert [item["penalty"] for item in result["penalties"]] == [400, 10]
@@ -0,0 +1,41 @@
+from presolve import check_feasibility, work_domains
+
+POSITIONS = ["break", "A", "B"]
+
+
+def domains_of(cover_demands, rated, fixed_assignments=()):
+    return work_domains(
+        len(rated), len(POSITIONS), cover_demands, rated, fixed_assignments
+    )
+
+
+def test_staffable_cover_has_no_conflict():
+    cover_demands = [(1, 1), (1, 0)]
+    domains = domains_of(cover_demands, [{1}, {1, 2}, {2}])
+
+    assert check_feasibility(domains, cover_demands, POSITIONS) == []
+
+
+def test_rejects_unstaffable_cover():
+    # three staff, but only one of them is rated for B
+    cover_demands = [(1, 0), (1, 2)]
+    domains = domains_of(cover_demands, [{1}, {1}, {1, 2}])
+
+    conflicts = check_feasibility(domains, cover_demands, POSITIONS)
+
+    assert [(c["check"], c["session"]) for c in conflicts] == [("matching", 1)]
+    assert conflicts[0]["positions"] == [2]
+
+
+def test_rejects_short_headcount_and_forced_work():
+    cover_demands = [(2, 2), (1, 0)]
+    domains = domains_of(
+        cover_demands, [{1, 2}, {1, 2}, {1, 2}], [(0, -1, 1), (1, -1, 1)]
+    )
+
+    conflicts = check_feasibility(domains, cover_demands, POSITIONS)
+
+    assert [(c["check"], c["session"]) for c in conflicts] == [
+        ("headcount", 0),
+        ("forced_work", 1),
+    ]
@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from roster_codec import ENCODINGS, decode_roster, encode_roster
+
+ROSTERS = [
+    [[0, 1, 1, 2, 0], [3, 3, 3, 0, 0], [0, 0, 0, 0, 0]],
+    [[300, 1], [0, 256]],  # positions past uint8
+    [[1]],
+]
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+@pytest.mark.parametrize("roster", ROSTERS)
+def test_round_trip(roster, encoding):
+    # through JSON, as sent on the wire
+    encoded = json.loads(json.dumps(encode_roster(roster, encoding)))
+
+    assert decode_roster(encoded) == roster
+
+
+def test_unknown_encoding():
+    with pytest.raises(ValueError):
+        encode_roster([[1]], "csv")
+    with pytest.raises(ValueError):
+        decode_roster({"encoding": "csv"})
@@ -0,0 +1,30 @@
+import pytest
+
+from callback import ObjectiveEarlyStopping
+from scenarios import make_scenario
+from solver import solve_shift_scheduling
+from util import find_triple_loops
+
+
+def solve(data):
+    cb = ObjectiveEarlyStopping(5, data["gap_ratio"], lambda fields: None)
+    return solve_shift_scheduling(data, cb, num_workers=1)
+
+
+@pytest.mark.parametrize("seed,max_time", [(5, 2), (6, 2)])
+def test_lazy_loop_3_returns_loop_free_rosters(seed, max_time):
+    # dense enough for the first rosters found to have 3-employee loops
+    data = make_scenario(10, 5, 8, seed=seed, density=1.0)
+    data["loop_3_mode"] = "lazy"
+    data["max_time"] = max_time
+
+    result = solve(data)
+
+    assert result["status"] in ("FEASIBLE", "VIOLATED")
+    loops = find_triple_loops(result["solution"])
+    if result["status"] == "FEASIBLE":
+        assert not loops
+    else:
+        # out of time, the loops left are reported
+        assert not result["feasible"]
+        assert result["loops"] == loops
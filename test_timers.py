@@ -0,0 +1,58 @@
+import threading
+
+from timers import Watchdog
+
+
+def test_fires_in_deadline_order():
+    dog = Watchdog()
+    fired = []
+    done = threading.Event()
+
+    dog.schedule(0.3, lambda: (fired.append("c"), done.set()))
+    dog.schedule(0.1, lambda: fired.append("a"))
+    dog.schedule(0.2, lambda: fired.append("b"))
+
+    assert done.wait(2)
+    assert fired == ["a", "b", "c"]
+    assert len(dog) == 0
+
+
+def test_reset_and_cancel():
+    dog = Watchdog()
+    fired = []
+    done = threading.Event()
+
+    cancelled = dog.schedule(0.1, lambda: fired.append("cancelled"))
+    pushed = dog.schedule(0.05, lambda: fired.append("pushed"))
+    dog.schedule(0.2, lambda: fired.append("kept"))
+    dog.schedule(0.4, done.set)
+    dog.cancel(cancelled)
+    dog.reset(pushed, 0.3)
+    dog.reset(cancelled, 0.05)  # a cancelled deadline stays cancelled
+
+    assert len(dog) == 3
+    assert done.wait(2)
+    assert fired == ["kept", "pushed"]
+
+
+def test_failing_action_does_not_stop_the_thread():
+    dog = Watchdog()
+    done = threading.Event()
+
+    dog.schedule(0.01, lambda: 1 / 0)
+    dog.schedule(0.05, done.set)
+
+    assert done.wait(2)
+
+
+def test_many_stale_entries_are_compacted():
+    dog = Watchdog()
+    deadlines = [dog.schedule(60, lambda: None) for _ in range(100)]
+    for deadline in deadlines[:90]:
+        dog.cancel(deadline)
+
+    assert len(dog) == 10
+    assert len(dog._heap) < 100
+    for deadline in deadlines[90:]:
+        dog.cancel(deadline)
+    assert len(dog) == 0
@@ -0,0 +1,121 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from typing import Callable
+
+
+class Deadline:
+    """An action scheduled on a Watchdog, see Watchdog.schedule."""
+
+    __slots__ = ("action", "entry", "cancelled")
+
+    def __init__(self, action: Callable[[], None]):
+        self.action = action
+        # [time, sequence, deadline] heap entry while armed
+        self.entry = None
+        self.cancelled = False
+
+
+class Watchdog:
+    """Runs short actions at deadlines from a single thread.
+
+    The deadlines are kept in a heap, so scheduling, resetting or cancelling
+    one is O(log n) whatever the number of solves, and no thread is started
+    per deadline. A reset or cancel marks the previous heap entry stale, it is
+    skipped when it comes up, and the heap is compacted when stale entries
+    outnumber the armed ones.
+
+    Usage:
+        deadline = watchdog.schedule(15, callback.StopSearch)
+        watchdog.reset(deadline, 15)  # pushed back, e.g. on a new solution
+        watchdog.cancel(deadline)  # never runs, cannot be reset anymore
+
+    Actions run on the watchdog thread, they must not block. The thread is
+    started on the first schedule, so each process gets its own.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = itertools.count()
+        self._stale = 0
+        self._changed = threading.Condition()
+        self._thread = None
+
+    def schedule(self, delay: float, action: Callable[[], None]) -> Deadline:
+        """Runs action in delay seconds."""
+        deadline = Deadline(action)
+        self.reset(deadline, delay)
+        return deadline
+
+    def reset(self, deadline: Deadline, delay: float):
+        """(Re)arms a deadline delay seconds from now, unless it was cancelled."""
+        with self._changed:
+            if deadline.cancelled:
+                return
+            self._disarm(deadline)
+            entry = [time.monotonic() + delay, next(self._sequence), deadline]
+            deadline.entry = entry
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._changed.notify()
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="watchdog")
+                self._thread.daemon = True
+                self._thread.start()
+
+    def cancel(self, deadline: Deadline):
+        """Disarms a deadline for good, a running action still completes."""
+        with self._changed:
+            deadline.cancelled = True
+            self._disarm(deadline)
+
+    def __len__(self) -> int:
+        """Number of armed deadlines."""
+        with self._changed:
+            return len(self._heap) - self._stale
+
+    def _disarm(self, deadline: Deadline):
+        if deadline.entry is None:
+            return
+        deadline.entry[2] = None
+        deadline.entry = None
+        self._stale += 1
+        if self._stale > len(self._heap) // 2:
+            self._heap = [entry for entry in self._heap if entry[2] is not None]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    def _next(self) -> Deadline:
+        """Waits for the earliest deadline and disarms it."""
+        with self._changed:
+            while True:
+                while self._heap and self._heap[0][2] is None:
+                    heapq.heappop(self._heap)
+                    self._stale -= 1
+                if not self._heap:
+                    self._changed.wait()
+                    continue
+                delay = self._heap[0][0] - time.monotonic()
+                if delay <= 0:
+                    break
+                self._changed.wait(delay)
+
+            deadline = heapq.heappop(self._heap)[2]
+            deadline.entry = None
+            return deadline
+
+    def _run(self):
+        while True:
+            deadline = self._next()
+            try:
+                deadline.action()
+            except Exception as e:
+                logging.error(f"Error in watchdog action: {str(e)}")
+
+
+# Deadlines of the process: stagnation timeouts, hard deadlines, cancel
+# checks and result retention.
+watchdog = Watchdog()
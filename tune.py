@@ -0,0 +1,216 @@
+"""Tunes the CP-SAT parameters of the solver by instance size.
+
+Solves each instance of a corpus with each of PARAMETER_SETS and measures the
+time to reach the target gap. Instances are generated with
+scenarios.make_scenario for each size given, or read from the JSON request
+payloads of a --corpus directory, e.g. saved from the web form. The set with
+the lowest score in each size bucket (see solver_profiles.size_bucket) is
+written as its profile to the --output file:
+
+    $ python tune.py --sizes 8x4x14 16x8x14 24x12x28 --seeds 3 --output new.json
+    $ python tune.py --corpus saved_requests/ --max-time 60 --output new.json
+
+Buckets already in the output file and not tuned by the run keep their
+profile. The solver applies the profiles of solver_profiles.PROFILES_PATH at
+runtime: to promote a run, review it and copy it there, or point the
+SOLVER_PROFILES environment variable of the workers at it.
+
+The score of a set is its mean time to the gap, counting an instance whose gap
+is not reached as PENALTY times max_time, and it replaces the default only if
+it saves MIN_IMPROVEMENT of the default score. Run it with the CP-SAT workers each
+solve gets in production, --workers, since the best parameters depend on it.
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+from collections import defaultdict
+
+import ortools
+
+from benchmark import SUITE, TimedEarlyStopping, git_commit, round_or_none
+from scenarios import make_scenario
+from solver import model_cache, solve_shift_scheduling
+from solver_profiles import DEFAULT_PROFILE, PROFILES_PATH, request_bucket
+
+# Changes to DEFAULT_PROFILE compared by the tuning.
+PARAMETER_SETS = {
+    "default": {},
+    "presolve": {"cp_model_presolve": True},
+    "no_symmetry": {"symmetry_level": 0},
+    "presolve_symmetry": {"cp_model_presolve": True, "symmetry_level": 2},
+    "no_lns": {"use_lns": False},
+    "linearization": {"linearization_level": 2},
+}
+
+# Time charged for an instance whose target gap is not reached, in max_time.
+PENALTY = 2
+# Share of the default score (or final gap, if tied) a set must save to
+# replace the default, timings being noisy.
+MIN_IMPROVEMENT = 0.1
+
+
+def load_corpus(directory: str) -> list[tuple[str, dict[str, any]]]:
+    """Named request payloads of the JSON files of a directory."""
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(path, "r") as f:
+            corpus.append((os.path.basename(path), json.load(f)))
+    return corpus
+
+
+def generate_corpus(
+    sizes: list[tuple[int, int, int]], seeds: int
+) -> list[tuple[str, dict[str, any]]]:
+    """Named scenarios of each size, one per seed."""
+    return [
+        (
+            f"{num_employees}x{num_positions}x{num_sessions}/{seed}",
+            make_scenario(num_employees, num_positions, num_sessions, seed=seed),
+        )
+        for num_employees, num_positions, num_sessions in sizes
+        for seed in range(seeds)
+    ]
+
+
+def time_to_gap(
+    data: dict[str, any], parameters: dict[str, any], num_workers: int
+) -> dict[str, any]:
+    """Solves a request with CP-SAT parameters, returns when the gap was met."""
+    # the model is built before the clock starts, it does not depend on them
+    model_cache.get(data)
+    cb = TimedEarlyStopping(15, data["gap_ratio"])
+    result = solve_shift_scheduling(data, cb, num_workers, parameters=parameters)
+    return {
+        "time_to_gap": round_or_none(cb.time_to_gap),
+        "time_to_first": round_or_none(cb.time_to_first),
+        "gap": round(cb.current_ratio(), 4) if cb.time_to_first is not None else None,
+        "objective": result.get("objective") if result else None,
+    }
+
+
+def score(runs: list[dict[str, any]], max_time: float) -> float:
+    """Mean time to the gap of runs, PENALTY * max_time if not reached."""
+    return sum(
+        PENALTY * max_time if run["time_to_gap"] is None else run["time_to_gap"]
+        for run in runs
+    ) / len(runs)
+
+
+def final_gap(runs: list[dict[str, any]]) -> float:
+    """Mean gap at the end of runs, 1 for runs without a solution."""
+    return sum(1 if run["gap"] is None else run["gap"] for run in runs) / len(runs)
+
+
+def tune(
+    corpus: list[tuple[str, dict[str, any]]],
+    parameter_sets: dict[str, dict[str, any]],
+    max_time: float,
+    gap_ratio: float,
+    num_workers: int,
+) -> dict[str, dict[str, any]]:
+    """Best parameter set of each size bucket of a corpus, with all the scores."""
+    runs = defaultdict(lambda: defaultdict(list))
+    for name, data in corpus:
+        data = {**data, "max_time": max_time, "gap_ratio": gap_ratio}
+        bucket = request_bucket(data)
+        model_cache.clear()
+        for set_name, changes in parameter_sets.items():
+            run = time_to_gap(data, {**DEFAULT_PROFILE, **changes}, num_workers)
+            runs[bucket][set_name].append(run)
+            print(bucket, name, set_name, json.dumps(run))
+
+    profiles = {}
+    for bucket, set_runs in runs.items():
+        scores = {
+            set_name: round(score(bucket_runs, max_time), 3)
+            for set_name, bucket_runs in set_runs.items()
+        }
+        gaps = {
+            set_name: round(final_gap(bucket_runs), 4)
+            for set_name, bucket_runs in set_runs.items()
+        }
+        # the final gap breaks ties, e.g. when no set reaches the target gap,
+        # then the earlier set wins, the default first
+        best = min(scores, key=lambda set_name: (scores[set_name], gaps[set_name]))
+        if "default" in scores and not (
+            scores[best] < scores["default"] * (1 - MIN_IMPROVEMENT)
+            or scores[best] == scores["default"]
+            and gaps[best] < gaps["default"] * (1 - MIN_IMPROVEMENT)
+        ):
+            best = "default"
+        profiles[bucket] = {
+            "parameters": {**DEFAULT_PROFILE, **parameter_sets[best]},
+            "set": best,
+            "score": scores[best],
+            "instances": len(set_runs[best]),
+            "scores": scores,
+            "gaps": gaps,
+        }
+        print(bucket, "best", best, json.dumps(scores), json.dumps(gaps))
+    return profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        default=[f"{e}x{p}x{s}" for e, p, s in SUITE.values()],
+        help="employees x positions x sessions of the generated instances",
+    )
+    parser.add_argument("--seeds", type=int, default=3, help="instances per size")
+    parser.add_argument("--corpus", help="directory of JSON requests to tune on")
+    parser.add_argument(
+        "--sets", nargs="+", choices=PARAMETER_SETS, default=list(PARAMETER_SETS)
+    )
+    parser.add_argument("--max-time", type=float, default=30)
+    parser.add_argument("--gap-ratio", type=float, default=0.02)
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count(), 8))
+    parser.add_argument(
+        "--output",
+        required=True,
+        help=f"JSON file of the profiles, the solver reads {PROFILES_PATH}",
+    )
+    args = parser.parse_args()
+
+    corpus = (
+        load_corpus(args.corpus)
+        if args.corpus
+        else generate_corpus(
+            [tuple(int(n) for n in size.split("x")) for size in args.sizes],
+            args.seeds,
+        )
+    )
+    profiles = tune(
+        corpus,
+        {name: PARAMETER_SETS[name] for name in args.sets},
+        args.max_time,
+        args.gap_ratio,
+        args.workers,
+    )
+
+    # buckets not in this run keep their profile
+    previous = {}
+    if os.path.exists(args.output):
+        with open(args.output, "r") as f:
+            previous = json.load(f).get("profiles", {})
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "commit": git_commit(),
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "ortools": ortools.__version__,
+                "cpu_count": os.cpu_count(),
+                "args": vars(args),
+                "profiles": {**previous, **profiles},
+            },
+            f,
+            indent=2,
+        )
+
+
+if __name__ == "__main__":
+    main()
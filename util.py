@@ -1,35 +1,216 @@
-from itertools import combinations
-
-
-def check_triple_loop(
-    solver, work, num_employees, num_shifts, num_sessions, cover_demands
-) -> int:
-    for e1, e2, e3 in combinations(range(num_employees), 3):
-        for s1 in range(1, num_shifts):
-            for s2 in range(1, num_shifts):
-                if len({s1, s2}) == 2:
-                    for s3 in range(1, num_shifts):
-                        if len({s1, s2, s3}) == 3:
-                            for d in range(num_sessions - 1):
-                                if all(
-                                    cover_demands[d + i][s - 1] > 0
-                                    for i in range(2)
-                                    for s in (s1, s2, s3)
-                                ):
-                                    if (
-                                        solver.Value(work[e1, s1, d])
-                                        and solver.Value(work[e1, s2, d + 1])
-                                        and solver.Value(work[e2, s2, d])
-                                        and solver.Value(work[e2, s3, d + 1])
-                                        and solver.Value(work[e3, s3, d])
-                                        and solver.Value(work[e3, s1, d + 1])
-                                    ):
-                                        return d
-    return -1
-
-
-def find_in_tuple(list_of_tuples, c):
-    for a, *b in list_of_tuples:
-        if a == c:
-            return b
-        return []
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+
+def find_triple_loops(solution: list[list[int]]) -> list[tuple]:
+    """Finds every 3-employee position loop in a roster.
+
+    A loop is e1: s1 -> s2, e2: s2 -> s3 and e3: s3 -> s1 between two
+    consecutive sessions, which is what the prevent_loop_3 clauses forbid.
+
+    Args:
+      solution: the position of each employee in each session, as returned by
+        solution_obj (0 is a break).
+
+    Returns:
+      a list of (e1, e2, e3, s1, s2, s3, session) tuples, one per loop.
+    """
+    loops = []
+    num_sessions = len(solution[0]) if solution else 0
+    for d in range(num_sessions - 1):
+        # employees moving from one position to another, keyed by the move
+        moves = {}
+        for e, staff in enumerate(solution):
+            s1, s2 = staff[d], staff[d + 1]
+            if s1 and s2 and s1 != s2:
+                moves.setdefault((s1, s2), []).append(e)
+
+        for (s1, s2), first in moves.items():
+            for (t2, s3), second in moves.items():
+                # report each loop once, starting from its lowest position
+                if t2 != s2 or s3 == s1 or s1 > s2 or s1 > s3:
+                    continue
+                for e3 in moves.get((s3, s1), []):
+                    for e1 in first:
+                        for e2 in second:
+                            loops.append((e1, e2, e3, s1, s2, s3, d))
+    return loops
+
+
+CONSTRAINT_KINDS = (
+    "bool_or",
+    "bool_and",
+    "at_most_one",
+    "exactly_one",
+    "bool_xor",
+    "linear",
+    "lin_max",
+    "int_prod",
+    "int_div",
+    "int_mod",
+    "element",
+    "table",
+    "automaton",
+    "all_diff",
+    "circuit",
+    "routes",
+    "inverse",
+    "reservoir",
+    "interval",
+    "no_overlap",
+    "no_overlap_2d",
+    "cumulative",
+)
+
+
+def constraint_kind(ct) -> str | None:
+    if hasattr(ct, "WhichOneof"):
+        # protobuf message (ortools < 9.15)
+        return ct.WhichOneof("constraint")
+    for kind, has_kind in _HAS_KIND:
+        if getattr(ct, has_kind)():
+            return kind
+    return None
+
+
+_HAS_KIND = [(kind, f"has_{kind}") for kind in CONSTRAINT_KINDS]
+
+
+def count_constraints(proto, start: int = 0, end: int | None = None) -> dict[str, int]:
+    """Counts the constraints of a model proto by kind, in [start, end)."""
+    constraints = proto.constraints
+    counts = {}
+    for i in range(start, len(constraints) if end is None else end):
+        kind = constraint_kind(constraints[i])
+        counts[kind] = counts.get(kind, 0) + 1
+    return counts
+
+
+class BuildInterrupted(Exception):
+    """Raised by BuildProfile.family when the build was interrupted."""
+
+
+class BuildProfile:
+    """Wall time and model growth of each constraint family of a build.
+
+    Usage:
+        profile = BuildProfile(model, cb.is_interrupted)
+        with profile.family("cover"):
+            ...  # add the cover constraints
+        profile.report()
+
+    Only the variable and constraint index ranges are recorded while
+    building, the constraints are counted by kind on the first report().
+    interrupted, if set, is checked before each family, so that a cancelled
+    build stops there with BuildInterrupted instead of running to the end.
+    """
+
+    def __init__(self, model, interrupted: Callable[[], bool] | None = None):
+        self._proto = model.proto
+        self.interrupted = interrupted
+        # family -> [time, variables, constraint ranges]
+        self._families = {}
+        self._report = None
+
+    @contextmanager
+    def family(self, name: str):
+        if self.interrupted and self.interrupted():
+            raise BuildInterrupted(name)
+        num_variables = len(self._proto.variables)
+        num_constraints = len(self._proto.constraints)
+        start = time.perf_counter()
+        yield
+        elapsed = time.perf_counter() - start
+
+        entry = self._families.setdefault(name, [0.0, 0, []])
+        entry[0] += elapsed
+        entry[1] += len(self._proto.variables) - num_variables
+        entry[2].append((num_constraints, len(self._proto.constraints)))
+
+    def report(self) -> dict[str, dict[str, float]]:
+        """Counters of each family, in build order, and their total."""
+        if self._report is not None:
+            return self._report
+
+        report = {}
+        total = dict.fromkeys(
+            ("time", "variables", "constraints", "clauses", "linear"), 0
+        )
+        for name, (elapsed, num_variables, ranges) in self._families.items():
+            counts = {}
+            for start, end in ranges:
+                for kind, count in count_constraints(self._proto, start, end).items():
+                    counts[kind] = counts.get(kind, 0) + count
+            report[name] = {
+                "time": elapsed,
+                "variables": num_variables,
+                "constraints": sum(end - start for start, end in ranges),
+                "clauses": counts.get("bool_or", 0) + counts.get("bool_and", 0),
+                "linear": counts.get("linear", 0),
+            }
+            for key in total:
+                total[key] += report[name][key]
+        report["total"] = total
+
+        for entry in report.values():
+            entry["time"] = round(entry["time"], 4)
+        self._report = report
+        return report
+
+
+class Guards:
+    """Enforcement literals guarding groups of constraints, for diagnostics.
+
+    The constraints added in a guard section are only enforced if the literal
+    of their group is true. Solving with every literal as an assumption then
+    tells which groups conflict. Sections of the same group share a literal,
+    and when disabled the sections are no-ops.
+
+    Usage:
+        guards = Guards(model, enabled=True)
+        with guards.guard("cover", session=d):
+            ...  # add the cover constraints of session d
+        guards.groups  # {literal index: {"group": "cover", "session": d}}
+    """
+
+    def __init__(self, model, enabled: bool):
+        self._model = model
+        self.enabled = enabled
+        self._literals = {}
+        self.groups = {}
+
+    @contextmanager
+    def guard(self, group: str, **fields):
+        if not self.enabled:
+            yield
+            return
+
+        constraints = self._model.proto.constraints
+        start = len(constraints)
+        yield
+
+        key = (group, *sorted(fields.items()))
+        if key not in self._literals:
+            name = " ".join([group] + [f"{k}={v}" for k, v in sorted(fields.items())])
+            literal = self._model.new_bool_var(name)
+            self._literals[key] = literal
+            self.groups[literal.index] = {"group": group, **fields}
+        index = self._literals[key].index
+        for i in range(start, len(constraints)):
+            constraints[i].enforcement_literal.append(index)
+
+
+def rated_positions(
+    rating_constraints: list[tuple], num_employees: int, num_positions: int
+) -> list[set[int]]:
+    """Positions each employee may work.
+
+    Rating constraints are (employee, position, ...) tuples, an employee can
+    appear in several of them. Employees without any rating may work every
+    position.
+    """
+    rated = [set() for _ in range(num_employees)]
+    for employee, *ratings in rating_constraints:
+        rated[employee].update(ratings)
+    return [r or set(range(1, num_positions)) for r in rated]